@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+"""
+    Throughput benchmark of the neural networks of networks/model.
+    For each model, batch size and dtype it measures the data loading, the
+    forward propagation, the training (forward + backward + update) and the
+    evaluation, and reports the number of samples per second and the latency
+    per sample (mean and standard deviation over several repetitions).
+
+    It also measures the startup of main.py (help and error on an argument)
+    with python -X importtime : these commands must not import numpy or PIL
+    and their import time is compared to the baseline like a throughput.
+
+    The results are written in a JSON file (a baseline) and can be compared
+    to a previous baseline : the program fails if a throughput dropped more
+    than the threshold.
+
+    Practical use :
+        - ./benchmark.py -o benchmark/baseline.json
+        - ./benchmark.py -models nw1,nw3 -bs 1,100 -baseline benchmark/baseline.json
+"""
+
+import sys
+import os
+import io
+import json
+import time
+import platform
+import subprocess
+import contextlib
+import numpy as np
+from src.argumentsManager import ArgsManager
+from src.neuralNetwork import NeuralNetwork
+from src.externalFunc import Constant
+
+MODEL_DIR = "networks/model"
+# default values of the grid
+DEFAULT_ARGS = {"-models": "nw1,nw2,nw3,nw4,nw6,nw8,nw10",
+                "-bs": "1,10,100",
+                "-dtypes": "float64,float32",
+                "-n": "200",
+                "-repeat": "3",
+                "-threshold": "10",
+                "-startup": "help,error",
+                "-o": None,
+                "-baseline": None}
+# commands of main.py whose startup is measured
+STARTUP_COMMANDS = {"help": ["main.py", "-h"],
+                    "error": ["main.py", "networks/model/nw1.txt", "-bs", "x"]}
+# modules that these commands must not import
+FORBIDDEN_AT_STARTUP = ["numpy", "PIL"]
+
+
+
+def syntheticData(nb_samples, dtype, seed=0):
+    """
+        Generate nb_samples (input, expected output) pairs with the same
+        shape as the ones given by loadMNIST.
+    """
+    random = np.random.RandomState(seed)
+    inputs = random.randint(0, 256, size=(nb_samples, 784)).astype(dtype)/255
+    labels = random.randint(0, 10, size=nb_samples)
+    outputs = np.eye(10, dtype=dtype)[labels]
+    return [(inputs[index], outputs[index]) for index in range(nb_samples)]
+
+
+
+def loadData(nb_samples, dtype):
+    """
+        Load nb_samples images of the training set if the MNIST files are in
+        the data directory, otherwise generate synthetic ones.
+        Return the data and whether it is the real data.
+    """
+    if os.path.isfile("data/train-images-idx3-ubyte"):
+        from src.mnistHandwriting import loadMNIST
+        data = loadMNIST(0, nb_samples, bTrain=True)
+        return [(x.astype(dtype), y.astype(dtype)) for x, y in data], True
+    return syntheticData(nb_samples, dtype), False
+
+
+
+def measure(function, nb_samples, repeat):
+    """
+        Call function repeat times (after a warm up call) and return the
+        statistics of the throughput and of the latency per sample.
+    """
+    durations = []
+    # the progress bars are not part of what we want to see
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - start)
+    durations = np.array(durations)
+    throughput = nb_samples/durations
+    latency = durations/nb_samples
+    return {"samples_per_sec": float(np.mean(throughput)),
+            "samples_per_sec_std": float(np.std(throughput)),
+            "latency": float(np.mean(latency)),
+            "latency_std": float(np.std(latency))}
+
+
+
+def measureStartup(command, repeat):
+    """
+        Run command repeat times (after a warm up run that compiles the
+        modules) with python -X importtime and return the statistics of its
+        import time (as a throughput of runs per second to be compared like
+        the others) and the names of the imported modules.
+    """
+    import_times = []
+    for _ in range(repeat+1):
+        process = subprocess.run([sys.executable, "-X", "importtime"] +
+                                 command, stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE,
+                                 universal_newlines=True)
+        # import time: self [us] | cumulative | imported package
+        total = 0
+        modules = []
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split("|")
+            if not cumulative.strip().isdigit():
+                continue
+            modules.append(name.strip())
+            # only the top level imports, the others are in their cumulative
+            if not name.startswith("  "):
+                total += int(cumulative)
+        import_times.append(total/1e6)
+    import_times = np.array(import_times[1:])
+    return ({"samples_per_sec": float(np.mean(1/import_times)),
+             "samples_per_sec_std": float(np.std(1/import_times)),
+             "latency": float(np.mean(import_times)),
+             "latency_std": float(np.std(import_times))}, modules)
+
+
+
+def benchmarkModel(model, batch_size, dtype, data, repeat):
+    """
+        Benchmark one model for a batch size and a dtype.
+
+        Output :
+
+        <- results : DICT {phase : statistics}.
+    """
+    nb_samples = len(data)
+    args = ArgsManager(["main.py", os.path.join(MODEL_DIR, model + ".txt"),
+                        "-ls", str(nb_samples), "-bs", str(batch_size),
+                        "-NO-INFO"])
+    network = NeuralNetwork(args.neural_network, args.squishing_funcs, None,
+                            layer_specs=args.layer_specs)
+    network.weights = [w.astype(dtype) for w in network.weights]
+    network.biases = [b.astype(dtype) for b in network.biases]
+
+    def forward():
+        for x, _ in data:
+            network.generateOuputLayer(x)
+
+    def train():
+        network.trainNEO(data, batch_size, (Constant, 0.01), 0)
+
+    def evaluate():
+        network.test(data)
+
+    return {"forward": measure(forward, nb_samples, repeat),
+            "train": measure(train, nb_samples, repeat),
+            "evaluate": measure(evaluate, nb_samples, repeat)}
+
+
+
+def compare(results, baseline, threshold):
+    """
+        Compare the throughputs of results to the ones of baseline.
+        Return the list of the regressions (as STRING).
+    """
+    regressions = []
+    for key, phases in results["results"].items():
+        if key not in baseline["results"]:
+            continue
+        for phase, stats in phases.items():
+            old = baseline["results"][key][phase]["samples_per_sec"]
+            new = stats["samples_per_sec"]
+            change = 100*(new - old)/old
+            line = "%-28s %-9s %12.1f %12.1f %+8.1f %%" % (key, phase, old,
+                   new, change)
+            print(line)
+            if change < -threshold:
+                regressions.append(line)
+    return regressions
+
+
+
+def parseArgs(list_args):
+    """
+        Parse the arguments "-name value" of the program.
+    """
+    options = dict(DEFAULT_ARGS)
+    i = 1
+    while i < len(list_args):
+        if list_args[i] not in options or i+1 >= len(list_args):
+            print("ERROR : The argument", list_args[i], "is not valid.")
+            print("The existing ones are", list(options.keys()))
+            sys.exit(1)
+        options[list_args[i]] = list_args[i+1]
+        i += 2
+    return options
+
+
+
+def main():
+    """
+        Main function.
+    """
+    options = parseArgs(sys.argv)
+    models = options["-models"].split(",")
+    batch_sizes = [int(bs) for bs in options["-bs"].split(",")]
+    dtypes = options["-dtypes"].split(",")
+    nb_samples = int(options["-n"])
+    repeat = int(options["-repeat"])
+    # the learning size has to be divisible by the batch size
+    nb_samples -= nb_samples % int(np.lcm.reduce(batch_sizes))
+    if nb_samples <= 0:
+        print("ERROR : -n has to be greater than the batch sizes.")
+        sys.exit(1)
+
+    results = {"machine": platform.platform(), "numpy": np.__version__,
+               "nb_samples": nb_samples, "results": {}}
+    errors = []
+    for name in options["-startup"].split(","):
+        if name == "":
+            continue
+        print("Benchmarking startup/" + name, "...")
+        stats, modules = measureStartup(STARTUP_COMMANDS[name], repeat)
+        results["results"]["startup/" + name] = {"import": stats}
+        for module in FORBIDDEN_AT_STARTUP:
+            if module in modules:
+                errors.append("startup/" + name + " imports " + module)
+    for dtype in dtypes:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            data, real = loadData(nb_samples, dtype)
+        duration = time.perf_counter() - start
+        results["results"]["load/" + dtype] = {"load": {
+            "samples_per_sec": nb_samples/duration, "samples_per_sec_std": 0,
+            "latency": duration/nb_samples, "latency_std": 0}}
+        results["real_data"] = real
+        for model in models:
+            for batch_size in batch_sizes:
+                key = "%s/bs%i/%s" % (model, batch_size, dtype)
+                print("Benchmarking", key, "...")
+                results["results"][key] = benchmarkModel(model, batch_size,
+                                                         dtype, data, repeat)
+
+    print("\n%-28s %-9s %12s %12s %12s" % ("Benchmark", "Phase", "Samples/s",
+                                          "Latency (s)", "Std (s)"))
+    for key, phases in results["results"].items():
+        for phase, stats in phases.items():
+            print("%-28s %-9s %12.1f %12.3e %12.3e" % (key, phase,
+                  stats["samples_per_sec"], stats["latency"],
+                  stats["latency_std"]))
+
+    if options["-o"] != None:
+        directory = os.path.dirname(options["-o"])
+        if directory != "" and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(options["-o"], "w") as document:
+            json.dump(results, document, indent=1)
+        print("\nResults saved in " + options["-o"] + ".")
+
+    if errors:
+        print("\nERROR :", ", ".join(errors), ".")
+        sys.exit(1)
+
+    if options["-baseline"] != None:
+        with open(options["-baseline"], "r") as document:
+            baseline = json.load(document)
+        print("\n%-28s %-9s %12s %12s %10s" % ("Benchmark", "Phase",
+              "Baseline/s", "Current/s", "Change"))
+        regressions = compare(results, baseline,
+                              float(options["-threshold"]))
+        if regressions:
+            print("\nERROR :", len(regressions), "regression(s) of more than",
+                  options["-threshold"], "% :")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print("\nNo regression of more than", options["-threshold"], "%.")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,48 +4,202 @@
     Intepreter to use cProfile and analyse the results.
     Use to optimize code by analazing the execution time of each function.
 
-    Practical use to open all the information :
+    A scenario (a list of arguments of main.py) is run in the same process
+    with cProfile. The raw stats are saved in profile/{version}.prof and
+    the table in profile/{version}.txt. Two profiles (raw stats or tables)
+    can then be compared function by function.
+
+    Practical use :
+        - ./cProfiler.py version5                  (default scenario)
+        - ./cProfiler.py version5 -scenario batch1
+        - ./cProfiler.py -list
+        - ./cProfiler.py -diff versionNEObatch1 versionNEObatch100
         - atom $(find ./profile -name "*.txt")
 """
 
 import sys
 import os
+import re
+import cProfile
 # import pstats used to print a table that gives the time passed in each func
 import pstats
 
-def main():
+PROFILE_DIR = "profile"
+# no -S because this is just a test we don't want to save the result
+SCENARIOS = {
+    "default": ["networks/saved/testnw3", "-ls", "500", "-ts", "500",
+                "-bs", "100", "-gdf", "Constant0.5"],
+    "batch1": ["networks/saved/testnw3", "-ls", "500", "-ts", "500",
+               "-bs", "1", "-gdf", "Constant0.5"],
+    "batch100": ["networks/saved/testnw3", "-ls", "5000", "-ts", "1000",
+                 "-bs", "100", "-gdf", "Constant0.5"],
+    "deep": ["networks/saved/testnw10", "-ls", "500", "-ts", "500",
+             "-bs", "10", "-gdf", "Constant0.5"],
+}
+# line of a table printed by pstats
+# ex : "  500  0.505  0.001  2.237  0.004 neuralNetwork.py:299(calculateNegGradient)"
+ROW = re.compile(r"^\s*([\d/]+)\s+([\d.]+)\s+[\d.]+\s+([\d.]+)\s+[\d.]+\s+"
+                 r"(.+):\d+\((.+)\)\s*$")
+ROW_BUILTIN = re.compile(r"^\s*([\d/]+)\s+([\d.]+)\s+[\d.]+\s+([\d.]+)\s+"
+                         r"[\d.]+\s+(\{.+\})\s*$")
+
+
+
+def profileScenario(version, scenario):
     """
-        Main function.
+        Run a scenario with cProfile in the current process and save the raw
+        stats and the table sorted by cumulative time.
     """
-    if len(sys.argv) != 2:
-        print("ERROR : The program need at least one argument FILE_NAME to "
-            "execute itself.")
-        sys.exit(1)
+    import main
+    cmd = ["main.py"] + SCENARIOS[scenario]
+    print("Compiling the command :", " ".join(cmd), "\n")
 
-    output_file = sys.argv[1]
-    # no -S because this is just a test we don't want to save the result
-    cmd = "main.py networks/saved/testnw3 -ls 500 -ts 500 -bs 100 -gdf Constant0.5"
+    if not os.path.isdir(PROFILE_DIR):
+        os.mkdir(PROFILE_DIR)
+    profile = os.path.join(PROFILE_DIR, version + ".prof")
+    output_file = os.path.join(PROFILE_DIR, version + ".txt")
 
-    print("Compiling the command :", cmd, "\n")
+    argv = sys.argv
+    sys.argv = cmd
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(main.main)
+    finally:
+        sys.argv = argv
+    profiler.dump_stats(profile)
+
+    # creation of the information table
+    with open(output_file, "w") as document:
+        p = pstats.Stats(profile, stream=document)
+        p.strip_dirs().sort_stats("cumtime").print_stats()
+    print("Profile created in " + output_file + " (raw stats in " + profile +
+          ").")
 
-    profile = "profile/dataProfile"
 
-    os.system("python3 -m cProfile -o " + profile + " " + cmd)
 
-    # in case the output file doesn't exist, we have to create it
-    if not os.path.isfile(output_file):
-        os.system("touch profile/" + output_file)
+def loadProfile(name):
+    """
+        Load a profile : either raw stats (.prof) or a table printed by
+        pstats (.txt), the old profiles being only tables.
+        name can be a path or a version in the profile directory.
 
-    # all the information will be printed there thanks to print_stats()
-    sys.stdout = open("profile/"+output_file, "w")
+        Output :
 
-    # creation of the information table
-    p = pstats.Stats(profile)
-    p.strip_dirs().sort_stats("cumtime").print_stats()
-    print("Profile created in profile/" + output_file + ".")
+        <- functions : DICT {(file, function) : [ncalls, tottime, cumtime]}
+                       the line numbers are dropped so that a function can be
+                       followed between two versions of a file.
+    """
+    if not os.path.isfile(name):
+        for extension in (".prof", ".txt", ""):
+            path = os.path.join(PROFILE_DIR, name + extension)
+            if os.path.isfile(path):
+                name = path
+                break
+        else:
+            print("ERROR : Cannot find the profile", name, ".")
+            sys.exit(1)
+
+    functions = {}
+
+    def add(key, ncalls, tottime, cumtime):
+        values = functions.setdefault(key, [0, 0.0, 0.0])
+        values[0] += ncalls
+        values[1] += tottime
+        values[2] += cumtime
+
+    if name.endswith(".txt"):
+        with open(name, "r") as document:
+            for line in document:
+                match = ROW.match(line)
+                if match:
+                    ncalls, tottime, cumtime, filename, func = match.groups()
+                else:
+                    match = ROW_BUILTIN.match(line)
+                    if not match:
+                        continue
+                    ncalls, tottime, cumtime, func = match.groups()
+                    filename = "~"
+                add((os.path.basename(filename), func),
+                    int(ncalls.split("/")[0]), float(tottime), float(cumtime))
+    else:
+        stats = pstats.Stats(name).stats
+        for (filename, _, func), (_, ncalls, tottime, cumtime, _) in \
+                stats.items():
+            add((os.path.basename(filename), func), ncalls, tottime, cumtime)
+    return functions
+
+
+
+def diffProfiles(old_name, new_name, sort="tottime", limit=30):
+    """
+        Print the differences of ncalls, tottime and cumtime between two
+        profiles for each function, the biggest changes first.
+    """
+    old = loadProfile(old_name)
+    new = loadProfile(new_name)
+    column = {"ncalls": 0, "tottime": 1, "cumtime": 2}[sort]
+    rows = []
+    for key in set(old) | set(new):
+        old_values = old.get(key, [0, 0.0, 0.0])
+        new_values = new.get(key, [0, 0.0, 0.0])
+        deltas = [new_values[i] - old_values[i] for i in range(3)]
+        rows.append((key, old_values, new_values, deltas))
+    rows.sort(key=lambda row: -abs(row[3][column]))
+
+    total_old = max([values[2] for values in old.values()] + [0])
+    total_new = max([values[2] for values in new.values()] + [0])
+    print("Total time : %.3f s -> %.3f s (%+.3f s)\n" % (total_old, total_new,
+          total_new - total_old))
+    print("%10s %10s %10s %10s %10s %10s  %s" % ("d ncalls", "tottime",
+          "d tottime", "cumtime", "d cumtime", "ratio", "function"))
+    for (filename, func), old_values, new_values, deltas in rows[:limit]:
+        if old_values[1] > 0:
+            ratio = "%10.2f" % (new_values[1]/old_values[1])
+        else:
+            ratio = "%10s" % ("new" if new_values[1] > 0 else "-")
+        print("%+10i %10.3f %+10.3f %10.3f %+10.3f %s  %s:%s" % (deltas[0],
+              new_values[1], deltas[1], new_values[2], deltas[2], ratio,
+              filename, func))
+
+
+
+def main():
+    """
+        Main function.
+    """
+    if len(sys.argv) < 2:
+        print("ERROR : The program need at least one argument VERSION_NAME to "
+            "execute itself.")
+        sys.exit(1)
 
-    # reset stdout to normal
-    sys.stdout = sys.__stdout__
+    if sys.argv[1] == "-list":
+        for name, cmd in sorted(SCENARIOS.items()):
+            print("%-10s main.py %s" % (name, " ".join(cmd)))
+    elif sys.argv[1] == "-diff":
+        if len(sys.argv) < 4:
+            print("ERROR : -diff needs two profiles : -diff OLD NEW [-sort"
+                " ncalls|tottime|cumtime] [-n NB]")
+            sys.exit(1)
+        options = {"-sort": "tottime", "-n": "30"}
+        options.update(zip(sys.argv[4::2], sys.argv[5::2]))
+        if options["-sort"] not in ("ncalls", "tottime", "cumtime"):
+            print("ERROR : The sort", options["-sort"], "doesn't exist.")
+            sys.exit(1)
+        diffProfiles(sys.argv[2], sys.argv[3], options["-sort"],
+                     int(options["-n"]))
+    else:
+        scenario = "default"
+        if len(sys.argv) >= 4 and sys.argv[2] == "-scenario":
+            scenario = sys.argv[3]
+        if scenario not in SCENARIOS:
+            print("ERROR : The scenario", scenario, "doesn't exist. The"
+                " existing ones are", sorted(SCENARIOS.keys()))
+            sys.exit(1)
+        version = sys.argv[1]
+        # the old use was ./cProfiler.py version.txt
+        if version.endswith(".txt"):
+            version = version[:-4]
+        profileScenario(version, scenario)
 
 
 if __name__ == '__main__':
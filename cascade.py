@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""
+    Cascade of two saved neural networks (see src/cascadePredictor.py) : a
+    small network predicts every image and only the images it is not sure
+    about are given to a large network.
+
+    With -target the threshold is calibrated : the -cal first testing images
+    are computed by both networks and the smallest threshold whose cascade
+    reaches the target accuracy on them is kept. The cascade is then
+    evaluated on the -ts testing images that follow, and compared to each
+    network alone (error rate, part of the images given to the large
+    network and average latency of an image in batches of -batch images).
+    With -threshold the given threshold is evaluated on the -ts first
+    testing images. Use -o FILE to save the calibrated cascade.
+
+    Practical use :
+        - ./cascade.py networks/saved/testnw1 networks/saved/testnw10 -target 0.98
+        - ./cascade.py networks/saved/testnw1 networks/saved/testnw10 -target 0.98 -cal 2000 -ts 8000 -o cascade.json
+        - ./cascade.py networks/saved/testnw1 networks/saved/testnw10 -threshold 0.3
+"""
+
+import sys
+import os
+from src.argumentsManager import SIZE_TESTING
+
+# options of the cascade and their default
+CASCADE_ARGS = {"-target": None,
+                "-threshold": None,
+                "-cal": "5000",
+                "-ts": None,
+                "-batch": "256",
+                "-o": None}
+
+
+
+def parseArgs(list_args):
+    """
+        Check the arguments of the cascade.
+
+        Output :
+
+        <- (dir_small, dir_large, options) : the directories of the networks
+                                             and the DICT of the options.
+    """
+    if len(list_args) < 3 or not os.path.isdir(list_args[1]) or \
+            not os.path.isdir(list_args[2]):
+        print("ERROR : The program needs two saved neural network"
+            " DIRECTORIES (the small one first) as first arguments.")
+        print("Use : ./cascade.py {small} {large} -target ACCURACY [-cal NB]"
+            " [-ts NB] [-o FILE] or -threshold MARGIN")
+        sys.exit(1)
+    options = dict(CASCADE_ARGS)
+    i = 3
+    while i < len(list_args):
+        if list_args[i] not in options or i+1 >= len(list_args):
+            print("ERROR : The argument", list_args[i], "is not valid.")
+            sys.exit(1)
+        options[list_args[i]] = list_args[i+1]
+        i += 2
+    try:
+        for option in ("-target", "-threshold"):
+            if options[option] != None:
+                options[option] = float(options[option])
+        for option in ("-cal", "-ts", "-batch"):
+            if options[option] != None:
+                options[option] = int(options[option])
+    except ValueError:
+        print("ERROR : -target and -threshold expect numbers, -cal, -ts and"
+            " -batch integers.")
+        sys.exit(1)
+    if (options["-target"] == None) == (options["-threshold"] == None):
+        print("ERROR : Either -target (calibration) or -threshold is"
+            " required.")
+        sys.exit(1)
+    if options["-target"] == None:
+        options["-cal"] = 0
+    if options["-ts"] == None:
+        options["-ts"] = SIZE_TESTING - options["-cal"]
+    if options["-cal"] < 0 or options["-ts"] <= 0 or options["-batch"] <= 0 \
+            or options["-cal"] + options["-ts"] > SIZE_TESTING:
+        print("ERROR : The calibration size (-cal) + the testing size (-ts)"
+            " has to be at most", SIZE_TESTING, "and -batch positive.")
+        sys.exit(1)
+    return (list_args[1], list_args[2], options)
+
+
+
+def main():
+    """
+        Main function.
+    """
+    dir_small, dir_large, options = parseArgs(sys.argv)
+    from src.mnistHandwriting import loadMNIST
+    from src.cascadePredictor import CascadePredictor, calibrateThreshold, \
+        evaluate
+
+    cascade = CascadePredictor(dir_small, dir_large, options["-threshold"])
+    if options["-target"] != None:
+        calibration = loadMNIST(0, options["-cal"], bTrain=False)
+        images = calibration.images[calibration.indices].T/255.0
+        labels = calibration.labels[calibration.indices]
+        cascade.threshold, escalated = calibrateThreshold(
+            cascade.small.generateOuputLayers(images),
+            cascade.large.generateOuputLayers(images), labels,
+            options["-target"])
+        print("Calibrated threshold : %g (%.1f %% of the %i calibration"
+              " images escalated)" % (cascade.threshold, escalated*100,
+              options["-cal"]))
+        if cascade.threshold == float("inf"):
+            print("WARNING : The target accuracy is only reached (if ever)"
+                " when every image is escalated.")
+
+    testing = loadMNIST(options["-cal"], options["-ts"], bTrain=False)
+    images = testing.images[testing.indices].T/255.0
+    labels = testing.labels[testing.indices]
+    lines = ["%-10s %9s %12s %14s" % ("Predictor", "Error %", "Escalated %",
+             "Latency (us)")]
+    for name, predict in (("small", lambda batch: (
+                               cascade.small.generateOuputLayers(batch), 0)),
+                          ("large", lambda batch: (
+                               cascade.large.generateOuputLayers(batch),
+                               batch.shape[1])),
+                          ("cascade", cascade.predict)):
+        results = evaluate(predict, images, labels, options["-batch"])
+        lines.append("%-10s %9.2f %12.1f %14.1f" % (name,
+                     results["error_rate"]*100, results["escalated"]*100,
+                     results["latency"]*1e6))
+    print("\n".join(lines))
+    if options["-o"] != None:
+        cascade.save(options["-o"], target=options["-target"],
+                     error_rate=results["error_rate"],
+                     escalated=results["escalated"])
+        print("Cascade saved in " + options["-o"] + ".")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+"""
+    Classify the image files (PNG and BMP) of a directory and of its
+    subdirectories with a saved neural network.
+
+    The directory is walked lazily and the paths are given by chunks of
+    -chunk images to a pool of -workers processes that decode them (see
+    src/imageFolder.py) : grayscale, 28x28, inverted when the digits are
+    dark on a light background (-invert auto, or yes / no). At most two
+    chunks per worker are decoded ahead, the main process gathers them in
+    batches of -batch images for one forward pass of the network and writes
+    the predictions in the order of the file system (not sorted) in the -o
+    file (CSV, or JSONL with the output layers when it ends with .jsonl).
+    The memory used does not depend on the number of images, even in one
+    directory.
+
+    Practical use :
+        - ./classify.py networks/saved/testnw3 scans/ -o predictions.csv
+        - ./classify.py networks/saved/testnw3 scans/ -o predictions.jsonl -workers 8 -batch 1024
+        - ./classify.py networks/saved/testnw3 scans/ -o predictions.csv -invert no
+"""
+
+import sys
+import os
+import time
+import collections
+
+# options of the classification and their default
+CLASSIFY_ARGS = {"-o": None,
+                 "-workers": str(os.cpu_count() or 1),
+                 "-batch": "512",
+                 "-chunk": "64",
+                 "-invert": "auto"}
+
+
+
+def parseArgs(list_args):
+    """
+        Check the arguments of the classification.
+
+        Output :
+
+        <- (dir_load, directory, options) : the directory of the network, the
+                                            one of the images and the DICT
+                                            of the options.
+    """
+    from src.imageFolder import INVERT_MODES
+    if len(list_args) < 3 or not os.path.isdir(list_args[1]) or \
+            not os.path.isdir(list_args[2]):
+        print("ERROR : The program needs a saved neural network DIRECTORY and"
+            " a DIRECTORY of images as first arguments.")
+        print("Use : ./classify.py {network} {images} -o FILE [-workers NB]"
+            " [-batch NB] [-chunk NB] [-invert auto|yes|no]")
+        sys.exit(1)
+    options = dict(CLASSIFY_ARGS)
+    i = 3
+    while i < len(list_args):
+        if list_args[i] not in options or i+1 >= len(list_args):
+            print("ERROR : The argument", list_args[i], "is not valid.")
+            sys.exit(1)
+        options[list_args[i]] = list_args[i+1]
+        i += 2
+    if options["-o"] == None:
+        print("ERROR : The file of the predictions is required : -o FILE"
+            " (.csv or .jsonl).")
+        sys.exit(1)
+    for option in ("-workers", "-batch", "-chunk"):
+        if not options[option].isdigit() or int(options[option]) <= 0:
+            print("ERROR : " + option + " expects a strictly positive"
+                " integer.")
+            sys.exit(1)
+        options[option] = int(options[option])
+    if options["-invert"] not in INVERT_MODES:
+        print("ERROR : -invert expects one of", ", ".join(INVERT_MODES), ".")
+        sys.exit(1)
+    return (list_args[1], list_args[2], options)
+
+
+
+def main():
+    """
+        Main function.
+    """
+    dir_load, directory, options = parseArgs(sys.argv)
+    import multiprocessing
+    import numpy as np
+    from src.neuralNetwork import loadNetwork
+    from src.imageFolder import walkImages, chunks, decodeImages, \
+        PredictionWriter
+
+    network = loadNetwork(dir_load)
+    writer = PredictionWriter(options["-o"], directory)
+    batch_size = options["-batch"]
+    # decoded images waiting for a full batch : (paths, images, errors)
+    paths, images, errors = [], [], []
+    nb_images = 0
+    nb_errors = 0
+
+    def predictBatch(paths, images, errors):
+        images = np.concatenate(images)
+        output_layers = network.generateOuputLayers(images.T/255.0)
+        writer.write(paths, output_layers, errors)
+
+    start = time.perf_counter()
+    context = multiprocessing.get_context("fork")
+    with context.Pool(options["-workers"]) as pool:
+        jobs = collections.deque()
+        path_chunks = chunks(walkImages(directory), options["-chunk"])
+        while True:
+            # keep two chunks per worker decoding
+            while len(jobs) < 2*options["-workers"]:
+                chunk = next(path_chunks, None)
+                if chunk == None:
+                    break
+                jobs.append((chunk, pool.apply_async(decodeImages, (chunk,
+                             options["-invert"]))))
+            if len(jobs) == 0:
+                break
+            chunk, job = jobs.popleft()
+            chunk_images, chunk_errors = job.get()
+            paths += chunk
+            images.append(chunk_images)
+            errors += chunk_errors
+            nb_images += len(chunk)
+            nb_errors += sum(error != None for error in chunk_errors)
+            if len(paths) >= batch_size:
+                predictBatch(paths, images, errors)
+                paths, images, errors = [], [], []
+    if paths != []:
+        predictBatch(paths, images, errors)
+    writer.close()
+    duration = time.perf_counter() - start
+
+    print("%i images classified (%i unreadable) in %.2f s : %.0f images/s."
+          % (nb_images, nb_errors, duration, nb_images/max(duration, 1e-9)))
+    print("Predictions written in " + options["-o"] + ".")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""
+    Low-rank compression of a saved neural network.
+
+    Every fully connected weight matrix (except the output one) is replaced
+    by the product of two thin matrices given by its truncated SVD (see
+    src/compressedLayers.py), at a given rank (-ranks) or at the rank that
+    keeps a part of its energy (-energy). For each level the network can be
+    fine-tuned on the -ls first training images (-finetune) and is tested on
+    the -ts first testing images. The report gives for each level the number
+    of parameters, the FLOPs of a forward propagation, the latency of an
+    image and the test error compared to the loaded network.
+
+    The other arguments are the ones of main.py (-ls, -ts, -gdf...).
+
+    Practical use :
+        - ./compress.py networks/saved/testnw3 -ranks 10,25,50,100 -ts 2000
+        - ./compress.py networks/saved/testnw3 -energy 0.9,0.99 -finetune -ls 6000
+        - ./compress.py networks/saved/testnw3 -ranks 50 -finetune -ls 6000 -save networks/saved/testnw3r50
+"""
+
+import sys
+import os
+import time
+from src.argumentsManager import ArgsManager
+
+# options of the compression (the others are given to main.py) and their
+# default
+COMPRESS_ARGS = {"-ranks": None,
+                 "-energy": None,
+                 "-save": None}
+COMPRESS_FLAGS = ["-finetune"]
+
+
+
+def parseArgs(list_args):
+    """
+        Separate the options of the compression from the ones of main.py.
+
+        Output :
+
+        <- (options, base_args) : DICT of the compression options and LIST of
+                                  the arguments for main.py.
+    """
+    options = dict(COMPRESS_ARGS)
+    options["-finetune"] = False
+    base_args = ["main.py"]
+    i = 1
+    while i < len(list_args):
+        if list_args[i] in COMPRESS_FLAGS:
+            options[list_args[i]] = True
+            i += 1
+        elif list_args[i] in options:
+            if i+1 >= len(list_args):
+                print("ERROR : There is no argument after", list_args[i], ".")
+                sys.exit(1)
+            options[list_args[i]] = list_args[i+1]
+            i += 2
+        else:
+            base_args.append(list_args[i])
+            i += 1
+    return (options, base_args)
+
+
+
+def parseLevels(options):
+    """
+        Return the LIST of compression levels (rank, energy) asked.
+    """
+    levels = []
+    try:
+        if options["-ranks"] != None:
+            levels += [(int(rank), None) for rank in
+                       options["-ranks"].split(",")]
+        if options["-energy"] != None:
+            levels += [(None, float(energy)) for energy in
+                       options["-energy"].split(",")]
+    except ValueError:
+        print("ERROR : -ranks expects integers and -energy floats separated"
+            " by commas.")
+        sys.exit(1)
+    if levels == [] or any((rank != None and rank <= 0) or (energy != None
+            and not 0 < energy <= 1) for rank, energy in levels):
+        print("ERROR : At least one rank (-ranks 10,50) or energy (-energy"
+            " 0.9,0.99) is required, with ranks > 0 and energies in ]0, 1].")
+        sys.exit(1)
+    if options["-save"] != None and len(levels) != 1:
+        print("ERROR : -save needs exactly one compression level.")
+        sys.exit(1)
+    return levels
+
+
+
+def evaluate(network, testing_data):
+    """
+        Test a network and return its (error rate, latency of an image in
+        seconds).
+    """
+    start = time.perf_counter()
+    error_rate, _ = network.test(testing_data)
+    return (error_rate, (time.perf_counter() - start)/len(testing_data))
+
+
+
+def main():
+    """
+        Main function.
+    """
+    options, base_args = parseArgs(sys.argv)
+    levels = parseLevels(options)
+    args = ArgsManager(base_args + ["-NO-INFO"])
+    if args.dir_load == None:
+        print("ERROR : The program needs a saved neural network DIRECTORY as"
+            " first argument.")
+        sys.exit(1)
+    if options["-save"] != None and os.path.exists(options["-save"]):
+        print("ERROR : The path", options["-save"], "already exists.")
+        sys.exit(1)
+    from src.mnistHandwriting import loadMNIST
+    from src.neuralNetwork import NeuralNetwork
+    from src.compressedLayers import factorizeNetwork, fineTune, \
+        saveCompressed
+    from src.externalFunc import setProgress
+    setProgress("silent" if args.quiet else None, args.refresh)
+
+    def loadNetwork():
+        return NeuralNetwork(args.neural_network, args.squishing_funcs,
+                             args.dir_load, layer_specs=args.layer_specs)
+
+    if options["-finetune"]:
+        if args.layer_specs != None:
+            print("ERROR : A network with convolution layers cannot be"
+                " fine-tuned.")
+            sys.exit(1)
+        training_data = loadMNIST(0, args.learning_size, bTrain=True)
+    testing_data = loadMNIST(0, args.testing_size, bTrain=False)
+
+    network = loadNetwork()
+    loaded_flops = network.flops_forward
+    loaded_error, loaded_latency = evaluate(network, testing_data)
+    lines = ["%-14s %10s %12s %8s %14s %9s %9s" % ("Level", "Parameters",
+             "FLOPs", "Ratio", "Latency (us)", "Error %", "Change")]
+    def addLine(level, network, error_rate, latency):
+        nb_params = sum(weights.size + biases.size for weights, biases in
+                        zip(network.weights, network.biases))
+        lines.append("%-14s %10i %12i %7.2fx %14.1f %9.2f %+9.2f" % (level,
+                     nb_params, network.flops_forward,
+                     loaded_flops/network.flops_forward, latency*1e6,
+                     error_rate*100, (error_rate - loaded_error)*100))
+    addLine("loaded", network, loaded_error, loaded_latency)
+
+    for rank, energy in levels:
+        network = loadNetwork()
+        factorizeNetwork(network, rank, energy)
+        level = "rank %i" % rank if rank != None else "energy %g" % energy
+        addLine(level, network, *evaluate(network, testing_data))
+        if options["-finetune"]:
+            fineTune(network, training_data, args.grad_desc_factor)
+            addLine(level + " +ft", network, *evaluate(network,
+                                                       testing_data))
+        ranks = [weights.rank for weights in network.weights
+                 if hasattr(weights, "rank")]
+        print(level, ": ranks of the layers", ranks)
+
+    print("\n".join(lines))
+    if options["-save"] != None:
+        saveCompressed(network, args.dir_load, options["-save"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+
+"""
+    Resident training daemon. It loads the training and testing data sets
+    once and then runs the jobs it receives (the same arguments as main.py)
+    in a pool of processes, so that a job does not pay for the imports and
+    the loading of the data sets anymore. The progress and the results are
+    sent back to the client while the job runs. A job is one training and
+    one test : -kfold, -timers, -trace, -mem and -estimate are refused (use
+    main.py).
+
+    The daemon also predicts the digits of images (NUMPY FILE of uint8, one
+    image of 28x28 or 784 pixels per row) with a saved network. The outputs
+    are cached by image and network (see src/predictionCache.py) so that an
+    image sent again is answered without computing it : -cache-entries and
+    -cache-mb bound the cache of each network.
+
+    Practical use :
+        - ./daemon.py -start [-workers NB] [-ls NB] [-ts NB] &
+        - ./daemon.py networks/saved/testnw3 -ls 500 -ts 500 -bs 10
+        - ./daemon.py -predict networks/saved/testnw3 images.npy
+        - ./daemon.py -stop
+
+    Any command can be given -socket PATH to use another socket than the
+    default one.
+"""
+
+import sys
+import os
+import json
+import base64
+import socket
+import tempfile
+
+SOCKET = os.path.join(tempfile.gettempdir(),
+                      "digitLearning-%i.sock" % os.getuid())
+# options of the server and their default
+SERVER_ARGS = {"-workers": str(os.cpu_count() or 1),
+               "-ls": "60000",
+               "-ts": "10000",
+               "-cache-entries": "100000",
+               "-cache-mb": "64"}
+# data sets loaded once by the server and inherited by the workers
+DATA = {}
+# prediction caches of the server {absolute directory : PredictionCache}
+CACHES = {}
+
+
+
+class QueueWriter:
+    """
+        File-like object that sends every line written in it to a queue.
+        Used as stdout in the workers to stream the progress of a job.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text.replace("\r", "\n")
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            if line.strip() != "":
+                self.queue.put({"progress": line})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+
+def runDaemonJob(list_args, cwd, queue):
+    """
+        Run a job in a process of the pool. The sizes of the data sets are
+        the ones given by -ls and -ts (as with main.py).
+    """
+    from src.argumentsManager import ArgsManager
+    from src.jobRunner import runJob
+    stdout = sys.stdout
+    sys.stdout = QueueWriter(queue)
+    try:
+        os.chdir(cwd)
+        args = ArgsManager(list_args)
+        if args.learning_size > len(DATA["training"]) or \
+                args.testing_size > len(DATA["testing"]):
+            print("ERROR : The daemon only loaded", len(DATA["training"]),
+                "training images and", len(DATA["testing"]), "testing"
+                " images.")
+            return {"error": "data sets too small"}
+        _, _, results = runJob(list_args,
+                               DATA["training"][:args.learning_size],
+                               DATA["testing"][:args.testing_size])
+        return {"result": results}
+    except SystemExit:
+        # ArgsManager exits when an argument is wrong, the message was sent
+        return {"error": "invalid arguments"}
+    except Exception as details:
+        return {"error": repr(details)}
+    finally:
+        sys.stdout.flush()
+        sys.stdout = stdout
+
+
+
+def cacheTeacher(request):
+    """
+        Cache the outputs of the teacher of a job (-teacher) for the training
+        images loaded by the server, so that the workers only read them and
+        never compute and write them at the same time.
+    """
+    from src.distillation import teacherLogits
+    list_args = request["args"]
+    if "-teacher" not in list_args[:-1]:
+        return
+    dir_teacher = os.path.join(request["cwd"],
+                               list_args[list_args.index("-teacher")+1])
+    if os.path.isdir(dir_teacher):
+        # a wrong teacher is reported by the job itself
+        try:
+            teacherLogits(dir_teacher, DATA["training"])
+        except (Exception, SystemExit):
+            pass
+
+
+
+def predictImages(request, options):
+    """
+        Return the answer (DICT) to a prediction request : the digits of the
+        images and the counters of the cache of the network.
+    """
+    import numpy as np
+    from src.predictionCache import PredictionCache
+    dir_load = os.path.abspath(os.path.join(request["cwd"],
+                                            request["predict"]))
+    try:
+        images = np.frombuffer(base64.b64decode(request["images"]),
+                               dtype=np.uint8).reshape(-1, 784)
+        if dir_load not in CACHES:
+            CACHES[dir_load] = PredictionCache(dir_load,
+                int(options["-cache-entries"]),
+                int(float(options["-cache-mb"])*2**20))
+        cache = CACHES[dir_load]
+        output_layers = cache.predict(images)
+    except SystemExit:
+        return {"error": "invalid network " + dir_load}
+    except Exception as details:
+        return {"error": repr(details)}
+    return {"result": {"digits": np.argmax(output_layers, axis=1).tolist(),
+                       "cache": cache.stats()}}
+
+
+
+def send(connection, message):
+    """
+        Send a message (DICT) as a JSON line.
+    """
+    connection.sendall((json.dumps(message) + "\n").encode())
+
+
+
+def startServer(path, options):
+    """
+        Load the data sets, create the pool and serve the jobs until a stop
+        request.
+    """
+    import socketserver
+    import threading
+    import multiprocessing
+    from src.mnistHandwriting import loadMNIST
+    from src.externalFunc import setProgress
+
+    if os.path.exists(path):
+        print("ERROR : The socket", path, "already exists. Is a daemon"
+            " already running ? Otherwise remove it.")
+        sys.exit(1)
+    DATA["training"] = loadMNIST(0, int(options["-ls"]), bTrain=True)
+    DATA["testing"] = loadMNIST(0, int(options["-ts"]), bTrain=False)
+    # workers send a progress line every second
+    setProgress("log", log_interval=1.0)
+
+    context = multiprocessing.get_context("fork")
+    pool = context.Pool(int(options["-workers"]))
+    manager = context.Manager()
+    # the predictions and the outputs of the teachers are computed by the
+    # server, one request at a time
+    lock = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline().decode())
+            if request.get("stop"):
+                send(self.connection, {"result": "stopped"})
+                threading.Thread(target=server.shutdown).start()
+                return
+            if "predict" in request:
+                with lock:
+                    send(self.connection, predictImages(request, options))
+                return
+            with lock:
+                cacheTeacher(request)
+            queue = manager.Queue()
+            job = pool.apply_async(runDaemonJob, (request["args"],
+                                   request["cwd"], queue))
+            # stream the progress until the job is over
+            while True:
+                try:
+                    message = queue.get(timeout=0.05)
+                except Exception:
+                    if job.ready():
+                        break
+                    continue
+                send(self.connection, message)
+            while not queue.empty():
+                send(self.connection, queue.get())
+            send(self.connection, job.get())
+
+    server = socketserver.ThreadingUnixStreamServer(path, Handler)
+    print("Daemon ready on", path, "with", len(DATA["training"]), "training"
+        " images and", len(DATA["testing"]), "testing images.")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
+        pool.terminate()
+        manager.shutdown()
+
+
+
+def request(path, message):
+    """
+        Send a request to the daemon and print what it sends back.
+        Return the last message.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        print("ERROR : No daemon is listening on", path, ". Start it with"
+            " ./daemon.py -start.")
+        sys.exit(1)
+    send(client, message)
+    last = None
+    for line in client.makefile("r"):
+        last = json.loads(line)
+        if "progress" in last:
+            print(last["progress"])
+    client.close()
+    return last
+
+
+
+def main():
+    """
+        Main function.
+    """
+    list_args = sys.argv[1:]
+    path = SOCKET
+    if "-socket" in list_args:
+        index = list_args.index("-socket")
+        path = list_args[index+1]
+        del list_args[index:index+2]
+    if len(list_args) == 0:
+        print("ERROR : Use ./daemon.py -start, ./daemon.py -stop,"
+            " ./daemon.py -predict DIRECTORY FILE.npy or ./daemon.py"
+            " {arguments of main.py}.")
+        sys.exit(1)
+
+    if list_args[0] == "-start":
+        options = dict(SERVER_ARGS)
+        options.update(zip(list_args[1::2], list_args[2::2]))
+        startServer(path, options)
+    elif list_args[0] == "-stop":
+        request(path, {"stop": True})
+        print("Daemon stopped.")
+    elif list_args[0] == "-predict":
+        if len(list_args) != 3 or not os.path.isfile(list_args[2]):
+            print("ERROR : Use ./daemon.py -predict DIRECTORY FILE.npy.")
+            sys.exit(1)
+        import numpy as np
+        images = np.load(list_args[2]).astype(np.uint8)
+        answer = request(path, {"predict": list_args[1],
+                                "images": base64.b64encode(
+                                    images.tobytes()).decode(),
+                                "cwd": os.getcwd()})
+        if answer == None or "error" in answer:
+            print("ERROR : The prediction failed :",
+                answer and answer["error"])
+            sys.exit(1)
+        print(" ".join(str(digit) for digit in answer["result"]["digits"]))
+        cache = answer["result"]["cache"]
+        print("Cache : %i hits, %i misses (%.1f %%), %i evictions, %i"
+              " invalidations, %i entries (%.1f kB)" % (cache["hits"],
+              cache["misses"], cache["hit_rate"]*100, cache["evictions"],
+              cache["invalidations"], cache["entries"], cache["bytes"]/1024))
+    else:
+        answer = request(path, {"args": ["main.py"] + list_args,
+                                "cwd": os.getcwd()})
+        if answer == None or "error" in answer:
+            print("ERROR : The job failed :", answer and answer["error"])
+            sys.exit(1)
+        results = answer["result"]
+        print("The error rate is", results["error_rate"]*100, "%.")
+
+
+if __name__ == '__main__':
+    main()
@@ -18,12 +18,70 @@
     http://sametmax.com/les-docstrings/
 """
 
-import numpy as np
 import sys
 import time
-from src.mnistHandwriting import *
-from src.neuralNetwork import *
 from src.argumentsManager import *
+from src.instrumentation import INSTRUMENT
+
+
+def runKfold(args, training_data):
+    """
+        K-fold cross-validation of the arguments (see src/crossValidation.py)
+        written in the run log of the saved directory.
+    """
+    from src.crossValidation import crossValidate
+    from src.runLog import createRecord, appendRun
+    from src.distillation import teacherLogits
+    # the outputs of the teacher are cached before the folds start so that
+    # they are computed only once
+    if args.teacher != None:
+        teacherLogits(args.teacher, training_data)
+    start = time.time()
+    with INSTRUMENT.phase("kfold"):
+        results = crossValidate(sys.argv, training_data, args.kfold)
+    timings = {"kfold": time.time() - start}
+    print("The error rate is", results["error_rate"]*100, "% (standard"
+        " deviation", results["error_rate_std"]*100, "%) over", args.kfold,
+        "folds.")
+    print("The average cost is", results["average_cost"], "(standard"
+        " deviation", results["average_cost_std"], ").")
+    if args.dir_save != None and args.to_info:
+        record = createRecord(args, results["error_rate"],
+            results["average_cost"], timings, kfold=args.kfold,
+            error_rate_std=results["error_rate_std"],
+            average_cost_std=results["average_cost_std"],
+            folds=results["folds"],
+            learning_size=args.learning_size - args.learning_size//args.kfold,
+            testing_size=args.learning_size//args.kfold)
+        appendRun(args.dir_save, record)
+
+
+
+def testCompressed(args):
+    """
+        Test a compressed network (see compress.py and prune.py). It cannot
+        be trained, so that the training images are not loaded.
+    """
+    from src.mnistHandwriting import loadMNIST
+    from src.neuralNetwork import NeuralNetwork
+    # the options of the training (and -sparse) have nothing to do
+    if args.sparse_input or args.kfold != None or args.teacher != None or \
+            args.augment > 0 or args.sampling != None or \
+            args.input_stage != None or args.dir_save != None:
+        print("ERROR : The network", args.dir_load, "is compressed, it can"
+            " only be tested : -sparse, -kfold, -teacher, -augment,"
+            " -sampling, -input, -S and -init=S cannot be used.")
+        sys.exit(1)
+    with INSTRUMENT.phase("init"):
+        network = NeuralNetwork(args.neural_network, args.squishing_funcs,
+                    args.dir_load, layer_specs=args.layer_specs)
+    print("The network is compressed, it is only tested.")
+    with INSTRUMENT.phase("load"):
+        testing_data = loadMNIST(0, args.testing_size, bTrain=False)
+    with INSTRUMENT.phase("test"):
+        error_rate, _ = network.test(testing_data)
+    print("The error rate is", error_rate*100, "%.")
+
 
 
 # main function to execute the whole thing
@@ -31,33 +89,123 @@ def main():
     """
         Main function. It calls everything to make the whole thing work
     """
+    # the memory is traced before the imports so that the memory report
+    # (see src/memoryReport.py) measures them
+    if "-mem" in sys.argv:
+        import tracemalloc
+        tracemalloc.start()
     args = ArgsManager(sys.argv)
+    # imported once the arguments are checked so that the help and the
+    # errors on the arguments are displayed without loading numpy
+    from src.mnistHandwriting import loadMNIST
+    from src.neuralNetwork import NeuralNetwork
+    from src.inputStage import fitInputStage
+    from src.importanceSampling import createSampler
+    from src.distillation import createDistilled
+    from src.augmentation import createAugmented, AugmentedDataset
+    from src.compressedLayers import isCompressed
+    from src.externalFunc import setProgress
     if args.to_display:
         args.display()
-
+    INSTRUMENT.enable(args.timers or args.trace_file != None or args.memory)
+    setProgress("silent" if args.quiet else None, args.refresh)
+
+    # estimate (and measure if asked) the memory needed by the run
+    if args.memory or args.estimate:
+        from src.memoryReport import MemoryReport, estimateMemory, \
+            printEstimate
+        from src.sharedDataset import attachDataset
+        printEstimate(estimateMemory(args.neural_network, args.learning_size,
+                      args.testing_size, args.batches_size,
+                      attachDataset(True) != None, args.layer_specs))
+        if args.estimate:
+            sys.exit(0)
+        memory_report = MemoryReport()
+        INSTRUMENT.addHook(memory_report.hook)
+
+    # a compressed network cannot be trained, it is only tested
+    compressed = args.dir_load != None and isCompressed(args.dir_load)
     # initilization of the training data set
-    training_data = MNISTexample(0, args.learning_size, bTrain=True)
-
-    # creation of the network
-    network = NeuralNetwork(args.neural_network, args.squishing_funcs,
-                args.dir_load)
-
-    # train the network
-    network.trainNEO(training_data, args.batches_size, args.grad_desc_factor,
-                   args.repeat)
-
-    # save the network after training (if args.save != False)
-    if args.dir_save != None:
-        network.save(args.dir_save)
-
-    # test the network
-    testing_data = MNISTexample(0, args.testing_size, bTrain=False)
-    error_rate, average_cost = network.test(testing_data)
-    print("The error rate is", error_rate*100, "%.")
-
-    # write all the information on the training in the corrspondant CSV file
-    if args.dir_save != None and args.to_info:
-        network.inform(args, error_rate, average_cost)
+    if not compressed:
+        with INSTRUMENT.phase("load"):
+            training_data = loadMNIST(0, args.learning_size, bTrain=True)
+
+    if compressed:
+        testCompressed(args)
+    elif args.kfold != None:
+        # k-fold cross-validation instead of a single training and test
+        runKfold(args, training_data)
+    else:
+        # creation of the network (and of its input stage if asked)
+        with INSTRUMENT.phase("init"):
+            input_stage = fitInputStage(args, training_data)
+            if input_stage != None:
+                print("Input stage :", input_stage.describe())
+                if args.to_display and hasattr(input_stage, "varianceReport"):
+                    print("\n".join(input_stage.varianceReport()))
+            network = NeuralNetwork(args.neural_network, args.squishing_funcs,
+                        args.dir_load, input_stage, args.sparse_input,
+                        args.layer_specs)
+
+        # train the network (on distorted copies of the images if asked)
+        training_data = createAugmented(args, training_data)
+        # expected outputs given by the teacher if asked
+        if args.teacher != None:
+            with INSTRUMENT.phase("teacher"):
+                training_data = createDistilled(args, training_data)
+        # images drawn according to their cost if asked
+        sampler = createSampler(args, training_data)
+        start = time.time()
+        try:
+            with INSTRUMENT.phase("train"):
+                network.trainNEO(training_data, args.batches_size,
+                            args.grad_desc_factor, args.repeat, sampler)
+        finally:
+            # stop the thread that distorts the images
+            if isinstance(training_data, AugmentedDataset):
+                training_data.close()
+        timings = {"train": time.time() - start}
+
+        # save the network after training (if args.save != False)
+        if args.dir_save != None:
+            with INSTRUMENT.phase("save"):
+                network.save(args.dir_save)
+
+        # test the network
+        with INSTRUMENT.phase("load"):
+            testing_data = loadMNIST(0, args.testing_size, bTrain=False)
+        start = time.time()
+        with INSTRUMENT.phase("test"):
+            error_rate, average_cost = network.test(testing_data)
+        timings["test"] = time.time() - start
+        print("The error rate is", error_rate*100, "%.")
+        # the approximated functions are compared with the exact ones
+        if args.squishing_funcs_str.endswith(":lut"):
+            from src.squishingFunc import ExactSquishing
+            approximated = network.squishing_funcs
+            network.squishing_funcs = [ExactSquishing(functions) for
+                                       functions in approximated]
+            exact_error_rate, _ = network.test(testing_data)
+            network.squishing_funcs = approximated
+            print("With the exact squishing functions the error rate is",
+                exact_error_rate*100, "%.")
+
+        # write all the information on the training in the correspondant run
+        # log with the metrics of each training step
+        if args.dir_save != None and args.to_info:
+            metrics_file = network.metrics.save(args.dir_save)
+            network.inform(args, error_rate, average_cost, timings,
+                           metrics_file)
+
+    # display and/or export what the instrumentation measured
+    if args.timers:
+        print("\n".join(INSTRUMENT.summary()))
+    if args.trace_file != None:
+        INSTRUMENT.exportChromeTrace(args.trace_file)
+        print("Trace created in " + args.trace_file + ".")
+    if args.memory:
+        memory_report.stop()
+        print("\n".join(memory_report.report()))
 
     # temporal tests
     # print(training_data[0][1])
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""
+    Iterative magnitude pruning of a saved neural network.
+
+    For each sparsity level (-levels, in increasing order) the weights of
+    smallest magnitude of every fully connected matrix (except the output
+    one) are removed until the level is reached, then the network can be
+    retrained on the -ls first training images (-retrain) with the pruned
+    weights kept at zero, and the next level starts from it. Each level is
+    tested on the -ts first testing images with its pruned matrices stored
+    in the CSR layout (see src/compressedLayers.py). The report gives for
+    each level the number of nonzero weights, the FLOPs, the test error and
+    the latency of an image with the dense matrices and with the sparse
+    ones, image by image and in batches of -batch images.
+
+    The other arguments are the ones of main.py (-ls, -ts, -bs, -gdf...).
+
+    Practical use :
+        - ./prune.py networks/saved/testnw3 -levels 0.5,0.8,0.9,0.95 -ts 2000
+        - ./prune.py networks/saved/testnw3 -levels 0.5,0.8,0.9 -retrain -ls 6000 -bs 10
+        - ./prune.py networks/saved/testnw3 -levels 0.5,0.9 -retrain -ls 6000 -save networks/saved/testnw3p90
+"""
+
+import sys
+import os
+import time
+import copy
+from src.argumentsManager import ArgsManager
+
+# options of the pruning (the others are given to main.py) and their default
+PRUNE_ARGS = {"-levels": None,
+              "-batch": "256",
+              "-save": None}
+PRUNE_FLAGS = ["-retrain"]
+
+
+
+def parseArgs(list_args):
+    """
+        Separate the options of the pruning from the ones of main.py.
+
+        Output :
+
+        <- (options, base_args) : DICT of the pruning options and LIST of the
+                                  arguments for main.py.
+    """
+    options = dict(PRUNE_ARGS)
+    options["-retrain"] = False
+    base_args = ["main.py"]
+    i = 1
+    while i < len(list_args):
+        if list_args[i] in PRUNE_FLAGS:
+            options[list_args[i]] = True
+            i += 1
+        elif list_args[i] in options:
+            if i+1 >= len(list_args):
+                print("ERROR : There is no argument after", list_args[i], ".")
+                sys.exit(1)
+            options[list_args[i]] = list_args[i+1]
+            i += 2
+        else:
+            base_args.append(list_args[i])
+            i += 1
+    return (options, base_args)
+
+
+
+def parseLevels(options):
+    """
+        Return the LIST of sparsity levels asked (sorted).
+    """
+    try:
+        levels = sorted(float(level) for level in
+                        (options["-levels"] or "").split(","))
+    except ValueError:
+        levels = []
+    if levels == [] or not all(0 <= level < 1 for level in levels):
+        print("ERROR : The sparsity levels are required : -levels 0.5,0.9"
+            " (floats in [0, 1[).")
+        sys.exit(1)
+    if not options["-batch"].isdigit() or int(options["-batch"]) <= 0:
+        print("ERROR : -batch expects a strictly positive integer.")
+        sys.exit(1)
+    return levels
+
+
+
+def imageLatency(network, images):
+    """
+        Return the time to compute the output layer of an image when the
+        images (NUMPY MATRIX (784, number of images)) are given one by one.
+    """
+    start = time.perf_counter()
+    for index in range(0, images.shape[1]):
+        network.generateOuputLayer(images[:, index])
+    return (time.perf_counter() - start)/images.shape[1]
+
+
+
+def batchLatency(network, images, batch_size):
+    """
+        Return the time to compute the output layer of an image when the
+        images (NUMPY MATRIX (784, number of images)) are given by batches.
+    """
+    start = time.perf_counter()
+    for first in range(0, images.shape[1], batch_size):
+        network.generateOuputLayers(images[:, first:first+batch_size])
+    return (time.perf_counter() - start)/images.shape[1]
+
+
+
+def main():
+    """
+        Main function.
+    """
+    options, base_args = parseArgs(sys.argv)
+    levels = parseLevels(options)
+    batch_size = int(options["-batch"])
+    args = ArgsManager(base_args + ["-NO-INFO"])
+    if args.dir_load == None:
+        print("ERROR : The program needs a saved neural network DIRECTORY as"
+            " first argument.")
+        sys.exit(1)
+    if options["-save"] != None and os.path.exists(options["-save"]):
+        print("ERROR : The path", options["-save"], "already exists.")
+        sys.exit(1)
+    from src.mnistHandwriting import loadMNIST
+    from src.neuralNetwork import NeuralNetwork
+    from src.compressedLayers import magnitudeMasks, sparsifyNetwork, \
+        saveCompressed
+    from src.externalFunc import setProgress
+    setProgress("silent" if args.quiet else None, args.refresh)
+
+    network = NeuralNetwork(args.neural_network, args.squishing_funcs,
+                            args.dir_load, layer_specs=args.layer_specs)
+    if network.compressed:
+        print("ERROR : The network", args.dir_load, "is already compressed.")
+        sys.exit(1)
+    if options["-retrain"]:
+        training_data = loadMNIST(0, args.learning_size, bTrain=True)
+    testing_data = loadMNIST(0, args.testing_size, bTrain=False)
+    images = testing_data.images[testing_data.indices].T/255.0
+
+    loaded_flops = network.flops_forward
+    loaded_error, _ = network.test(testing_data)
+    lines = ["%-10s %10s %12s %9s %9s %11s %11s %11s %11s" % ("Sparsity",
+             "Nonzero", "FLOPs", "Error %", "Change", "Dense (us)",
+             "CSR (us)", "Dense/bat", "CSR/bat")]
+    for level in levels:
+        network.masks = magnitudeMasks(network, level)
+        network.applyMasks()
+        if options["-retrain"]:
+            network.trainNEO(training_data, args.batches_size,
+                             args.grad_desc_factor, args.repeat)
+        sparse = copy.deepcopy(network)
+        sparsifyNetwork(sparse)
+        error_rate, _ = sparse.test(testing_data)
+        nonzero = sum(weights.size for weights in sparse.weights)
+        latencies = [imageLatency(network, images),
+                     imageLatency(sparse, images),
+                     batchLatency(network, images, batch_size),
+                     batchLatency(sparse, images, batch_size)]
+        lines.append("%-10s %10i %12i %9.2f %+9.2f %11.1f %11.1f %11.1f"
+                     " %11.1f" % (("%g %%" % (level*100), nonzero,
+                     sparse.flops_forward, error_rate*100,
+                     (error_rate - loaded_error)*100) +
+                     tuple(latency*1e6 for latency in latencies)))
+
+    print("\nLoaded network : %i FLOPs, error %.2f %%" % (loaded_flops,
+          loaded_error*100))
+    print("\n".join(lines))
+    if options["-save"] != None:
+        saveCompressed(sparse, args.dir_load, options["-save"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""
+    Report of all the runs logged for a saved neural network.
+    It prints the pipe-separated view (the same as the old info.csv file)
+    sorted from the newest run to the oldest one.
+
+    Practical use :
+        - ./runReport.py networks/saved/{dir_name}
+        - ./runReport.py networks/saved/{dir_name} -n 10 -o report.csv
+"""
+
+import sys
+import os
+from src.runLog import formatRuns
+
+
+def main():
+    """
+        Main function.
+    """
+    if len(sys.argv) < 2 or not os.path.isdir(sys.argv[1]):
+        print("ERROR : The program needs a saved neural network DIRECTORY as"
+            " first argument.")
+        print("Use : ./runReport.py networks/saved/{dir_name} [-n NB]"
+            " [-o FILE_NAME]")
+        sys.exit(1)
+
+    dir_load = sys.argv[1]
+    limit = None
+    output_file = None
+    i = 2
+    while i < len(sys.argv):
+        if i+1 >= len(sys.argv):
+            print("ERROR : There is no argument after", sys.argv[i], ".")
+            sys.exit(1)
+        if sys.argv[i] == "-n" and sys.argv[i+1].isdigit():
+            limit = int(sys.argv[i+1])
+        elif sys.argv[i] == "-o":
+            output_file = sys.argv[i+1]
+        else:
+            print("ERROR : The argument", sys.argv[i], sys.argv[i+1],
+                "is not valid.")
+            sys.exit(1)
+        i += 2
+
+    lines = formatRuns(dir_load, limit)
+    if output_file == None:
+        print("\n".join(lines))
+    else:
+        with open(output_file, "w") as document:
+            document.write("\n".join(lines) + "\n")
+        print("Report created in " + output_file + ".")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""
+    Publish the decoded MNIST data sets in shared memory so that every run
+    on this machine (main.py, sweep.py, daemon.py...) attaches to the same
+    read-only copy instead of loading its own.
+
+    Practical use :
+        - ./shareDataset.py -publish
+        - ./shareDataset.py -status
+        - ./shareDataset.py -unlink
+"""
+
+import sys
+from src.sharedDataset import publishDataset, attachDataset, \
+    unpublishDataset, SEGMENT_NAMES
+
+
+def main():
+    """
+        Main function.
+    """
+    if len(sys.argv) != 2 or sys.argv[1] not in ("-publish", "-status",
+                                                  "-unlink"):
+        print("ERROR : Use ./shareDataset.py -publish|-status|-unlink.")
+        sys.exit(1)
+
+    for bTrain in (True, False):
+        name = SEGMENT_NAMES[bTrain]
+        if sys.argv[1] == "-publish":
+            if attachDataset(bTrain) != None:
+                print(name, "is already published.")
+                continue
+            manifest = publishDataset(bTrain)
+            print(name, "published :", manifest["arrays"]["images"]["shape"][0],
+                "images.")
+        elif sys.argv[1] == "-status":
+            shared = attachDataset(bTrain)
+            if shared == None:
+                print(name, "is not published.")
+            else:
+                images, labels, segment = shared
+                print(name, "is published :", len(labels), "images,",
+                    segment.size, "bytes.")
+                segment.close()
+        else:
+            if unpublishDataset(bTrain):
+                print(name, "removed.")
+            else:
+                print(name, "is not published.")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,22 +7,32 @@
     parameters by creating a class to manage them.
 """
 
-import sys, os, csv
-import numpy as np
-from src.externalFunc import *
-from src.squishingFunc import *
+import sys, os
+from src.runLog import RUN_LOG
+
+# BEWARE : the modules using numpy (squishingFunc, externalFunc) are only
+# imported when an argument needs them so that the help and the errors on
+# the arguments are displayed without loading numpy
 
 # unchanging values
 SIZE_INPUT = 784 # 28 * 28 = 784 pixels
 SIZE_OUTPUT = 10 # number of numbers between 0 and 9
+INPUT_SHAPE = (1, 28, 28) # (channels, rows, columns) of an image
 SIZE_TRAINING = 60000
 SIZE_TESTING = 10000
 # you can choose the value for the following global constant
 REPETITION_LIMIT = 1000
-POSSIBLE_ARGS_WITHOUT_PARAM = ["-S", "-v", "-NO-INFO"]
-POSSIBLE_ARGS_WITH_PARAM = ["-bs", "-sf", "-gdf", "-r", "-ls", "-ts", "-init=S"]
+DEFAULT_TEMPERATURE = 2.0
+POSSIBLE_ARGS_WITHOUT_PARAM = ["-S", "-v", "-NO-INFO", "-timers", "-mem",
+    "-estimate", "-q", "-sparse"]
+POSSIBLE_ARGS_WITH_PARAM = ["-bs", "-sf", "-gdf", "-r", "-ls", "-ts", "-init=S",
+    "-trace", "-refresh", "-kfold", "-input", "-augment", "-sampling",
+    "-teacher", "-temp"]
 ALL_POSSIBLE_ARGS = POSSIBLE_ARGS_WITH_PARAM + POSSIBLE_ARGS_WITHOUT_PARAM
 POSSIBLE_SQUISHING_FUNC = ["Sigmoid", "ReEU", "ReLU"]
+POSSIBLE_SQUISHING_MODE = ["", "lut"]
+POSSIBLE_INPUT_STAGES = ["pixels", "pca"]
+POSSIBLE_LAYER_TYPES = ["conv", "pool"]
 POSSIBLE_GRAD_DESC_FACT_FUNC = ["NegPower{anyPosFloat}",
     "Constant{anyPosFloat}"]
 HELP = ["help", "-help", "--help", "h", "-h", "--h", "HELP", "-HELP", "--HELP"
@@ -43,11 +53,12 @@ class ArgsManager:
         # do not ask for a special parameters it works all the same.
         # BEWARE : the neural network argument is required (not optional)
         self.neural_network = None
+        self.layer_specs = None
         self.batches_size = 1
         self.squishing_funcs = None
         self.squishing_funcs_str = None
-        self.grad_desc_factor = (NegPower, 1.3)
-        self.grad_desc_factor_str = "NegPower1.3"
+        self.grad_desc_factor = None
+        self.grad_desc_factor_str = None
         self.repeat = 0
         self.learning_size = 60000
         self.testing_size = 10000
@@ -56,6 +67,22 @@ class ArgsManager:
 
         self.to_display = False
         self.to_info = True
+        self.timers = False
+        self.trace_file = None
+        self.memory = False
+        self.estimate = False
+        self.quiet = False
+        self.refresh = None
+        self.kfold = None
+        self.input_stage = None
+        self.input_stage_str = None
+        self.sparse_input = False
+        self.augment = 0
+        self.augment_seed = 0
+        self.sampling = None
+        self.sampling_str = None
+        self.teacher = None
+        self.temperature = None
 
         # analyse the given arguments and set them in the class
         self.analyseArgs(list_args)
@@ -63,16 +90,61 @@ class ArgsManager:
         # in case there was no choice for the squishing funcs in the arguments
         # set the squishing func to default mode => Sigmoid
         if self.squishing_funcs == None:
+            from src.squishingFunc import Sigmoid, InvSigmoid, DerSigmoid
             nb_layer = len(self.neural_network)
             self.squishing_funcs = [(Sigmoid, InvSigmoid, DerSigmoid)] \
                     * (nb_layer-1)
             self.squishing_funcs_str = "Sigmoid"
 
+        # same for the gradient descent factor => NegPower1.3
+        if self.grad_desc_factor == None:
+            from src.externalFunc import NegPower
+            self.grad_desc_factor = (NegPower, 1.3)
+            self.grad_desc_factor_str = "NegPower1.3"
+
         # after analysing say if the batch size is correct
         if self.learning_size % self.batches_size != 0:
             print("ERROR : The learning size has to be divisible by the"
                 " batch size.")
             sys.exit(1)
+        if self.sampling != None and \
+                self.sampling[0] % self.batches_size != 0:
+            print("ERROR : The number of images drawn by -sampling has to be"
+                " divisible by the batch size.")
+            sys.exit(1)
+        # the distorted images are computed by chunks in the order of the
+        # data set, the sampler draws them at random
+        if self.sampling != None and self.augment > 0:
+            print("ERROR : -sampling cannot be used with -augment.")
+            sys.exit(1)
+        # a projection on principal components has no zero input
+        if self.sparse_input and self.input_stage != None and \
+                self.input_stage[0] == "pca":
+            print("ERROR : -sparse cannot be used with the pca input stage.")
+            sys.exit(1)
+        # the outputs of the teacher are computed once for the images
+        if self.temperature != None and self.teacher == None:
+            print("ERROR : -temp needs a teacher network (-teacher).")
+            sys.exit(1)
+        if self.teacher != None and self.augment > 0:
+            print("ERROR : -teacher cannot be used with -augment.")
+            sys.exit(1)
+        if self.teacher != None and self.temperature == None:
+            self.temperature = DEFAULT_TEMPERATURE
+        # the convolution layers are computed on whole images
+        if self.layer_specs != None and (self.sparse_input or
+                                         self.input_stage != None):
+            print("ERROR : -sparse and -input cannot be used with convolution"
+                " layers.")
+            sys.exit(1)
+        # each fold is trained on the learning size without one fold
+        if self.kfold != None:
+            if self.learning_size % self.kfold != 0 or (self.learning_size -
+                    self.learning_size//self.kfold) % self.batches_size != 0:
+                print("ERROR : With -kfold the learning size has to be"
+                    " divisible by the number of folds and the training size"
+                    " of a fold by the batch size.")
+                sys.exit(1)
 
 
 
@@ -101,11 +173,11 @@ class ArgsManager:
         # ---------------------- optional parameters --------------------------
         i = 2
         while i < nb_arg:
-            curr_arg = sys.argv[i]
+            curr_arg = list_args[i]
             if curr_arg not in POSSIBLE_ARGS_WITHOUT_PARAM:
                 if curr_arg in POSSIBLE_ARGS_WITH_PARAM:
                     try:
-                        arg = sys.argv[i+1]
+                        arg = list_args[i+1]
                     except:
                         print("ERROR : There is no argument after", curr_arg,
                             ".")
@@ -145,8 +217,53 @@ class ArgsManager:
                 self.to_display = True
                 i -= 1
             elif curr_arg == "-NO-INFO":
-                # to say that this is a test => do NOT put info in the cvs file
+                # to say that this is a test => do NOT put info in the run log
                 self.to_info = False
+                i -= 1
+            elif curr_arg == "-timers":
+                # display the time spent in each phase at the end
+                self.timers = True
+                i -= 1
+            elif curr_arg == "-mem":
+                # display the memory used in each phase at the end
+                self.memory = True
+                i -= 1
+            elif curr_arg == "-estimate":
+                # only display the estimated memory needed by the run
+                self.estimate = True
+                i -= 1
+            elif curr_arg == "-sparse":
+                # first layer computed only with the nonzero pixels
+                self.sparse_input = True
+                i -= 1
+            elif curr_arg == "-q":
+                # quiet => no progress bar at all
+                self.quiet = True
+                i -= 1
+            elif curr_arg == "-refresh":
+                # minimum time between two redraws of the progress bars
+                self.checkRefreshArg(arg)
+            elif curr_arg == "-kfold":
+                # k-fold cross-validation instead of the test
+                self.checkKfoldArg(arg)
+            elif curr_arg == "-sampling":
+                # images drawn according to their cost
+                self.checkSamplingArg(arg)
+            elif curr_arg == "-augment":
+                # distorted copies of the training images
+                self.checkAugmentArg(arg)
+            elif curr_arg == "-teacher":
+                # network distilled into the trained one
+                self.checkTeacherArg(arg)
+            elif curr_arg == "-temp":
+                # temperature of the outputs of the teacher
+                self.checkTemperatureArg(arg)
+            elif curr_arg == "-input":
+                # input stage fitted on the training images
+                self.checkInputArg(arg)
+            elif curr_arg == "-trace":
+                # export the phases in a Chrome trace-event JSON file
+                self.trace_file = arg
             else:
                 print("ERROR : The argument", curr_arg, "doesn't exist.")
                 sys.exit(1)
@@ -182,22 +299,74 @@ class ArgsManager:
                 len_layers = [0] * (int(first_line) + 2)
                 # len_layers = np.ones(int(first_line) + 2) #float find solution
             len_layers[0] = SIZE_INPUT
+            # (channels, rows, columns) of the current layer as long as there
+            # are only convolution and pooling layers (see convolution.py)
+            shape = INPUT_SHAPE
+            layer_specs = []
             index = 1
             for line in document:
                 string = line[:-1]
                 if string != "":
-                    if not string.isdigit() or int(string) <= 0:
+                    words = string.split()
+                    if words[0] in POSSIBLE_LAYER_TYPES:
+                        (spec, shape) = self.checkLayerSpec(words, index,
+                                                            shape)
+                        len_layers[index] = shape[0]*shape[1]*shape[2]
+                        layer_specs.append(spec)
+                        index += 1
+                    elif not string.isdigit() or int(string) <= 0:
                         print("ERROR : The layer n°", index,
-                            "is equal to", int(string), ".")
-                        print("A layer must be a strictly positive integer.")
+                            "is equal to", string, ".")
+                        print("A layer must be a strictly positive integer"
+                            " or a layer type among", POSSIBLE_LAYER_TYPES,
+                            ".")
                         sys.exit(1)
                     else:
                         len_layers[index] = int(string)
+                        layer_specs.append(None)
+                        shape = None
                         index += 1
             len_layers[len(len_layers)-1] = SIZE_OUTPUT
+            layer_specs.append(None)
             document.close()
             # set the attribute neural network to the len_layer
             self.neural_network = len_layers
+            # None for a fully connected layer (and all of them when there is
+            # no convolution)
+            if any(spec != None for spec in layer_specs):
+                self.layer_specs = layer_specs
+
+
+
+    def checkLayerSpec(self, words, index, shape):
+        """
+            Check a convolution ("conv {filters} {size}") or pooling
+            ("pool {size}") line of the neural network document.
+            Return the layer spec and the shape of the layer it computes.
+        """
+        if shape == None:
+            print("ERROR : The layer n°", index, "is a", words[0], "layer"
+                " after a fully connected one.")
+            sys.exit(1)
+        nb_params = 2 if words[0] == "conv" else 1
+        if len(words) != nb_params + 1 or not all(word.isdigit() and
+                int(word) > 0 for word in words[1:]):
+            print("ERROR : The layer n°", index, "is equal to",
+                " ".join(words), ".")
+            print("Expected : conv {number of filters} {size of the filters}"
+                " or pool {size of the pooling} (strictly positive integers).")
+            sys.exit(1)
+        spec = (words[0],) + tuple(int(word) for word in words[1:])
+        channels, rows, columns = shape
+        if words[0] == "conv":
+            shape = (spec[1], rows - spec[2] + 1, columns - spec[2] + 1)
+        else:
+            shape = (channels, rows//spec[1], columns//spec[1])
+        if shape[1] <= 0 or shape[2] <= 0:
+            print("ERROR : The layer n°", index, "(", " ".join(words), ")"
+                " is bigger than its input of", rows, "x", columns, ".")
+            sys.exit(1)
+        return (spec, shape)
 
 
 
@@ -225,8 +394,16 @@ class ArgsManager:
         """
             Check the optional argument squishing functions.
         """
+        from src.squishingFunc import Sigmoid, InvSigmoid, DerSigmoid, ReEU, \
+            InvReEU, DerReEU, ReLU, InvReLU, DerReLU, LUTSquishing
         # list of function associated to each layer
         nb_layer = len(self.neural_network)
+        # ex : Sigmoid:lut => approximated Sigmoid using a lookup table
+        arg, _, mode = arg.partition(":")
+        if mode not in POSSIBLE_SQUISHING_MODE:
+            print("ERROR : The given squishing function mode", mode, "doesn't"
+                " correspond to any possible mode :", POSSIBLE_SQUISHING_MODE)
+            sys.exit(1)
         if arg == "Sigmoid":
             self.squishing_funcs = [(Sigmoid, InvSigmoid, DerSigmoid)] \
                 * (nb_layer-1)
@@ -243,6 +420,10 @@ class ArgsManager:
             print("The given squishing function", arg, "doesn't correspond to"
                 " any possible function :", POSSIBLE_SQUISHING_FUNC)
             sys.exit(1)
+        if mode == "lut":
+            self.squishing_funcs = [LUTSquishing(functions) for functions
+                in self.squishing_funcs]
+            self.squishing_funcs_str += ":lut"
 
 
 
@@ -251,6 +432,7 @@ class ArgsManager:
             Used to simplify the code in the checkGradientDescentFactorArg
             function.
         """
+        from src.externalFunc import isfloat
         if not isfloat(str_value):
             print("ERROR : The value in the optional argument gradient "
                 "descent factor for the", str_name_func, "function is",
@@ -270,6 +452,7 @@ class ArgsManager:
         """
             Check the optional argument gradient descent factor.
         """
+        from src.externalFunc import Constant, NegPower
         if arg[0:8] == "Constant":
             self.displayErrorGrad("Constant", arg[8:], Constant)
         elif arg[0:8] == "NegPower":
@@ -344,6 +527,133 @@ class ArgsManager:
 
 
 
+    def checkRefreshArg(self, arg):
+        """
+            Check the optional argument refresh (in milliseconds).
+        """
+        if not arg.isdigit():
+            print("ERROR : The refresh argument", arg, "is not a integer.")
+            sys.exit(1)
+        else:
+            self.refresh = int(arg)/1000
+
+
+
+    def checkKfoldArg(self, arg):
+        """
+            Check the optional argument kfold (number of folds).
+        """
+        if not arg.isdigit():
+            print("ERROR : The kfold argument", arg, "is not a integer.")
+            sys.exit(1)
+        elif int(arg) < 2:
+            print("ERROR : The kfold argument", arg, "has to be at least 2.")
+            sys.exit(1)
+        else:
+            self.kfold = int(arg)
+
+
+
+    def checkSamplingArg(self, arg):
+        """
+            Check the optional argument sampling (ex : 30000:0.1).
+        """
+        nb_draws, _, floor = arg.partition(":")
+        if not nb_draws.isdigit() or int(nb_draws) <= 0:
+            print("ERROR : The number of images drawn by -sampling", nb_draws,
+                "is not a strictly positive integer.")
+            sys.exit(1)
+        try:
+            floor = float(floor) if floor != "" else None
+        except ValueError:
+            floor = -1
+        if floor != None and not 0 < floor <= 1:
+            print("ERROR : The floor of -sampling", arg, "has to be a float"
+                " in ]0, 1].")
+            sys.exit(1)
+        self.sampling = (int(nb_draws), floor)
+        self.sampling_str = arg
+
+
+
+    def checkAugmentArg(self, arg):
+        """
+            Check the optional argument augment (number of distorted epochs
+            and seed of the distortions, ex : 2:7).
+        """
+        nb_epochs, _, seed = arg.partition(":")
+        if not nb_epochs.isdigit() or int(nb_epochs) <= 0:
+            print("ERROR : The augment argument", nb_epochs, "is not a"
+                " strictly positive integer.")
+            sys.exit(1)
+        if seed != "" and not seed.isdigit():
+            print("ERROR : The seed of -augment", arg, "is not a positive"
+                " integer.")
+            sys.exit(1)
+        self.augment = int(nb_epochs)
+        self.augment_seed = int(seed) if seed != "" else 0
+
+
+
+    def checkTeacherArg(self, arg):
+        """
+            Check the optional argument teacher (saved network directory).
+        """
+        if not os.path.isfile(os.path.join(arg, "nw.txt")) or \
+                not os.path.isfile(os.path.join(arg, "0.npz")):
+            print("ERROR : The teacher", arg, "is not a saved and trained"
+                " neural network directory.")
+            sys.exit(1)
+        self.teacher = arg
+
+
+
+    def checkTemperatureArg(self, arg):
+        """
+            Check the optional argument temperature of the teacher.
+        """
+        try:
+            temperature = float(arg)
+        except ValueError:
+            temperature = 0
+        if temperature <= 0:
+            print("ERROR : The temperature", arg, "is not a strictly positive"
+                " number.")
+            sys.exit(1)
+        self.temperature = temperature
+
+
+
+    def checkInputArg(self, arg):
+        """
+            Check the optional argument input stage (ex : pixels:0.05).
+        """
+        kind, _, parameter = arg.partition(":")
+        if kind not in POSSIBLE_INPUT_STAGES:
+            print("ERROR : The given input stage", kind, "doesn't correspond"
+                " to any possible stage :", POSSIBLE_INPUT_STAGES)
+            sys.exit(1)
+        if self.dir_load != None and os.path.isfile(self.dir_load + "/0.npz"):
+            print("ERROR : The network of", self.dir_load, "is already"
+                " trained, its inputs cannot be changed. Use -input with a"
+                " model (and -init=S to save it).")
+            sys.exit(1)
+        try:
+            parameter = float(parameter) if parameter != "" else None
+        except ValueError:
+            print("ERROR : The parameter of the input stage", arg, "is not"
+                " a number.")
+            sys.exit(1)
+        if kind == "pca" and parameter != None and (parameter != int(parameter)
+                or not 1 <= parameter <= SIZE_INPUT):
+            print("ERROR : The number of components of", arg, "has to be an"
+                " integer between 1 and", SIZE_INPUT, ".")
+            sys.exit(1)
+        self.input_stage = (kind, parameter)
+        self.input_stage_str = arg
+
+
+
     def checkInitArg(self, arg, main_dir):
         """
             Method used to check if the arg for the -init=S
@@ -363,16 +673,9 @@ class ArgsManager:
             os.system("cp " + main_dir + " " + arg)
             # add the nw .txt file in the directory
             os.system("mv " + arg + "/*.txt " + arg + "/nw.txt")
-            # add the info .csv file in the directory and initialize it
-            csvfile = arg + "/info.csv"
-            os.system("touch " + csvfile)
-            title = ["Learning Size", "Error Rate %", "Average Cost",
-                "Testing Size", "Gradient Descent", "Batches Size", "Repeat",
-                "Squishing Func", "Date"]
-            document = open(csvfile, "w")
-            writer = csv.writer(document, delimiter='|', lineterminator='\n')
-            writer.writerow(title)
-            document.close()
+            # add the (empty) run log in the directory, every run will be
+            # appended to it (see src/runLog.py)
+            open(arg + "/" + RUN_LOG, "a").close()
             # inform the user that the directory was successfully created
             print("\nThe directory", arg, "has just been created.\n")
             # as we have a save directory it will save the data in the docs
@@ -423,9 +726,59 @@ class ArgsManager:
         print(" -gdf            Gradient Descent Function & Factor. It is"
                                 " allowed to put ",POSSIBLE_GRAD_DESC_FACT_FUNC)
         print(" -sf             Squishing Function. It is allowed"
-                                " to put ", POSSIBLE_SQUISHING_FUNC)
+                                " to put ", POSSIBLE_SQUISHING_FUNC, "."
+                                " Add :lut (ex : Sigmoid:lut) to use an"
+                                " approximation of the function computed with"
+                                " an interpolated lookup table (slower than"
+                                " the exact functions with numpy). The test"
+                                " is also run with the exact functions to"
+                                " compare the error rates.")
         print(" -init=S         Initialize Save mode. A directory is expected."
                                 " Most common use : -init=S networks/saved/{dir_name}")
+        print(" -refresh        Refresh. An integer is expected. Minimum"
+                                " number of milliseconds between two redraws"
+                                " of the progress bars (200 by default).")
+        print(" -trace          Trace. A file name is expected. Export the"
+                                " time spent in each phase in the Chrome"
+                                " trace-event JSON format (chrome://tracing).")
+        print(" -kfold          K-fold cross-validation. An integer K >= 2 is"
+                                " expected. The learning size is split in K"
+                                " folds, K networks are trained in parallel"
+                                " (each without one fold, tested on it) and"
+                                " the mean and standard deviation of their"
+                                " error rates and costs are logged. The"
+                                " testing data set is not used.")
+        print(" -sampling       Importance sampling. NB[:floor] is expected."
+                                " NB images are drawn with a probability"
+                                " proportional to their last cost (mixed with"
+                                " a uniform probability of weight floor, 0.1"
+                                " by default) instead of taking every image"
+                                " once. Their gradient is corrected so that"
+                                " it stays unbiased. It cannot be used with"
+                                " -augment.")
+        print(" -augment        Augmentation. N[:seed] is expected. The"
+                                " network is trained on the training images"
+                                " and then on N copies of them randomly"
+                                " translated, rotated, scaled, sheared and"
+                                " elastically distorted (a new distortion for"
+                                " every copy, drawn from seed, 0 by"
+                                " default).")
+        print(" -input          Input stage fitted on the training images and"
+                                " saved with the network. It is allowed to put"
+                                " pixels[:threshold] : only the pixels whose"
+                                " standard deviation is above threshold (0.02"
+                                " by default) are given to the first layer."
+                                " pca[:k] : the images are projected on their"
+                                " k principal components (50 by default)."
+                                " It needs at least 1000 training images.")
+        print(" -teacher        Teacher. A saved network directory is"
+                                " expected. The network is trained to give"
+                                " the soft outputs of the teacher (mixed"
+                                " with the expected ones). They are computed"
+                                " once and cached in the teacher directory.")
+        print(" -temp           Temperature of the soft outputs of the"
+                                " teacher (2 by default). The higher, the"
+                                " more the other digits count.")
         print("")
         print("Arguments without parameters:\n")
         print(" -S              Save mode. The training will be saved."
@@ -435,9 +788,27 @@ class ArgsManager:
                                 " training. Also available -verbose.")
         print(" -NO-INFO        Deactivate the automatic saving information"
                                 " mode. All the information about the current"
-                                " training will not be saved in the info.csv"
+                                " training will not be saved in the runs.jsonl"
                                 " file. It is strongly recommended to NOT use"
                                 " that argument.")
+        print(" -q              Quiet. No progress is displayed at all (by"
+                                " default a bar on a terminal and otherwise"
+                                " a line every 10 seconds).")
+        print(" -timers         Timers. Display at the end the wall and CPU"
+                                " time spent in each phase (load, train, test"
+                                "...) and the number of samples and FLOPs"
+                                " computed per second.")
+        print(" -mem            Memory. Display the estimated memory needed"
+                                " before the run and the peak RSS and the"
+                                " biggest allocations of each phase at the"
+                                " end (slower because of tracemalloc).")
+        print(" -sparse         Sparse input. The first layer is computed"
+                                " (and its weights updated) only with the"
+                                " nonzero pixels of each image, which are"
+                                " about 20 % of the pixels of a digit.")
+        print(" -estimate       Only display the estimated memory needed by"
+                                " the run and exit. Useful to know how many"
+                                " runs can be executed at the same time.")
         print("")
 
 
@@ -449,11 +820,22 @@ class ArgsManager:
             well identify.
         """
         print("\nThe form of the Neural Network is ", self.neural_network)
+        if self.layer_specs != None:
+            print("The types of the layers are", self.layer_specs)
         print("The size of a batch is", self.batches_size)
         print("The squishing functions for the first layer is",
             self.squishing_funcs[0])
         print("The squishing functions for the second to last layer is",
             self.squishing_funcs[len(self.neural_network)-2])
+        if self.squishing_funcs_str.endswith(":lut"):
+            from src.squishingFunc import compareLUT
+            for functions in set(self.squishing_funcs):
+                for function in (functions[0], functions[2]):
+                    if hasattr(function, "exact"):
+                        max_error, mean_error = compareLUT(function.exact,
+                            function)
+                        print("The error of", function.__name__, "is at most",
+                            max_error, "and on average", mean_error)
         print("The gradient descent factor function is",
             self.grad_desc_factor[0])
         print("The gradient descent factor value is",
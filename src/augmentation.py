@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+"""
+    File augmentation.py used to train on random distortions of the training
+    images (-augment of main.py) instead of the same images at every pass.
+
+    The images are distorted a chunk at a time, directly on the uint8
+    matrix of a MNISTdataset : one random affine transformation (translation,
+    rotation, scale and shear) and one random elastic distortion per image
+    give for every pixel the position it is read from, and all the images of
+    a chunk are resampled at once (bilinear interpolation with numpy index
+    maps). The chunks are prepared in a background thread while the network
+    trains on the previous one.
+
+    Every chunk has its own seed (computed from the seed, the epoch and the
+    position of the chunk) so that an augmented data set is the same
+    whatever the order in which it is read.
+"""
+
+import threading
+import queue
+import numpy as np
+from src.mnistHandwriting import ONE_HOT
+
+SIZE_SIDE = 28
+# number of images distorted at once
+CHUNK_SIZE = 512
+# number of chunks prepared in advance by the background thread
+PREFETCH = 2
+# default amplitude of each distortion
+DEFAULT_DISTORTIONS = {"shift": 2.0,       # pixels
+                       "rotation": 10.0,   # degrees
+                       "scale": 0.1,       # relative
+                       "shear": 0.1,       # relative
+                       "elastic": 3.0,     # pixels (at most)
+                       "sigma": 3.0}       # smoothing of the elastic field
+
+
+
+def gaussianSmooth(fields, sigma):
+    """
+        Smooth a batch of 2D fields (NUMPY ARRAY (n, 28, 28)) with a gaussian
+        kernel, one axis after the other (zero padding).
+    """
+    radius = int(3*sigma)
+    offsets = np.arange(-radius, radius+1)
+    kernel = np.exp(-offsets**2/(2*sigma**2))
+    kernel /= kernel.sum()
+    for axis in (1, 2):
+        padding = [(0, 0)]*3
+        padding[axis] = (radius, radius)
+        padded = np.pad(fields, padding, mode="constant")
+        smoothed = np.zeros_like(fields)
+        for weight, offset in zip(kernel, offsets + radius):
+            window = [slice(None)]*3
+            window[axis] = slice(offset, offset + SIZE_SIDE)
+            smoothed += weight*padded[tuple(window)]
+        fields = smoothed
+    return fields
+
+
+
+def distortImages(images, random, distortions=DEFAULT_DISTORTIONS):
+    """
+        Apply a random affine transformation and a random elastic distortion
+        to each image.
+
+        Inputs :
+
+        -> images      : NUMPY ARRAY of uint8 (n, 784).
+
+        -> random      : numpy random Generator used for the distortions.
+
+        -> distortions : DICT amplitude of each distortion (see
+                         DEFAULT_DISTORTIONS).
+
+        Output :
+
+        <- distorted   : NUMPY ARRAY of uint8 (n, 784).
+    """
+    nb_images = len(images)
+    center = (SIZE_SIDE - 1)/2
+    y, x = np.mgrid[0:SIZE_SIDE, 0:SIZE_SIDE] - center
+    # one transformation per image => arrays of shape (n, 1, 1)
+    def uniform(amplitude):
+        return random.uniform(-amplitude, amplitude, (nb_images, 1, 1))
+    angle = np.radians(uniform(distortions["rotation"]))
+    scale = 1 + uniform(distortions["scale"])
+    shear = uniform(distortions["shear"])
+    cos, sin = np.cos(angle)/scale, np.sin(angle)/scale
+    # position in the original image of each pixel of the distorted one
+    source_x = cos*x + (sin + shear)*y + center - uniform(distortions["shift"])
+    source_y = -sin*x + cos*y + center - uniform(distortions["shift"])
+    if distortions["elastic"] > 0:
+        fields = random.uniform(-1, 1, (2, nb_images, SIZE_SIDE, SIZE_SIDE))
+        fields = gaussianSmooth(fields.reshape(-1, SIZE_SIDE, SIZE_SIDE),
+                                distortions["sigma"])
+        # the smoothing divides the amplitude, normalize it back
+        fields *= distortions["elastic"]/max(np.abs(fields).max(), 1e-12)
+        source_x = source_x + fields[:nb_images]
+        source_y = source_y + fields[nb_images:]
+
+    # bilinear interpolation of the 4 neighbours (black outside the image)
+    left = np.floor(source_x).astype(np.int64)
+    top = np.floor(source_y).astype(np.int64)
+    weight_x = source_x - left
+    weight_y = source_y - top
+    images = images.reshape(nb_images, -1).astype(np.float32)
+    distorted = np.zeros((nb_images, SIZE_SIDE*SIZE_SIDE), dtype=np.float32)
+    for dy, dx, weight in ((0, 0, (1-weight_y)*(1-weight_x)),
+                           (0, 1, (1-weight_y)*weight_x),
+                           (1, 0, weight_y*(1-weight_x)),
+                           (1, 1, weight_y*weight_x)):
+        row, column = top + dy, left + dx
+        inside = (row >= 0) & (row < SIZE_SIDE) & (column >= 0) & \
+            (column < SIZE_SIDE)
+        index = np.where(inside, row*SIZE_SIDE + column, 0)
+        values = np.take_along_axis(images, index.reshape(nb_images, -1),
+                                    axis=1)
+        distorted += (values*(weight*inside).reshape(nb_images, -1))
+    return np.clip(np.rint(distorted), 0, 255).astype(np.uint8)
+
+
+
+def createAugmented(args, training_data):
+    """
+        Return training_data followed by the distorted copies asked by the
+        arguments (-augment), training_data itself if there is none. The
+        AugmentedDataset has to be closed once the training is over.
+    """
+    if args.augment == 0:
+        return training_data
+    return AugmentedDataset(training_data, args.augment, args.augment_seed)
+
+
+
+class AugmentedDataset:
+    """
+        Data set made of a MNISTdataset followed by nb_epochs distorted
+        copies of it (the copies are never stored, a chunk is distorted when
+        it is needed). It is read like the MNISTdataset : item i is the
+        (input, expected output) pair of the image i % len(dataset), as it
+        is for the epoch i // len(dataset) (the epoch 0 is not distorted).
+    """
+
+    def __init__(self, dataset, nb_epochs, seed=0,
+                 distortions=DEFAULT_DISTORTIONS, chunk_size=CHUNK_SIZE):
+        """
+            Initialize an AugmentedDataset object and start the background
+            thread that distorts the chunks in advance.
+        """
+        self.dataset = dataset
+        self.nb_epochs = nb_epochs
+        self.seed = seed
+        self.distortions = distortions
+        self.chunk_size = chunk_size
+        self.chunks_per_epoch = -(-len(dataset)//chunk_size)
+        # (chunk number, distorted images, labels) of the chunk being read
+        self.current = (None, None, None)
+        # chunks distorted by the background thread (in order) and number of
+        # the next chunk it gives
+        self.queue = queue.Queue(PREFETCH)
+        self.next_chunk = self.chunks_per_epoch
+        self.stopped = False
+        threading.Thread(target=self.prepareChunks, daemon=True).start()
+
+    def __len__(self):
+        return len(self.dataset)*(self.nb_epochs+1)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        epoch, index = divmod(i, len(self.dataset))
+        if epoch == 0:
+            return self.dataset[index]
+        chunk = epoch*self.chunks_per_epoch + index//self.chunk_size
+        if chunk != self.current[0]:
+            self.current = (chunk,) + self.getChunk(chunk)
+        _, images, labels = self.current
+        index %= self.chunk_size
+        return (images[index]/255.0, ONE_HOT[labels[index]])
+
+    def __iter__(self):
+        for i in range(0, len(self)):
+            yield self[i]
+
+    def distortChunk(self, chunk):
+        """
+            Return the distorted images and the labels of a chunk.
+        """
+        epoch, part = divmod(chunk, self.chunks_per_epoch)
+        random = np.random.default_rng([self.seed, epoch, part])
+        indices = self.dataset.indices[part*self.chunk_size:
+                                       (part+1)*self.chunk_size]
+        return (distortImages(self.dataset.images[indices], random,
+                              self.distortions),
+                self.dataset.labels[indices])
+
+    def prepareChunks(self):
+        """
+            Distort all the chunks in order (run in the background thread)
+            until close is called.
+        """
+        for chunk in range(self.chunks_per_epoch,
+                           (self.nb_epochs+1)*self.chunks_per_epoch):
+            distorted = self.distortChunk(chunk)
+            while not self.stopped:
+                try:
+                    self.queue.put(distorted, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if self.stopped:
+                return
+
+    def close(self):
+        """
+            Stop the background thread (it would otherwise keep its distorted
+            chunks until the end of the process when the data set is not read
+            until its end).
+        """
+        self.stopped = True
+
+    def getChunk(self, chunk):
+        """
+            Return the chunk from the background thread when it is the next
+            one it gives, otherwise (random access) distort it now.
+        """
+        if chunk == self.next_chunk:
+            self.next_chunk += 1
+            return self.queue.get()
+        return self.distortChunk(chunk)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""
+    File cascadePredictor.py used to predict the digits of a batch with two
+    saved networks (see cascade.py) : a small one that is fast and a large
+    one that is accurate.
+
+    The small network computes the whole batch. Its margin (highest output
+    minus the second highest) tells how sure it is : only the images whose
+    margin is below the threshold are given to the large network, and its
+    outputs replace the ones of the small network for these images. The
+    threshold is calibrated on images that were not used to train the
+    networks, as the smallest one that reaches a target accuracy.
+"""
+
+import json
+import time
+import numpy as np
+from src.neuralNetwork import loadNetwork
+
+# number of images computed at once
+BATCH_SIZE = 256
+
+
+
+def outputMargins(output_layers):
+    """
+        Return the margin of each output layer (NUMPY MATRIX (10, number of
+        images)) : the highest output minus the second highest.
+    """
+    highest = np.partition(output_layers, -2, axis=0)
+    return highest[-1] - highest[-2]
+
+
+
+class CascadePredictor:
+    """
+        Class used to predict with a small network and, when it is not sure
+        enough, a large one.
+    """
+
+    def __init__(self, dir_small, dir_large, threshold):
+        """
+            Initialize a CascadePredictor object.
+
+            Inputs :
+
+            -> dir_small, dir_large : STRING directories of the saved
+                                      networks.
+
+            -> threshold            : FLOAT margin under which an image is
+                                      given to the large network.
+        """
+        self.dir_small = dir_small
+        self.dir_large = dir_large
+        self.small = loadNetwork(dir_small)
+        self.large = loadNetwork(dir_large)
+        self.threshold = threshold
+
+    def predict(self, input_layers):
+        """
+            Compute the output layers of a batch.
+
+            Input :
+
+            -> input_layers : NUMPY MATRIX (784, batch size), one image per
+                              column.
+
+            Output :
+
+            <- (output_layers, escalated) : NUMPY MATRIX (10, batch size) and
+                              NUMPY ARRAY of BOOL, True for the images given
+                              to the large network.
+        """
+        output_layers = self.small.generateOuputLayers(input_layers)
+        escalated = outputMargins(output_layers) < self.threshold
+        if escalated.any():
+            output_layers[:, escalated] = self.large.generateOuputLayers(
+                    input_layers[:, escalated])
+        return (output_layers, escalated)
+
+    def save(self, file_name, **extra):
+        """
+            Save the cascade (the networks and the threshold) in a JSON file.
+        """
+        with open(file_name, "w") as document:
+            json.dump(dict(small=self.dir_small, large=self.dir_large,
+                           threshold=self.threshold, **extra), document,
+                      indent=1, sort_keys=True)
+
+
+
+def evaluate(predict, images, labels, batch_size=BATCH_SIZE):
+    """
+        Predict images (NUMPY MATRIX (784, number of images)) by batches.
+
+        Inputs :
+
+        -> predict : function of a batch that returns its output layers and
+                     the images escalated (see CascadePredictor.predict).
+
+        -> labels  : NUMPY ARRAY of the digits of the images.
+
+        Output :
+
+        <- results : DICT with the error rate, the part of the images given
+                     to the large network and the average latency of an
+                     image (in seconds).
+    """
+    nb_correct = 0
+    nb_escalated = 0
+    start = time.perf_counter()
+    for first in range(0, images.shape[1], batch_size):
+        output_layers, escalated = predict(images[:, first:first+batch_size])
+        nb_correct += np.sum(np.argmax(output_layers, axis=0) ==
+                             labels[first:first+batch_size])
+        nb_escalated += np.sum(escalated)
+    duration = time.perf_counter() - start
+    nb_images = images.shape[1]
+    return {"error_rate": 1 - nb_correct/nb_images,
+            "escalated": nb_escalated/nb_images,
+            "latency": duration/nb_images}
+
+
+
+def loadCascade(file_name):
+    """
+        Return the CascadePredictor saved in a JSON file (see save).
+    """
+    with open(file_name, "r") as document:
+        cascade = json.load(document)
+    return CascadePredictor(cascade["small"], cascade["large"],
+                            cascade["threshold"])
+
+
+
+def calibrateThreshold(small_outputs, large_outputs, labels, target):
+    """
+        Return the smallest threshold whose cascade reaches the accuracy
+        target on images whose outputs were computed by both networks (NUMPY
+        MATRIX (10, number of images)), and the part of the images it gives
+        to the large network.
+        If it is only reached (or never) when every image is escalated, the
+        threshold is inf.
+    """
+    margins = outputMargins(small_outputs)
+    order = np.argsort(margins)
+    small_correct = (np.argmax(small_outputs, axis=0) == labels)[order]
+    large_correct = (np.argmax(large_outputs, axis=0) == labels)[order]
+    nb_images = len(labels)
+    # correct images when the k images of smallest margin are escalated
+    correct = np.zeros(nb_images + 1)
+    correct[1:] = np.cumsum(large_correct) - np.cumsum(small_correct)
+    correct += np.sum(small_correct)
+    # escalated <=> margin < threshold (strictly) : the k images of smallest
+    # margin can only be escalated alone when the next margin is larger
+    sorted_margins = margins[order]
+    possible = np.ones(nb_images + 1, dtype=bool)
+    possible[1:nb_images] = sorted_margins[:-1] < sorted_margins[1:]
+    reached = np.flatnonzero(possible & (correct/nb_images >= target))
+    if len(reached) == 0 or reached[0] == nb_images:
+        return (float("inf"), 1.0)
+    nb_escalated = reached[0]
+    return (float(sorted_margins[nb_escalated]), nb_escalated/nb_images)
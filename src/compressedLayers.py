@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+"""
+    File compressedLayers.py used to store the weight matrices of a trained
+    network in a compressed form (see compress.py).
+
+    A compressed matrix replaces a NUMPY MATRIX in NeuralNetwork.weights :
+    it has the same shape, its product with a layer (or a batch of layers)
+    is computed with .dot and its transpose with .T, so that the forward
+    propagation is unchanged. It is saved in the same {index}.npz file with
+    its own arrays instead of w (see saveWeights and loadWeights).
+
+    Forms :
+        - LowRankMatrix => W ~ U V where U is (rows, rank) and V is
+                           (rank, columns), given by a truncated SVD. A
+                           product costs rank*(rows+columns) instead of
+                           rows*columns multiplications.
+        - SparseMatrix  => only the nonzero weights of a pruned matrix in
+                           the CSR layout (see prune.py). A product costs
+                           one multiplication per nonzero weight.
+"""
+
+import os, sys, shutil
+import numpy as np
+from src.squishingFunc import *
+from src.externalFunc import *
+
+# number of layers of a batch multiplied at once by a SparseMatrix (the
+# products of all the nonzero weights with a few layers stay in the cache)
+SPARSE_CHUNK = 8
+
+
+
+class LowRankMatrix:
+    """
+        Matrix stored as the product of two thin matrices.
+    """
+
+    kind = "lowrank"
+
+    def __init__(self, left, right):
+        """
+            Initialize a LowRankMatrix object.
+
+            Inputs :
+
+            -> left  : NUMPY MATRIX (rows, rank).
+
+            -> right : NUMPY MATRIX (rank, columns).
+        """
+        self.left = left
+        self.right = right
+        self.shape = (left.shape[0], right.shape[1])
+        self.rank = left.shape[1]
+        # number of stored values (one multiplication and one addition each
+        # for a product)
+        self.size = left.size + right.size
+
+    def dot(self, layer):
+        return self.left.dot(self.right.dot(layer))
+
+    @property
+    def T(self):
+        return LowRankMatrix(self.right.T, self.left.T)
+
+    def __array__(self, dtype=None, copy=None):
+        # dense matrix (when a function needs the whole matrix, ex : pinv)
+        return self.left.dot(self.right).astype(dtype or self.left.dtype)
+
+    def astype(self, dtype):
+        return LowRankMatrix(self.left.astype(dtype), self.right.astype(dtype))
+
+    def arrays(self):
+        """
+            Return the arrays saved in the {index}.npz file.
+        """
+        return {"u": self.left, "v": self.right}
+
+    def update(self, dbiases, layer):
+        """
+            Add the gradient outer(dbiases, layer) of the dense matrix to
+            the factors (chain rule through U V).
+        """
+        dleft = np.outer(dbiases, self.right.dot(layer))
+        self.right += np.outer(self.left.T.dot(dbiases), layer)
+        self.left += dleft
+
+
+
+class SparseMatrix:
+    """
+        Matrix stored in the CSR layout : the nonzero values row after row
+        (data), their columns (indices) and the position in data of the
+        start of each row (indptr, of size rows+1).
+    """
+
+    kind = "csr"
+
+    def __init__(self, data, indices, indptr, shape):
+        """
+            Initialize a SparseMatrix object.
+        """
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = tuple(int(size) for size in shape)
+        self.size = len(data)
+        # rows with at least one nonzero value (np.add.reduceat cannot sum
+        # an empty row)
+        self.nonempty = np.flatnonzero(indptr[:-1] < indptr[1:])
+        self.starts = indptr[:-1][self.nonempty]
+
+    def dot(self, layer):
+        """
+            Product with a layer (NUMPY ARRAY) or a batch of layers (NUMPY
+            MATRIX with one layer per column).
+        """
+        output = np.zeros((self.shape[0],) + layer.shape[1:],
+                          dtype=np.result_type(self.data, layer))
+        if self.size == 0:
+            return output
+        if layer.ndim == 1:
+            # the inputs of every nonzero weight, multiplied then summed by row
+            products = layer[self.indices]
+            products *= self.data
+            output[self.nonempty] = np.add.reduceat(products, self.starts)
+            return output
+        for first in range(0, layer.shape[1], SPARSE_CHUNK):
+            products = layer[self.indices, first:first+SPARSE_CHUNK]
+            products *= self.data[:, None]
+            output[self.nonempty, first:first+SPARSE_CHUNK] = \
+                np.add.reduceat(products, self.starts, axis=0)
+        return output
+
+    def __array__(self, dtype=None, copy=None):
+        dense = np.zeros(self.shape, dtype=dtype or self.data.dtype)
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        dense[rows, self.indices] = self.data
+        return dense
+
+    def astype(self, dtype):
+        return SparseMatrix(self.data.astype(dtype), self.indices,
+                            self.indptr, self.shape)
+
+    def arrays(self):
+        return {"data": self.data, "indices": self.indices,
+                "indptr": self.indptr, "shape": np.array(self.shape)}
+
+
+
+def toSparse(matrix):
+    """
+        Return the SparseMatrix of the nonzero values of a matrix.
+    """
+    rows, columns = np.nonzero(matrix)
+    indptr = np.zeros(matrix.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=matrix.shape[0]), out=indptr[1:])
+    return SparseMatrix(matrix[rows, columns], columns.astype(np.int32),
+                        indptr, matrix.shape)
+
+
+
+def magnitudeMasks(network, sparsity):
+    """
+        Return the masks (NUMPY MATRIX of BOOL, None for the layers that are
+        not pruned) that remove the part sparsity of the weights of smallest
+        magnitude of every fully connected matrix except the output one.
+    """
+    masks = [None]*(network.nb_layer-1)
+    for index in range(0, network.nb_layer-2):
+        if network.layer_specs[index] != None:
+            continue
+        magnitudes = np.abs(network.weights[index]).ravel()
+        nb_pruned = int(sparsity*len(magnitudes))
+        mask = np.ones(len(magnitudes), dtype=bool)
+        if nb_pruned > 0:
+            mask[np.argpartition(magnitudes, nb_pruned-1)[:nb_pruned]] = False
+        masks[index] = mask.reshape(network.weights[index].shape)
+    return masks
+
+
+
+def sparsifyNetwork(network):
+    """
+        Replace every pruned matrix of a NeuralNetwork by its SparseMatrix
+        (in place).
+    """
+    for index in range(0, network.nb_layer-1):
+        if network.masks != None and network.masks[index] is not None:
+            network.weights[index] = toSparse(network.weights[index])
+    network.masks = None
+    network.compressed = True
+    network.updateFlops()
+
+
+
+def rankForEnergy(singular_values, energy):
+    """
+        Return the smallest rank whose singular values keep the part energy
+        of the sum of the squared singular values.
+    """
+    cumulated = np.cumsum(np.square(singular_values))
+    cumulated /= max(cumulated[-1], 1e-12)
+    return int(np.searchsorted(cumulated, energy - 1e-12) + 1)
+
+
+
+def factorize(matrix, rank=None, energy=None):
+    """
+        Factorize a matrix with a truncated SVD at the given rank (or at the
+        rank that keeps the part energy of its energy).
+        Return the matrix itself when the factors would not be smaller.
+    """
+    u, s, vt = np.linalg.svd(np.asarray(matrix), full_matrices=False)
+    if rank == None:
+        rank = rankForEnergy(s, energy)
+    rank = min(rank, len(s))
+    if rank*(matrix.shape[0] + matrix.shape[1]) >= matrix.shape[0]* \
+            matrix.shape[1]:
+        return matrix
+    # the singular values go with the left factor
+    return LowRankMatrix(u[:, :rank]*s[:rank], np.ascontiguousarray(
+        vt[:rank]))
+
+
+
+def factorizeNetwork(network, rank=None, energy=None):
+    """
+        Factorize every fully connected weight matrix of a NeuralNetwork
+        (in place). The output layer is kept as it is, it is too small.
+    """
+    for index in range(0, network.nb_layer-2):
+        if network.layer_specs[index] == None:
+            network.weights[index] = factorize(network.weights[index], rank,
+                                               energy)
+    network.updateFlops()
+
+
+
+def fineTune(network, training_data, gradientDescentFactor):
+    """
+        Train a network with compressed matrices one image at a time (same
+        descent as trainNEO, the compressed matrices are updated through
+        their factors).
+    """
+    gdf_func = gradientDescentFactor[0]
+    gdf_param = gradientDescentFactor[1]
+    bar = progressbar(range(0, len(training_data)),
+                      "Computing fine-tuning   : ", 40)
+    for i in bar:
+        gdfactor = 0.1*gdf_func(0, gdf_param)
+        in_out_layers = training_data[i]
+        values_layers, z_values = network.generateAllLayers(in_out_layers[0])
+        output = values_layers[network.nb_layer-1]
+        der_cost_to_a = DerCostFunction(output, in_out_layers[1])
+        for index in range(network.nb_layer-2, -1, -1):
+            DerFunction = network.squishing_funcs[index][2]
+            dbiases = np.multiply(DerFunction(z_values[index]), der_cost_to_a)
+            if index > 0:
+                der_cost_to_a = network.weights[index].T.dot(dbiases)
+            dbiases *= -gdfactor
+            weights = network.weights[index]
+            if isinstance(weights, np.ndarray):
+                weights += np.outer(dbiases, values_layers[index])
+            else:
+                weights.update(dbiases, values_layers[index])
+            network.biases[index] += dbiases
+        bar.addLoss(np.sum(CostFunction(output, in_out_layers[1])))
+
+
+
+def saveWeights(file_name, weights, biases):
+    """
+        Save a weight matrix (compressed or not) and its biases.
+    """
+    if isinstance(weights, np.ndarray):
+        np.savez(file_name, w=weights, b=biases)
+    else:
+        np.savez(file_name, kind=weights.kind, b=biases, **weights.arrays())
+
+
+
+def loadWeights(data):
+    """
+        Return the weight matrix (compressed or not) of a loaded {index}.npz
+        file.
+    """
+    if "w" in data:
+        return data["w"]
+    if str(data["kind"]) == LowRankMatrix.kind:
+        return LowRankMatrix(data["u"], data["v"])
+    if str(data["kind"]) == SparseMatrix.kind:
+        return SparseMatrix(data["data"], data["indices"], data["indptr"],
+                            data["shape"])
+    print("ERROR : The weight matrix kind", str(data["kind"]), "is unknown.")
+    sys.exit(1)
+
+
+
+def isCompressed(dir_load):
+    """
+        Return True if one of the weight matrices of a saved network is
+        compressed (only the names in the files are read).
+    """
+    index = 0
+    while os.path.isfile(os.path.join(dir_load, str(index) + ".npz")):
+        with np.load(os.path.join(dir_load, str(index) + ".npz")) as data:
+            if "kind" in data.files:
+                return True
+        index += 1
+    return False
+
+
+
+def saveCompressed(network, dir_load, dir_save):
+    """
+        Save a compressed network in a new directory with the document of
+        the network it comes from and an empty run log.
+    """
+    from src.runLog import RUN_LOG
+    os.mkdir(dir_save)
+    shutil.copy(os.path.join(dir_load, "nw.txt"), dir_save)
+    open(os.path.join(dir_save, RUN_LOG), "a").close()
+    network.save(dir_save)
+    print("The compressed network is saved in", dir_save, ".")
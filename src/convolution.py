@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+"""
+    File convolution.py used for the convolution and pooling layers of a
+    neural network. They are given in the network document before the fully
+    connected layers :
+        conv {number of filters} {size of the filters}
+        pool {size of the pooling}
+
+    A layer is a matrix (number of neurons, number of images of the batch)
+    as for the fully connected layers, each column being the (channel, row,
+    column) values of one image. The convolution of a whole batch is one
+    matrix product : the patches of the images are unfolded in the columns of
+    a matrix (im2col) and the gradient of the patches is folded back into the
+    images (col2im).
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# (channels, rows, columns) of the input images
+INPUT_SHAPE = (1, 28, 28)
+LAYER_TYPES = ["conv", "pool"]
+
+
+
+def layerShape(spec, shape):
+    """
+        Return the (channels, rows, columns) shape of the layer computed by
+        the layer spec from a layer of the given shape.
+
+        Inputs :
+
+        -> spec  : TUPLE ("conv", number of filters, size of the filters) or
+                   ("pool", size of the pooling).
+
+        -> shape : TUPLE (channels, rows, columns).
+    """
+    channels, rows, columns = shape
+    if spec[0] == "conv":
+        return (spec[1], rows - spec[2] + 1, columns - spec[2] + 1)
+    return (channels, rows//spec[1], columns//spec[1])
+
+
+
+def layerShapes(layer_specs):
+    """
+        Return the shape of each layer of a network (None for the layers
+        after the first fully connected one).
+    """
+    shapes = [INPUT_SHAPE]
+    for spec in layer_specs:
+        if spec == None or shapes[-1] == None:
+            shapes.append(None)
+        else:
+            shapes.append(layerShape(spec, shapes[-1]))
+    return shapes
+
+
+
+def im2col(layer, shape, size):
+    """
+        Unfold the patches of size x size of a batch.
+
+        Output :
+
+        <- columns : NUMPY MATRIX (channels*size*size, batch*rows*columns) where
+                     rows and columns are the ones of the result of the
+                     convolution.
+    """
+    channels, rows, columns = shape
+    batch = layer.shape[1]
+    images = layer.T.reshape(batch, channels, rows, columns)
+    # (batch, channels, out rows, out columns, size, size)
+    windows = sliding_window_view(images, (size, size), axis=(2, 3))
+    return windows.transpose(1, 4, 5, 0, 2, 3).reshape(channels*size*size, -1)
+
+
+
+def col2im(columns, shape, size, batch):
+    """
+        Fold back the gradient of the patches (see im2col) into the gradient
+        of the layer (NUMPY MATRIX (channels*rows*columns, batch)).
+    """
+    channels, rows, nb_columns = shape
+    out_rows, out_columns = rows - size + 1, nb_columns - size + 1
+    columns = columns.reshape(channels, size, size, batch, out_rows,
+                              out_columns)
+    images = np.zeros((batch, channels, rows, nb_columns))
+    for i in range(0, size):
+        for j in range(0, size):
+            images[:, :, i:i+out_rows, j:j+out_columns] += \
+                columns[:, i, j].transpose(1, 0, 2, 3)
+    return images.reshape(batch, -1).T
+
+
+
+def convForward(layer, shape, weights, biases, size):
+    """
+        Convolution of a batch.
+
+        Output :
+
+        <- (z, columns) : NUMPY MATRIX (filters*out rows*out columns, batch)
+                          and the unfolded patches used by convBackward.
+    """
+    batch = layer.shape[1]
+    columns = im2col(layer, shape, size)
+    z = weights.dot(columns) + biases[:, None]
+    nb_filters = len(weights)
+    return (z.reshape(nb_filters, batch, -1).transpose(0, 2, 1).reshape(
+            -1, batch), columns)
+
+
+
+def convBackward(dz, columns, shape, weights, size, need_input=True):
+    """
+        Gradient of a convolution from the gradient of its result dz.
+
+        Output :
+
+        <- (dweights, dbiases, dlayer) : dlayer (gradient of the input of the
+                          convolution) is None if need_input is False.
+    """
+    batch = dz.shape[1]
+    nb_filters = len(weights)
+    dz = dz.reshape(nb_filters, -1, batch).transpose(0, 2, 1).reshape(
+            nb_filters, -1)
+    dweights = dz.dot(columns.T)
+    dbiases = dz.sum(axis=1)
+    dlayer = None
+    if need_input:
+        dlayer = col2im(weights.T.dot(dz), shape, size, batch)
+    return (dweights, dbiases, dlayer)
+
+
+
+def poolForward(layer, shape, size):
+    """
+        Max pooling of a batch (the last rows and columns are dropped when
+        the size does not divide them).
+
+        Output :
+
+        <- (pooled, mask) : NUMPY MATRIX of the pooled layer and the position
+                            of the maximums used by poolBackward.
+    """
+    channels, rows, columns = shape
+    batch = layer.shape[1]
+    out_rows, out_columns = rows//size, columns//size
+    images = layer.T.reshape(batch, channels, rows, columns)
+    blocks = images[:, :, :out_rows*size, :out_columns*size].reshape(
+            batch, channels, out_rows, size, out_columns, size)
+    pooled = blocks.max(axis=(3, 5))
+    mask = blocks == pooled[:, :, :, None, :, None]
+    return (pooled.reshape(batch, -1).T, mask)
+
+
+
+def poolBackward(dpooled, mask, shape, size):
+    """
+        Gradient of the input of a max pooling from the gradient of its
+        result : it only goes to the maximums.
+    """
+    channels, rows, columns = shape
+    batch = dpooled.shape[1]
+    out_rows, out_columns = rows//size, columns//size
+    dblocks = mask*dpooled.T.reshape(batch, channels, out_rows, 1,
+                                     out_columns, 1)
+    images = np.zeros((batch, channels, rows, columns))
+    images[:, :, :out_rows*size, :out_columns*size] = dblocks.reshape(
+            batch, channels, out_rows*size, out_columns*size)
+    return images.reshape(batch, -1).T
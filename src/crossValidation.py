@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+    File crossValidation.py used to evaluate a configuration with k-fold
+    cross-validation (-kfold K of main.py). The training data set is split
+    by index in K folds (nothing is copied), K networks are trained in
+    parallel worker processes, each without one fold, and tested on the
+    fold left out.
+"""
+
+import os
+import io
+import contextlib
+import multiprocessing
+import numpy as np
+from src.jobRunner import runJob
+from src.externalFunc import setProgress
+
+# training data set shared by the processes of the pool (inherited when the
+# processes are forked, so that it is never copied)
+DATA = {}
+
+
+
+def foldArgs(list_args):
+    """
+        Return the arguments of main.py used to train a fold : the folds are
+        neither saved nor logged one by one (the cross-validation is).
+    """
+    fold_args = []
+    i = 0
+    while i < len(list_args):
+        if list_args[i] in ("-init=S", "-kfold", "-trace"):
+            i += 2
+            continue
+        if list_args[i] not in ("-S", "-NO-INFO"):
+            fold_args.append(list_args[i])
+        i += 1
+    return fold_args + ["-NO-INFO"]
+
+
+
+def runFold(fold_args, k, fold):
+    """
+        Train a network without the fold number fold and test it on this
+        fold. Run in a process of the pool.
+    """
+    size_fold = len(DATA["training"])//k
+    positions = np.arange(0, size_fold*k)
+    in_fold = (positions >= fold*size_fold) & (positions < (fold+1)*size_fold)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, _, results = runJob(fold_args,
+                               DATA["training"].subset(positions[~in_fold]),
+                               DATA["training"].subset(positions[in_fold]))
+    return results
+
+
+
+def crossValidate(list_args, training_data, k, workers=None):
+    """
+        K-fold cross-validation of the configuration given by list_args.
+
+        Inputs :
+
+        -> list_args     : LIST of STRING, arguments as given to main.py.
+
+        -> training_data : MNISTdataset (see loadMNIST) split in the folds.
+
+        -> k             : INT number of folds.
+
+        -> workers       : INT number of processes (by default one per fold
+                           up to the number of cores).
+
+        Output :
+
+        <- results       : DICT with the error_rate and average_cost (means
+                           over the folds), their standard deviations
+                           (error_rate_std, average_cost_std) and the results
+                           of each fold (folds).
+    """
+    if workers == None:
+        workers = min(k, os.cpu_count() or 1)
+    DATA["training"] = training_data
+    fold_args = foldArgs(list_args)
+    # the progress of the folds would be mixed
+    setProgress("silent")
+    context = multiprocessing.get_context("fork")
+    with context.Pool(workers) as pool:
+        folds = pool.starmap(runFold, [(fold_args, k, fold)
+                                       for fold in range(0, k)])
+    error_rates = np.array([fold["error_rate"] for fold in folds])
+    costs = np.array([fold["average_cost"] for fold in folds])
+    return {"error_rate": float(np.mean(error_rates)),
+            "error_rate_std": float(np.std(error_rates)),
+            "average_cost": float(np.mean(costs)),
+            "average_cost_std": float(np.std(costs)),
+            "folds": [{"error_rate": fold["error_rate"],
+                       "average_cost": float(fold["average_cost"])}
+                      for fold in folds]}
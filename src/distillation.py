@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+    File distillation.py used to train a network on the outputs of another
+    one, the teacher (-teacher and -temp of main.py).
+
+    The teacher is a saved network, usually a bigger and more accurate one.
+    Its output layer before the squishing function (the logits) is computed
+    for all the training images at once, a batch at a time, and cached in
+    the teacher directory (teacher.npz) with a fingerprint of its weights so
+    that it is computed again only when the teacher changes. The expected
+    output of an image is then the softmax of the logits divided by the
+    temperature, mixed with the one-hot expected output : the network also
+    learns which other digits the image looks like.
+"""
+
+import os
+import numpy as np
+from src.neuralNetwork import loadNetwork, networkFingerprint
+
+TEACHER_CACHE = "teacher.npz"
+# number of images given at once to the teacher
+CHUNK_SIZE = 1024
+# part of the soft outputs of the teacher in the expected outputs
+SOFT_WEIGHT = 0.7
+
+
+
+def teacherLogits(dir_teacher, dataset):
+    """
+        Return the logits of the teacher for the images of a MNISTdataset
+        (NUMPY MATRIX (number of images, 10) in the order of the data set).
+        The logits of the training images already cached are not computed
+        again.
+    """
+    path = os.path.join(dir_teacher, TEACHER_CACHE)
+    fingerprint = networkFingerprint(dir_teacher)
+    # logits of every training image (nan when not computed yet)
+    logits = np.full((len(dataset.labels), 10), np.nan, dtype=np.float32)
+    if os.path.isfile(path):
+        cache = np.load(path)
+        if str(cache["fingerprint"]) == fingerprint and \
+                len(cache["logits"]) == len(logits):
+            logits = cache["logits"]
+    missing = dataset.indices[np.isnan(logits[dataset.indices, 0])]
+    if len(missing) > 0:
+        teacher = loadNetwork(dir_teacher)
+        for start in range(0, len(missing), CHUNK_SIZE):
+            indices = missing[start:start+CHUNK_SIZE]
+            images = dataset.images[indices].T/255.0
+            _, z_values, _ = teacher.forwardBatch(images)
+            logits[indices] = z_values[-1].T
+        # written in another file first so that a process reading the cache
+        # never sees a partly written one
+        temporary = "%s.%i.tmp" % (path, os.getpid())
+        with open(temporary, "wb") as document:
+            np.savez(document, fingerprint=fingerprint, logits=logits)
+        os.replace(temporary, path)
+    return logits[dataset.indices]
+
+
+
+def softTargets(logits, temperature):
+    """
+        Return the softmax of the logits divided by the temperature (one row
+        per image).
+    """
+    scaled = logits/temperature
+    scaled = np.exp(scaled - scaled.max(axis=1, keepdims=True))
+    return scaled/scaled.sum(axis=1, keepdims=True)
+
+
+
+def createDistilled(args, training_data):
+    """
+        Return training_data with the expected outputs given by the teacher
+        of the arguments (-teacher), training_data itself if there is none.
+    """
+    if args.teacher == None:
+        return training_data
+    targets = softTargets(teacherLogits(args.teacher, training_data),
+                          args.temperature)
+    return DistilledDataset(training_data, targets)
+
+
+
+class DistilledDataset:
+    """
+        Data set read like a MNISTdataset whose expected outputs are mixed
+        with the soft outputs of a teacher. As the cost is quadratic, the
+        gradient of the mixed output is the same mix of the gradients of
+        the two costs.
+    """
+
+    def __init__(self, dataset, targets, weight=SOFT_WEIGHT):
+        """
+            Initialize a DistilledDataset object.
+
+            Inputs :
+
+            -> dataset : MNISTdataset.
+
+            -> targets : NUMPY MATRIX (len(dataset), 10) soft outputs of the
+                         teacher.
+
+            -> weight  : FLOAT part of the soft outputs in the expected
+                         outputs.
+        """
+        self.dataset = dataset
+        self.targets = targets*weight
+        self.weight = weight
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, i):
+        input_layer, expected_output = self.dataset[i]
+        return (input_layer, self.targets[i] + (1-self.weight)*expected_output)
+
+    def __iter__(self):
+        for i in range(0, len(self)):
+            yield self[i]
@@ -7,6 +7,7 @@
 
 import numpy as np
 import sys
+import time
 
 
 
@@ -79,21 +80,162 @@ def isfloat(string):
         return False
     return True
 
-def progressbar(it, prefix="", size=60):
+# ------------------------------- Progress bar --------------------------------
+
+# how the progress is displayed :
+# "auto"   => a bar on a terminal and log lines otherwise
+# "bar"    => always a bar
+# "log"    => always log lines
+# "silent" => nothing
+PROGRESS_MODES = ["auto", "bar", "log", "silent"]
+PROGRESS = {"mode": "auto",
+            # minimum time between two redraws of the bar (seconds)
+            "refresh": 0.2,
+            # minimum time between two log lines (seconds)
+            "log_interval": 10.0}
+
+
+
+def setProgress(mode=None, refresh=None, log_interval=None):
     """
-        Function used to have access to progress without having to use the
-        package progressbar2.
-        Example of use
+        Function used to choose how every progress bar is displayed.
+        See PROGRESS_MODES for the modes.
+    """
+    if mode != None:
+        PROGRESS["mode"] = mode
+    if refresh != None:
+        PROGRESS["refresh"] = refresh
+    if log_interval != None:
+        PROGRESS["log_interval"] = log_interval
+
+
+
+def formatDuration(seconds):
+    """
+        Function used to display a duration as H:MM:SS.
+    """
+    seconds = int(seconds)
+    return "%i:%02i:%02i" % (seconds//3600, (seconds//60) % 60, seconds % 60)
+
+
+
+class ProgressBar:
     """
-    count = len(it)
-    def _show(_i):
-        x = int(size*_i/count)
-        sys.stdout.write("%s[%s%s] %i/%i\r" % (prefix, "#"*x, "."*(size-x), _i, count))
+        Class used to follow the progress of a loop. It is redrawn at most
+        every PROGRESS["refresh"] seconds and shows the number of samples per
+        second, the running loss (if given with addLoss) and the ETA.
+        When stdout is not a terminal it writes a line every
+        PROGRESS["log_interval"] seconds instead.
+    """
+
+    def __init__(self, it, prefix="", size=60, unit_size=1):
+        """
+            Initialize a ProgressBar object.
+
+            Inputs :
+
+            -> it        : any iterable with a length.
+
+            -> prefix    : STRING displayed before the bar.
+
+            -> size      : INT number of characters of the bar.
+
+            -> unit_size : INT number of samples in one item of it (ex : the
+                           batch size when iterating on the batches).
+        """
+        self.it = it
+        self.prefix = prefix
+        self.size = size
+        self.unit_size = unit_size
+        self.count = len(it)
+        self.loss = None
+        mode = PROGRESS["mode"]
+        if mode == "auto":
+            mode = "bar" if sys.stdout.isatty() else "log"
+        self.mode = mode
+
+
+
+    def addLoss(self, loss, smoothing=0.01):
+        """
+            Update the running loss (exponential moving average).
+        """
+        if self.loss == None:
+            self.loss = loss
+        else:
+            self.loss += smoothing*(loss - self.loss)
+
+
+
+    def information(self, i):
+        """
+            Generate the speed, loss and ETA part of the line.
+        """
+        elapsed = time.perf_counter() - self.start
+        rate = i*self.unit_size/elapsed if elapsed > 0 else 0
+        info = " %.1f samples/s" % rate
+        if self.loss != None:
+            info += " loss %.4f" % self.loss
+        if i == self.count:
+            info += " in " + formatDuration(elapsed)
+        elif i > 0:
+            info += " ETA " + formatDuration(elapsed*(self.count-i)/i)
+        return info
+
+
+
+    def show(self, i):
+        """
+            Display the progress after i items.
+        """
+        if self.mode == "bar":
+            x = int(self.size*i/self.count) if self.count > 0 else self.size
+            sys.stdout.write("%s[%s%s] %i/%i%s\033[K\r" % (self.prefix,
+                             "#"*x, "."*(self.size-x), i, self.count,
+                             self.information(i)))
+        elif self.mode == "log":
+            sys.stdout.write("%s%i/%i%s\n" % (self.prefix, i, self.count,
+                             self.information(i)))
         sys.stdout.flush()
 
-    _show(0)
-    for i, item in enumerate(it):
-        yield item
-        _show(i+1)
-    sys.stdout.write("\n")
-    sys.stdout.flush()
+
+
+    def __len__(self):
+        return self.count
+
+
+
+    def __iter__(self):
+        if self.mode == "silent":
+            yield from self.it
+            return
+        interval = PROGRESS["refresh"] if self.mode == "bar" \
+            else PROGRESS["log_interval"]
+        self.start = time.perf_counter()
+        next_show = self.start + interval
+        if self.mode == "bar":
+            self.show(0)
+        i = 0
+        for item in self.it:
+            yield item
+            i += 1
+            now = time.perf_counter()
+            if now >= next_show:
+                self.show(i)
+                next_show = now + interval
+        self.show(i)
+        if self.mode == "bar":
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+
+
+
+def progressbar(it, prefix="", size=60, unit_size=1):
+    """
+        Function used to have access to progress without having to use the
+        package progressbar2.
+        Example of use :
+            for i in progressbar(range(0, 100), "Computing : ", 40):
+                ...
+    """
+    return ProgressBar(it, prefix, size, unit_size)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+"""
+    File imageFolder.py used to read the image files of a directory as
+    MNIST images (see classify.py) and to write the predictions.
+
+    The directory is walked lazily, one entry at a time, so that its size
+    does not matter. The images are decoded by chunks in worker
+    processes : converted to grayscale, resized to 28x28 and inverted when
+    they are dark digits on a light background (MNIST digits are white on
+    black). The Python Image Library is only imported by the workers.
+"""
+
+import os
+import csv
+import json
+import numpy as np
+
+IMAGE_EXTENSIONS = (".png", ".bmp")
+INVERT_MODES = ("auto", "yes", "no")
+SIZE_IMAGE = 28
+
+
+
+def walkImages(directory):
+    """
+        Yield the paths of the image files of a directory and of its
+        subdirectories in the order of the file system (the entries of a
+        directory are not sorted so that they are never all in memory).
+    """
+    with os.scandir(directory) as scan:
+        for entry in scan:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walkImages(entry.path)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield entry.path
+
+
+
+def chunks(iterable, size):
+    """
+        Yield LISTS of size elements of an iterable (the last can be
+        smaller).
+    """
+    chunk = []
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk != []:
+        yield chunk
+
+
+
+def decodeImages(paths, invert="auto"):
+    """
+        Decode image files as MNIST images.
+
+        Inputs :
+
+        -> paths  : LIST of STRING paths of image files.
+
+        -> invert : STRING "yes" to invert the images, "no" not to, "auto"
+                    to invert the ones whose border is light.
+
+        Output :
+
+        <- (images, errors) : NUMPY MATRIX of uint8 (number of images, 784)
+                              and LIST of the error messages (None when the
+                              image was decoded, then its row is zero).
+    """
+    from PIL import Image
+    images = np.zeros((len(paths), SIZE_IMAGE*SIZE_IMAGE), dtype=np.uint8)
+    errors = [None]*len(paths)
+    for index, path in enumerate(paths):
+        try:
+            with Image.open(path) as image:
+                image = image.convert("L").resize((SIZE_IMAGE, SIZE_IMAGE),
+                                                  Image.BILINEAR)
+                pixels = np.asarray(image, dtype=np.uint8)
+        except Exception as details:
+            errors[index] = str(details)
+            continue
+        if invert == "yes" or (invert == "auto" and np.concatenate((
+                pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1])).mean()
+                > 127):
+            pixels = 255 - pixels
+        images[index] = pixels.reshape(-1)
+    return (images, errors)
+
+
+
+class PredictionWriter:
+    """
+        Class used to write the predictions, one line per image, in a CSV
+        file (path, digit, confidence) or a JSONL file (with the output
+        layer too) chosen by the extension of the file.
+    """
+
+    def __init__(self, file_name, directory):
+        """
+            Initialize a PredictionWriter object (and open the file).
+
+            Inputs :
+
+            -> file_name : STRING path of the file (.csv or .jsonl).
+
+            -> directory : STRING directory of the images, the paths are
+                           written relatively to it.
+        """
+        self.directory = directory
+        self.jsonl = file_name.lower().endswith((".jsonl", ".json"))
+        self.file = open(file_name, "w", newline="")
+        if not self.jsonl:
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(["path", "digit", "confidence", "error"])
+
+    def write(self, paths, output_layers, errors):
+        """
+            Write the predictions of images.
+
+            Inputs :
+
+            -> paths         : LIST of STRING paths of the images.
+
+            -> output_layers : NUMPY MATRIX (10, number of images).
+
+            -> errors        : LIST of the decoding errors (see
+                               decodeImages), no digit for these images.
+        """
+        digits = np.argmax(output_layers, axis=0)
+        confidences = np.max(output_layers, axis=0)
+        for index, path in enumerate(paths):
+            path = os.path.relpath(path, self.directory)
+            if errors[index] != None:
+                row = {"path": path, "error": errors[index]}
+            else:
+                row = {"path": path, "digit": int(digits[index]),
+                       "confidence": round(float(confidences[index]), 6)}
+            if self.jsonl:
+                if errors[index] == None:
+                    row["outputs"] = [round(float(output), 6) for output in
+                                      output_layers[:, index]]
+                self.file.write(json.dumps(row) + "\n")
+            else:
+                self.writer.writerow([row["path"], row.get("digit", ""),
+                                      row.get("confidence", ""),
+                                      row.get("error", "")])
+
+    def close(self):
+        self.file.close()
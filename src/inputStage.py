@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+"""
+    File inputStage.py used to transform the 784 pixels of an image before
+    the first layer of a neural network (-input of main.py).
+
+    An input stage is fitted once on the training images and saved with the
+    network (input.npz in its directory) so that the same transformation is
+    used to train and to infer. The network applies it to every input and
+    expands its own inputs back to 784 pixels (see generateInputLayer) so
+    that nothing changes for the code that gives it images.
+
+    Stages :
+        - pixels[:threshold] => only the pixels whose standard deviation on
+                                the training images is above threshold
+                                (the border of the images is almost always
+                                black) are given to the first layer.
+        - pca[:k]            => projection on the k principal components of
+                                the training images.
+"""
+
+import os, sys
+import numpy as np
+
+INPUT_FILE = "input.npz"
+SIZE_INPUT = 784
+# number of images read at once when a stage is fitted
+CHUNK_SIZE = 4096
+# default parameter of each stage
+DEFAULT_PIXELS_THRESHOLD = 0.02
+DEFAULT_PCA_COMPONENTS = 50
+# minimum number of images a stage is fitted on (the statistics of a few
+# images drop or keep pixels at random)
+MIN_FITTING_IMAGES = 1000
+# numbers of components shown in the report of the explained variance
+REPORT_COMPONENTS = [10, 20, 30, 50, 75, 100, 150, 200, 300]
+
+
+
+def imageChunks(dataset):
+    """
+        Generate the images of a MNISTdataset by chunks of CHUNK_SIZE images
+        as [0, 1] float matrices (only one chunk is in memory at a time).
+    """
+    for start in range(0, len(dataset), CHUNK_SIZE):
+        indices = dataset.indices[start:start+CHUNK_SIZE]
+        yield dataset.images[indices].astype(np.float64)/255
+
+
+
+def pixelStatistics(dataset):
+    """
+        Return the mean and the standard deviation of each pixel of the
+        images of a MNISTdataset (NUMPY ARRAYS of size 784).
+    """
+    total = np.zeros(SIZE_INPUT)
+    total_square = np.zeros(SIZE_INPUT)
+    for chunk in imageChunks(dataset):
+        total += chunk.sum(axis=0)
+        total_square += np.square(chunk).sum(axis=0)
+    mean = total/len(dataset)
+    variance = np.maximum(total_square/len(dataset) - np.square(mean), 0)
+    return (mean, np.sqrt(variance))
+
+
+
+class PixelSelection:
+    """
+        Input stage that only keeps the informative pixels of an image.
+    """
+
+    kind = "pixels"
+
+    def __init__(self, pixels, fill):
+        """
+            Initialize a PixelSelection object.
+
+            Inputs :
+
+            -> pixels : NUMPY ARRAY of INT, indices of the kept pixels.
+
+            -> fill   : NUMPY ARRAY of size 784, value given to the pixels
+                        that are not kept when an input is expanded.
+        """
+        self.pixels = pixels
+        self.fill = fill
+        # size of the inputs given to the first layer
+        self.size = len(pixels)
+        # floating point operations to transform an input
+        self.flops = 0
+
+    def apply(self, input_layer):
+        """
+            Transform an input of 784 pixels into an input of self.size (or
+            a batch of inputs, one per column).
+        """
+        return input_layer[self.pixels]
+
+    def expand(self, input_layer):
+        """
+            Transform an input of self.size back into 784 pixels.
+        """
+        expanded = self.fill.copy()
+        expanded[self.pixels] = input_layer
+        return expanded
+
+    def save(self, dir_save):
+        """
+            Save the stage in dir_save/input.npz.
+        """
+        np.savez(os.path.join(dir_save, INPUT_FILE), kind=self.kind,
+                 pixels=self.pixels, fill=self.fill)
+
+    def describe(self):
+        """
+            Return a STRING with the number of pixels kept.
+        """
+        return "%i of %i pixels kept" % (self.size, SIZE_INPUT)
+
+
+
+def fitPixelSelection(dataset, threshold=DEFAULT_PIXELS_THRESHOLD):
+    """
+        Fit a PixelSelection on the images of a MNISTdataset : the pixels
+        whose standard deviation is at most threshold are dropped (and
+        replaced by their mean when an input is expanded).
+    """
+    mean, std = pixelStatistics(dataset)
+    pixels = np.flatnonzero(std > threshold)
+    if len(pixels) == 0:
+        print("ERROR : No pixel has a standard deviation above", threshold,
+            "on the", len(dataset), "training images.")
+        sys.exit(1)
+    return PixelSelection(pixels, mean)
+
+
+
+class PCAProjection:
+    """
+        Input stage that projects an image on the principal components of
+        the training images.
+    """
+
+    kind = "pca"
+
+    def __init__(self, mean, components, explained):
+        """
+            Initialize a PCAProjection object.
+
+            Inputs :
+
+            -> mean       : NUMPY ARRAY of size 784, mean of the images.
+
+            -> components : NUMPY MATRIX (k, 784) of the principal components
+                            (orthonormal rows).
+
+            -> explained  : NUMPY ARRAY of size 784, part of the variance
+                            explained by each of the 784 components.
+        """
+        self.mean = mean
+        self.components = components
+        self.explained = explained
+        self.size = len(components)
+        self.flops = 2*self.size*SIZE_INPUT
+
+    def apply(self, input_layer):
+        """
+            Project an input of 784 pixels on the principal components.
+
+            Input :
+
+            -> input_layer : NUMPY ARRAY of size 784 (or a batch of inputs,
+                             NUMPY MATRIX (784, batch size), one per column).
+
+            Output :
+
+            <-             : NUMPY ARRAY of self.size coordinates (or NUMPY
+                             MATRIX (self.size, batch size)).
+        """
+        # (transposed so that a batch of inputs, one per column, works too)
+        return self.components.dot((input_layer.T - self.mean).T)
+
+    def expand(self, input_layer):
+        """
+            Transform the self.size coordinates of an input back into 784
+            pixels (the part of the image outside of the components is
+            lost).
+
+            Input :
+
+            -> input_layer : NUMPY ARRAY of size self.size.
+
+            Output :
+
+            <-             : NUMPY ARRAY of size 784.
+        """
+        return self.components.T.dot(input_layer) + self.mean
+
+    def save(self, dir_save):
+        """
+            Save the stage in dir_save/input.npz.
+        """
+        np.savez(os.path.join(dir_save, INPUT_FILE), kind=self.kind,
+                 mean=self.mean, components=self.components,
+                 explained=self.explained)
+
+    def describe(self):
+        """
+            Return a STRING with the number of components and the part of
+            the variance they explain.
+        """
+        return "%i principal components (%.1f %% of the variance)" % (
+            self.size, 100*np.sum(self.explained[:self.size]))
+
+    def varianceReport(self):
+        """
+            Return the lines of the table of the variance explained by the
+            first k components for several k.
+        """
+        cumulated = np.cumsum(self.explained)
+        lines = ["%12s %12s" % ("Components", "Variance %")]
+        for k in sorted(set(REPORT_COMPONENTS + [self.size])):
+            if k <= len(cumulated):
+                lines.append("%12i %12.2f%s" % (k, 100*cumulated[k-1],
+                             " <=" if k == self.size else ""))
+        return lines
+
+
+
+def fitPCAProjection(dataset, nb_components=DEFAULT_PCA_COMPONENTS):
+    """
+        Fit a PCAProjection on the images of a MNISTdataset. The covariance
+        matrix is accumulated chunk by chunk (one matrix product per chunk)
+        and diagonalized once.
+    """
+    total = np.zeros(SIZE_INPUT)
+    products = np.zeros((SIZE_INPUT, SIZE_INPUT))
+    for chunk in imageChunks(dataset):
+        total += chunk.sum(axis=0)
+        products += chunk.T.dot(chunk)
+    mean = total/len(dataset)
+    covariance = products/len(dataset) - np.outer(mean, mean)
+    # eigh gives the eigenvalues of a symmetric matrix in ascending order
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    eigenvalues = np.maximum(eigenvalues[::-1], 0)
+    eigenvectors = eigenvectors[:, ::-1]
+    explained = eigenvalues/max(np.sum(eigenvalues), 1e-12)
+    return PCAProjection(mean, np.ascontiguousarray(
+        eigenvectors[:, :nb_components].T), explained)
+
+
+
+def loadInputStage(dir_load):
+    """
+        Load the input stage saved with a network.
+        Return None if the network has none.
+    """
+    if dir_load == None or not os.path.isfile(os.path.join(dir_load,
+                                                           INPUT_FILE)):
+        return None
+    data = np.load(os.path.join(dir_load, INPUT_FILE))
+    kind = str(data["kind"])
+    if kind == PixelSelection.kind:
+        return PixelSelection(data["pixels"], data["fill"])
+    if kind == PCAProjection.kind:
+        return PCAProjection(data["mean"], data["components"],
+                             data["explained"])
+    print("ERROR : The input stage", kind, "of", dir_load, "is unknown.")
+    sys.exit(1)
+
+
+
+def fitInputStage(args, training_data):
+    """
+        Return the input stage asked by the arguments (-input) fitted on
+        training_data (None if there is none, a saved network loads its own
+        stage).
+    """
+    if args.input_stage == None:
+        return None
+    if len(training_data) < MIN_FITTING_IMAGES:
+        print("ERROR : The input stage is fitted on the training images, -ls"
+            " has to be at least", MIN_FITTING_IMAGES, "with -input.")
+        sys.exit(1)
+    kind, parameter = args.input_stage
+    if kind == PixelSelection.kind:
+        if parameter == None:
+            parameter = DEFAULT_PIXELS_THRESHOLD
+        return fitPixelSelection(training_data, parameter)
+    if kind == PCAProjection.kind:
+        if parameter == None:
+            parameter = DEFAULT_PCA_COMPONENTS
+        return fitPCAProjection(training_data, int(parameter))
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+"""
+    File instrumentation.py used to measure where the time goes during a
+    run without having to use cProfile. It provides phase timers (wall and
+    CPU time), counters (samples, FLOPs...) and hooks called at the start
+    and at the end of each phase.
+
+    Everything goes through the object INSTRUMENT. When it is disabled
+    (default), a phase is a shared object that does nothing so that the
+    instrumentation can be left in the code of the hot paths.
+
+    Example of use :
+        with INSTRUMENT.phase("train"):
+            ...
+        INSTRUMENT.count("train samples", 100)
+"""
+
+import os, time, json, threading
+
+
+class NullPhase:
+    """
+        Phase used when the instrumentation is disabled. Does nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+
+NULL_PHASE = NullPhase()
+
+
+
+class Phase:
+    """
+        Phase measured when the instrumentation is enabled.
+    """
+
+    def __init__(self, instrumentation, name, trace):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        if self.trace:
+            self.instrumentation.callHooks("start", self.name, 0, 0)
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        self.instrumentation.record(self.name, self.wall, wall, cpu,
+                                    self.trace)
+        return False
+
+
+
+class Instrumentation:
+    """
+        Class that gathers the timers, counters and hooks of a run.
+    """
+
+    def __init__(self):
+        """
+            Initialize a disabled Instrumentation object.
+        """
+        self.enabled = False
+        # name : [number of calls, wall time, cpu time]
+        self.timers = {}
+        # name : value
+        self.counters = {}
+        # trace events (Chrome trace-event format) of the traced phases
+        self.events = []
+        # functions hook(event, name, wall, cpu) with event "start" or "end"
+        self.hooks = []
+        self.origin = time.perf_counter()
+
+
+
+    def enable(self, enabled=True):
+        """
+            Enable (or disable) the instrumentation.
+        """
+        self.enabled = enabled
+
+
+
+    def reset(self):
+        """
+            Forget everything that was measured.
+        """
+        self.timers = {}
+        self.counters = {}
+        self.events = []
+        self.origin = time.perf_counter()
+
+
+
+    def phase(self, name, trace=True):
+        """
+            Return a context manager that measures the time spent in it.
+            Use trace=False for the phases in the hot paths (called for each
+            sample) : they are only added to the timers and do not call the
+            hooks nor create a trace event.
+        """
+        if not self.enabled:
+            return NULL_PHASE
+        return Phase(self, name, trace)
+
+
+
+    def count(self, name, value=1):
+        """
+            Add value to the counter name.
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+
+    def addHook(self, hook):
+        """
+            Add a function hook(event, name, wall, cpu) called at the start
+            (event == "start") and at the end (event == "end") of each traced
+            phase. wall and cpu are the durations in seconds (0 at the start).
+        """
+        self.hooks.append(hook)
+
+
+
+    def callHooks(self, event, name, wall, cpu):
+        """
+            Call every hook.
+        """
+        for hook in self.hooks:
+            hook(event, name, wall, cpu)
+
+
+
+    def record(self, name, start, wall, cpu, trace):
+        """
+            Record a measured phase.
+        """
+        timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+        timer[0] += 1
+        timer[1] += wall
+        timer[2] += cpu
+        if trace:
+            self.events.append({"name": name, "ph": "X", "pid": os.getpid(),
+                                "tid": threading.get_ident(),
+                                "ts": (start - self.origin)*1e6,
+                                "dur": wall*1e6, "args": {"cpu": cpu}})
+            self.callHooks("end", name, wall, cpu)
+
+
+
+    def summary(self):
+        """
+            Generate the summary table of the timers and the counters.
+
+            Output :
+
+            <- lines : LIST of STRING
+        """
+        lines = ["%-32s %10s %12s %12s %12s" % ("Phase", "Calls", "Wall (s)",
+                                                "CPU (s)", "Wall/call")]
+        for name, (calls, wall, cpu) in sorted(self.timers.items(),
+                                               key=lambda item: -item[1][1]):
+            lines.append("%-32s %10i %12.4f %12.4f %12.3e" % (name, calls,
+                         wall, cpu, wall/calls))
+        if self.counters:
+            lines.append("")
+            lines.append("%-32s %10s %12s" % ("Counter", "Value", "Per second"))
+            # rate computed against the phase with the same first word
+            # ex : "train samples" against the phase "train"
+            for name, value in sorted(self.counters.items()):
+                timer = self.timers.get(name.split(" ")[0])
+                rate = value/timer[1] if timer and timer[1] > 0 else 0
+                lines.append("%-32s %10.4g %12.4g" % (name, value, rate))
+        return lines
+
+
+
+    def exportChromeTrace(self, path):
+        """
+            Write the traced phases and the counters in a JSON file that can
+            be opened with chrome://tracing or https://ui.perfetto.dev.
+        """
+        events = list(self.events)
+        end = (time.perf_counter() - self.origin)*1e6
+        for name, value in self.counters.items():
+            events.append({"name": name, "ph": "C", "pid": os.getpid(),
+                           "ts": end, "args": {name: value}})
+        with open(path, "w") as document:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"},
+                      document)
+
+
+
+# the instrumentation used everywhere in the project
+INSTRUMENT = Instrumentation()
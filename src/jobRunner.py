@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""
+    File jobRunner.py used to train and test a neural network from a list
+    of arguments (the same as main.py) on data sets that are already loaded.
+    Used by the programs that run many jobs in the same process (sweeps,
+    daemon...) so that the data sets are only loaded once. A job is one
+    training and one test : -kfold and the reports of main.py are refused.
+    As with main.py, the network is saved with -S and the run is logged
+    unless -NO-INFO is given.
+"""
+
+import sys
+import time
+from src.argumentsManager import ArgsManager
+from src.neuralNetwork import NeuralNetwork
+from src.inputStage import fitInputStage
+from src.importanceSampling import createSampler
+from src.distillation import createDistilled
+from src.augmentation import createAugmented, AugmentedDataset
+
+
+
+def checkJobArgs(args):
+    """
+        Exit with an error if the arguments (ArgsManager) ask for something
+        a job does not do : cross-validation (-kfold) and the reports of
+        main.py (-timers, -trace, -mem, -estimate).
+    """
+    if args.kfold != None:
+        print("ERROR : -kfold cannot be used in a job, use main.py.")
+        sys.exit(1)
+    if args.timers or args.trace_file != None or args.memory or \
+            args.estimate:
+        print("ERROR : -timers, -trace, -mem and -estimate cannot be used in"
+            " a job, use main.py.")
+        sys.exit(1)
+
+
+
+def runJob(list_args, training_data, testing_data, state=None):
+    """
+        Train and test a neural network.
+
+        Inputs :
+
+        -> list_args     : LIST of STRING, arguments as given to main.py
+                           (ex : ["main.py", "networks/model/nw1.txt", "-bs",
+                           "10"]). The sizes of the data sets are the ones
+                           of training_data and testing_data.
+
+        -> training_data, testing_data : data sets (see loadMNIST).
+
+        -> state         : (weights, biases, input_stage) TUPLE used to start
+                           the training from (ex : the state returned by an
+                           earlier job), None to use the network of list_args.
+
+        Output :
+
+        <- (args, network, results) : TUPLE, the ArgsManager and
+                           NeuralNetwork objects and a DICT with the
+                           error_rate, average_cost and timings.
+    """
+    args = ArgsManager(list_args)
+    checkJobArgs(args)
+    # the input stage is only fitted once, when the training starts
+    if state != None:
+        input_stage = state[2]
+    else:
+        input_stage = fitInputStage(args, training_data)
+    network = NeuralNetwork(args.neural_network, args.squishing_funcs,
+                            args.dir_load, input_stage, args.sparse_input,
+                            args.layer_specs)
+    if state != None:
+        # order="K" keeps the Fortran order of the first matrix of -sparse
+        network.weights = [w.copy(order="K") for w in state[0]]
+        network.biases = [b.copy() for b in state[1]]
+
+    training_data = createDistilled(args, createAugmented(args,
+                                                          training_data))
+    start = time.time()
+    try:
+        network.trainNEO(training_data, args.batches_size,
+                         args.grad_desc_factor, args.repeat,
+                         createSampler(args, training_data))
+    finally:
+        # stop the thread that distorts the images (the daemon workers live
+        # as long as the daemon)
+        if isinstance(training_data, AugmentedDataset):
+            training_data.close()
+    timings = {"train": time.time() - start}
+    if args.dir_save != None:
+        network.save(args.dir_save)
+    start = time.time()
+    error_rate, average_cost = network.test(testing_data)
+    timings["test"] = time.time() - start
+    if args.dir_save != None and args.to_info:
+        metrics_file = network.metrics.save(args.dir_save)
+        network.inform(args, error_rate, average_cost, timings, metrics_file)
+
+    results = {"error_rate": error_rate, "average_cost": average_cost,
+               "timings": timings}
+    return (args, network, results)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+"""
+    File memoryReport.py used to know how much memory a run needs.
+    It can estimate the memory of a run before it starts (from the layers,
+    the sizes of the data sets and the batch size) and measure, for each
+    phase of the run (see src/instrumentation.py), the peak of the memory
+    traced by tracemalloc, its biggest allocations and the peak RSS of the
+    process so far (the system only gives the peak since the process
+    started, so that it cannot go down from a phase to the next one).
+"""
+
+import sys, tracemalloc
+
+# memory used by python and numpy once imported (measured, about)
+BASE_MEMORY = 30*2**20
+SIZE_FLOAT = 8
+# size in bytes of an image (uint8 pixels + label) and of its index in a
+# data set (see MNISTdataset in mnistHandwriting.py)
+SIZE_IMAGE = 784 + 1
+SIZE_INDEX = 8
+
+
+
+def peakRSS():
+    """
+        Return the peak resident set size of the process in bytes
+        (None if it cannot be known on this platform).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux but bytes on macOS
+    if sys.platform == "darwin":
+        return peak
+    return peak*1024
+
+
+
+def formatSize(size):
+    """
+        Return a human readable size.
+    """
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(size) < 1024 or unit == "GB":
+            return "%.1f %s" % (size, unit)
+        size /= 1024
+
+
+
+def estimateMemory(len_layers, learning_size, testing_size, batch_size,
+                   shared=False, layer_specs=None):
+    """
+        Estimate the memory needed by a run of main.py.
+
+        Inputs :
+
+        -> len_layers    : LIST of INT, number of neurons of each layer.
+
+        -> learning_size, testing_size, batch_size : INT
+
+        -> shared        : BOOL True if the data sets are published in shared
+                           memory (their images are then not counted).
+
+        -> layer_specs   : LIST type of each layer (see NeuralNetwork), None
+                           if they are all fully connected.
+
+        Output :
+
+        <- estimate      : LIST of TUPLES (component, size in bytes), the
+                           last one is the total.
+    """
+    sizes = [len_layers[index]*len_layers[index+1] + len_layers[index+1]
+             for index in range(len(len_layers)-1)]
+    # layers of a whole batch (with the values before the squishing function)
+    # and patches unfolded by the convolution layers
+    batch_layers = 0
+    if layer_specs != None:
+        from src.convolution import layerShapes
+        shapes = layerShapes(layer_specs)
+        for index, spec in enumerate(layer_specs):
+            if spec != None and spec[0] == "conv":
+                size_patch = shapes[index][0]*spec[2]*spec[2]
+                sizes[index] = spec[1]*size_patch + spec[1]
+                batch_layers += size_patch*len_layers[index+1]//spec[1]
+            elif spec != None:
+                sizes[index] = 0
+        batch_layers = (batch_layers + 2*sum(len_layers))*batch_size*SIZE_FLOAT
+    nb_params = sum(sizes)
+    biggest_matrix = max(sizes)
+    # the whole file is read (60000 or 10000 images) unless it is shared
+    size_training = SIZE_INDEX*learning_size
+    size_testing = SIZE_INDEX*testing_size
+    if not shared:
+        size_training += SIZE_IMAGE*60000
+        size_testing += SIZE_IMAGE*10000
+    parameters = nb_params*SIZE_FLOAT
+    if layer_specs != None:
+        # whole gradients of a batch (see trainBatches)
+        gradients = 2*parameters + batch_layers
+    elif batch_size == 1:
+        # the weights are updated with one temporary matrix per layer
+        gradients = 2*biggest_matrix*SIZE_FLOAT
+    else:
+        # sum of the gradients + gradients of one sample + temporary matrix
+        gradients = 2*parameters + biggest_matrix*SIZE_FLOAT
+    estimate = [("python + numpy", BASE_MEMORY),
+                ("network parameters", parameters),
+                ("training data", size_training),
+                ("gradients", gradients),
+                ("testing data", size_testing)]
+    estimate.append(("total", sum(size for _, size in estimate)))
+    return estimate
+
+
+
+def printEstimate(estimate):
+    """
+        Print the estimate given by estimateMemory.
+    """
+    print("\nEstimated memory needed :")
+    for component, size in estimate:
+        print("%-24s %12s" % (component, formatSize(size)))
+    print("")
+
+
+
+class MemoryReport:
+    """
+        Class used to measure the memory of each phase of a run. It is a
+        hook of the instrumentation (see src/instrumentation.py).
+    """
+
+    def __init__(self, nb_top=5):
+        """
+            Initialize a MemoryReport object and start tracemalloc (unless
+            it was started before the imports, see main.py).
+            nb_top is the number of biggest allocations kept for each phase.
+        """
+        self.nb_top = nb_top
+        # LIST of (phase, peak rss, traced peak, LIST of top allocations)
+        self.phases = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        # everything allocated before the first phase (imports, arguments)
+        self.hook("end", "import", 0, 0)
+
+
+
+    def hook(self, event, name, wall, cpu):
+        """
+            Hook called at the start and at the end of each phase.
+        """
+        if event == "start":
+            tracemalloc.reset_peak()
+            return
+        _, traced_peak = tracemalloc.get_traced_memory()
+        statistics = tracemalloc.take_snapshot().statistics("lineno")
+        top = [(str(stat.traceback[0]), stat.size)
+               for stat in statistics[:self.nb_top]]
+        self.phases.append((name, peakRSS(), traced_peak, top))
+
+
+
+    def stop(self):
+        """
+            Stop tracemalloc.
+        """
+        tracemalloc.stop()
+
+
+
+    def report(self):
+        """
+            Generate the report of every phase.
+
+            Output :
+
+            <- lines : LIST of STRING
+        """
+        lines = ["%-12s %24s %14s" % ("Phase", "Process peak RSS so far",
+                 "Traced peak")]
+        for name, rss, traced_peak, _ in self.phases:
+            lines.append("%-12s %24s %14s" % (name,
+                         formatSize(rss) if rss else "?",
+                         formatSize(traced_peak)))
+        for name, _, _, top in self.phases:
+            lines.append("")
+            lines.append("Biggest allocations alive at the end of " + name +
+                         " :")
+            for place, size in top:
+                lines.append("  %12s  %s" % (formatSize(size), place))
+        return lines
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+"""
+    File metricsRecorder.py used to record how the training evolves step by
+    step (loss, gradient norm, gradient descent factor and time of each
+    step) at a very low cost so that it can always be on.
+
+    The values are written in preallocated numpy arrays. When they are full,
+    two consecutive entries are averaged into one and every new entry then
+    stands for twice as many steps : the whole training is always kept, with
+    a resolution that decreases as it gets longer.
+"""
+
+import os, datetime
+import numpy as np
+
+FIELDS = ["loss", "grad_norm", "lr_factor", "step_time"]
+# number of steps between two computations of the gradient norm when it is
+# expensive (mini batches)
+NORM_INTERVAL = 10
+
+
+
+class MetricsRecorder:
+    """
+        Class used to record the metrics of each training step.
+    """
+
+    def __init__(self, capacity=4096):
+        """
+            Initialize a MetricsRecorder object.
+
+            Inputs :
+
+            -> capacity : INT (even) number of entries kept in memory.
+        """
+        self.capacity = capacity - capacity % 2
+        self.values = {field: np.zeros(self.capacity, dtype=np.float32)
+                       for field in FIELDS}
+        # first step of each entry
+        self.steps = np.zeros(self.capacity, dtype=np.int64)
+        # number of entries written
+        self.size = 0
+        # number of steps in one entry
+        self.stride = 1
+        # number of steps recorded
+        self.nb_steps = 0
+        # sums of the steps of the entry being filled
+        self.pending = [0.0, 0.0, 0.0, 0.0]
+        self.pending_norms = 0
+        self.pending_steps = 0
+
+
+
+    def needNorm(self):
+        """
+            Return True if the gradient norm of the next step has to be
+            computed. Used when it is expensive to compute it.
+        """
+        return self.nb_steps % NORM_INTERVAL == 0
+
+
+
+    def record(self, loss, grad_norm, lr_factor, step_time):
+        """
+            Record one training step. grad_norm can be None if it was not
+            computed for this step.
+        """
+        pending = self.pending
+        pending[0] += loss
+        if grad_norm != None:
+            pending[1] += grad_norm
+            self.pending_norms += 1
+        pending[2] += lr_factor
+        pending[3] += step_time
+        self.pending_steps += 1
+        self.nb_steps += 1
+        if self.pending_steps == self.stride:
+            self.writeEntry()
+
+
+
+    def writeEntry(self):
+        """
+            Write the average of the pending steps as a new entry.
+        """
+        index = self.size
+        nb = self.pending_steps
+        self.values["loss"][index] = self.pending[0]/nb
+        self.values["grad_norm"][index] = self.pending[1]/self.pending_norms \
+            if self.pending_norms > 0 else np.nan
+        self.values["lr_factor"][index] = self.pending[2]/nb
+        self.values["step_time"][index] = self.pending[3]/nb
+        self.steps[index] = self.nb_steps - nb
+        self.size += 1
+        self.pending = [0.0, 0.0, 0.0, 0.0]
+        self.pending_norms = 0
+        self.pending_steps = 0
+        if self.size == self.capacity:
+            self.downsample()
+
+
+
+    def downsample(self):
+        """
+            Average the entries two by two so that half of the arrays is free
+            and double the number of steps per entry.
+        """
+        half = self.capacity//2
+        for field in FIELDS:
+            pairs = self.values[field].reshape(half, 2)
+            if field == "grad_norm":
+                # the norm may not have been computed for every entry
+                counts = np.sum(~np.isnan(pairs), axis=1)
+                sums = np.nansum(pairs, axis=1)
+                averages = np.full(half, np.nan, dtype=np.float32)
+                np.divide(sums, counts, out=averages, where=counts > 0)
+            else:
+                averages = np.mean(pairs, axis=1)
+            self.values[field][:half] = averages
+        self.steps[:half] = self.steps[0::2]
+        self.size = half
+        self.stride *= 2
+
+
+
+    def arrays(self):
+        """
+            Return the recorded entries (pending steps included).
+
+            Output :
+
+            <- arrays : DICT {"step" or field : NUMPY ARRAY}
+        """
+        arrays = {"step": self.steps[:self.size].copy()}
+        for field in FIELDS:
+            arrays[field] = self.values[field][:self.size].copy()
+        if self.pending_steps > 0:
+            nb = self.pending_steps
+            last = [self.pending[0]/nb,
+                    self.pending[1]/self.pending_norms
+                    if self.pending_norms > 0 else np.nan,
+                    self.pending[2]/nb, self.pending[3]/nb]
+            arrays["step"] = np.append(arrays["step"], self.nb_steps - nb)
+            for field, value in zip(FIELDS, last):
+                arrays[field] = np.append(arrays[field],
+                                          np.float32(value))
+        return arrays
+
+
+
+    def save(self, dir_save):
+        """
+            Save the recorded entries in dir_save/metrics-{date}.npz.
+            Return the name of the file (None if nothing was recorded).
+        """
+        if self.nb_steps == 0:
+            return None
+        name = "metrics-" + datetime.datetime.now().strftime(
+                "%Y%m%d-%H%M%S") + ".npz"
+        np.savez(os.path.join(dir_save, name), stride=self.stride,
+                 **self.arrays())
+        return name
@@ -6,10 +6,11 @@
 """
 
 
+import sys
 from struct import unpack
-from PIL import Image
 import numpy as np
 from src.externalFunc import progressbar
+from src.instrumentation import INSTRUMENT
 # from progressbar import *
 
 
@@ -106,11 +107,122 @@ def MNISTexample(startN, howMany, bTrain=True, only01=False):
 
     fImages.close()
     fLabels.close()
+    INSTRUMENT.count("load samples", howMany)
 
     return T
 
 
 
+# files of the MNIST database (images and labels) for each data set
+MNIST_FILES = {True: ("data/train-images-idx3-ubyte",
+                      "data/train-labels-idx1-ubyte"),
+               False: ("data/t10k-images-idx3-ubyte",
+                       "data/t10k-labels-idx1-ubyte")}
+# expected output for each digit
+ONE_HOT = np.eye(10)
+
+
+
+def readMNIST(bTrain=True):
+    """
+        Read a whole data set of the MNIST files at once with numpy.
+
+        Output :
+
+        <- (images, labels) : NUMPY ARRAYS of uint8, images has a shape of
+                              (number of images, 784) and labels of
+                              (number of images,).
+    """
+    images_file, labels_file = MNIST_FILES[bTrain]
+    with open(images_file, "rb") as fImages:
+        _, numIm, rowsIm, colsIm = unpack(">IIII", fImages.read(16))
+        images = np.frombuffer(fImages.read(numIm*rowsIm*colsIm),
+                               dtype=np.uint8).reshape(-1, rowsIm*colsIm)
+    with open(labels_file, "rb") as fLabels:
+        _, numL = unpack(">II", fLabels.read(8))
+        labels = np.frombuffer(fLabels.read(numL), dtype=np.uint8)
+    # the files may not have the same number of items
+    size = min(len(images), len(labels))
+    return (images[:size], labels[:size])
+
+
+
+class MNISTdataset:
+    """
+        Data set that behaves like the list returned by MNISTexample (each
+        item is an (input, expected output) pair) but keeps the images as a
+        uint8 matrix : an input is only converted to [0, 1] floats when it is
+        accessed. Slicing it or taking a subset never copies the images.
+    """
+
+    def __init__(self, images, labels, indices=None, owner=None):
+        """
+            Initialize a MNISTdataset object.
+
+            Inputs :
+
+            -> images, labels : NUMPY ARRAYS (see readMNIST).
+
+            -> indices        : NUMPY ARRAY of the indices of the images of
+                                the data set (None means all of them).
+
+            -> owner          : object that has to stay alive as long as the
+                                data set (ex : a shared memory segment).
+        """
+        self.images = images
+        self.labels = labels
+        if indices is None:
+            indices = np.arange(len(labels))
+        self.indices = indices
+        self.owner = owner
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.subset(self.indices[i])
+        index = self.indices[i]
+        return (self.images[index]/255.0, ONE_HOT[self.labels[index]])
+
+    def __iter__(self):
+        for index in self.indices:
+            yield (self.images[index]/255.0, ONE_HOT[self.labels[index]])
+
+    def subset(self, indices):
+        """
+            Return the data set made of the items indices of this one
+            (without copying the images).
+        """
+        return MNISTdataset(self.images, self.labels,
+                            self.indices[np.asarray(indices)], self.owner)
+
+
+
+def loadMNIST(startN, howMany, bTrain=True):
+    """
+        Replacement of MNISTexample. Return the MNISTdataset of the howMany
+        images from startN. If the data set was published in shared memory
+        (see shareDataset.py) it is used (read-only) instead of reading the
+        files, so that concurrent processes share one copy of it.
+    """
+    from src.sharedDataset import attachDataset
+    shared = attachDataset(bTrain)
+    if shared != None:
+        images, labels, segment = shared
+    else:
+        images, labels = readMNIST(bTrain)
+        segment = None
+    if startN + howMany > len(labels):
+        print("ERROR : There are only", len(labels), "images in the data"
+            " set.")
+        sys.exit(1)
+    INSTRUMENT.count("load samples", howMany)
+    return MNISTdataset(images, labels, np.arange(startN, startN+howMany),
+                        segment)
+
+
+
 def writeMNISTimage(T, display, antialias=False):
     """
         This function is not needed to do the training, but just in case you
@@ -130,6 +242,8 @@ def writeMNISTimage(T, display, antialias=False):
     """
     # note that you need to have the Python Imaging Library installed to
     # run this function.  If you search for it online, you'll find it.
+    # It is only imported here because it is slow to import and optional.
+    from PIL import Image
     for i in range(0, len(T)):
         im = Image.new('L',(28,28))
         pixels = im.load()
@@ -5,21 +5,66 @@
     as an object.
 """
 
-import sys, csv, datetime, random
+import os, sys, time, random, hashlib
 import numpy as np
 from src.squishingFunc import *
 from src.externalFunc import *
+from src.instrumentation import INSTRUMENT
+from src.inputStage import loadInputStage, INPUT_FILE
+from src.convolution import layerShapes, convForward, convBackward, \
+    poolForward, poolBackward
+from src.compressedLayers import saveWeights, loadWeights
 
 SIZE_INPUT = 784 # 28 * 28 = 784 pixels
 SIZE_OUTPUT = 10 # number of numbers between 0 and 9
 
 
+
+def loadNetwork(dir_load):
+    """
+        Return the NeuralNetwork saved in the directory dir_load (with the
+        layers and the squishing functions of its nw.txt).
+    """
+    from src.argumentsManager import ArgsManager
+    args = ArgsManager(["main.py", dir_load, "-NO-INFO"])
+    return NeuralNetwork(args.neural_network, args.squishing_funcs, dir_load,
+                         layer_specs=args.layer_specs)
+
+
+
+def savedFiles(dir_load):
+    """
+        Return the paths of the files of a saved network that change what it
+        computes ({index}.npz and its input stage).
+    """
+    paths = []
+    while os.path.isfile(os.path.join(dir_load, str(len(paths)) + ".npz")):
+        paths.append(os.path.join(dir_load, str(len(paths)) + ".npz"))
+    if os.path.isfile(os.path.join(dir_load, INPUT_FILE)):
+        paths.append(os.path.join(dir_load, INPUT_FILE))
+    return paths
+
+
+
+def networkFingerprint(dir_load):
+    """
+        Return a hash of the saved weights of a network (its version : it
+        changes as soon as the network is saved with other weights).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in savedFiles(dir_load):
+        with open(path, "rb") as document:
+            digest.update(document.read())
+    return digest.hexdigest()
+
+
 class NeuralNetwork:
     """
         Class neural network.
     """
 
-    def __init__(self, len_layers, squishing_funcs, dir_load):
+    def __init__(self, len_layers, squishing_funcs, dir_load,
+                 input_stage=None, sparse_input=False, layer_specs=None):
         """
             Initialize an object NeuralNetwork.
 
@@ -30,7 +75,26 @@ class NeuralNetwork:
                       the layers and their sizes. It will be used as followed :
                       "./main.py information.txt"
                       ex of entry : network1.txt
+
+            -> input_stage : transformation of the 784 pixels before the
+                      first layer (see src/inputStage.py). By default the one
+                      saved in dir_load (if any).
+
+            -> sparse_input : BOOL True to compute the first layer only with
+                      the nonzero inputs (most of the pixels are black).
+
+            -> layer_specs : LIST of the type of each layer computed by the
+                      network : None for a fully connected layer, a TUPLE
+                      ("conv", filters, size) or ("pool", size) for the first
+                      ones (see src/convolution.py). By default all of them
+                      are fully connected.
         """
+        # the first layer is given the inputs transformed by the input stage
+        if input_stage == None:
+            input_stage = loadInputStage(dir_load)
+        self.input_stage = input_stage
+        if input_stage != None:
+            len_layers = [input_stage.size] + list(len_layers[1:])
 
         # number of layers in the neural network + output and input layer
         self.nb_layer = len(len_layers)
@@ -38,7 +102,17 @@ class NeuralNetwork:
         # number of neurals in each layer
         self.len_layers = len_layers
 
+        # type of each layer computed and (channels, rows, columns) of each
+        # layer up to the first fully connected one
+        self.convolutional = layer_specs != None
+        if layer_specs == None:
+            layer_specs = [None]*(self.nb_layer-1)
+        self.layer_specs = layer_specs
+        self.shapes = layerShapes(layer_specs)
+
         # (nb_layer - 1) matrix and biases vectors composed the neural network
+        # (the filters (filters, channels*size*size) for a convolution layer
+        # and empty arrays for a pooling layer)
         self.weights = [None]*(self.nb_layer-1)
         self.biases = [None]*(self.nb_layer-1)
 
@@ -49,10 +123,56 @@ class NeuralNetwork:
             print("nb_layer = ", self.nb_layer)
             sys.exit(1)
 
+        # compressed weight matrices (see src/compressedLayers.py) are only
+        # used to predict or fine-tuned by compress.py
+        self.compressed = not all(isinstance(weights, np.ndarray)
+                                  for weights in self.weights)
+        if self.compressed and sparse_input:
+            print("ERROR : -sparse cannot be used with a compressed network.")
+            sys.exit(1)
+
+        # in sparse mode the first weight matrix is stored column by column
+        # (Fortran order) so that the columns of the nonzero inputs are
+        # contiguous rows of its transpose
+        self.sparse_input = sparse_input
+        if sparse_input:
+            self.weights[0] = np.asfortranarray(self.weights[0])
+
         # squishing functions used for each layer. Except the last one,
         # because the last layer doesn't calculate another layer.
         self.squishing_funcs = squishing_funcs
 
+        self.updateFlops()
+
+        # masks of the pruned weights (see src/compressedLayers.py) kept at
+        # zero while the network is trained, None if it is not pruned
+        self.masks = None
+
+        # metrics of each training step (loss, gradient norm...), created by
+        # the first training so that a network only used to predict does not
+        # import the training code
+        self.metrics = None
+
+
+
+    def updateFlops(self):
+        """
+            Compute the number of floating point operations to generate the
+            output layer (one multiplication and one addition for each weight,
+            for each position of the filters for a convolution layer).
+        """
+        self.flops_forward = 0
+        for index in range(0, self.nb_layer-1):
+            if self.layer_specs[index] == None:
+                self.flops_forward += 2*self.weights[index].size
+            elif self.layer_specs[index][0] == "conv":
+                self.flops_forward += 2*self.weights[index].size*(
+                        self.shapes[index+1][1]*self.shapes[index+1][2])
+            else:
+                self.flops_forward += self.len_layers[index]
+        if self.input_stage != None:
+            self.flops_forward += self.input_stage.flops
+
 
 
     def initializeWeightsBiases(self, dir_load):
@@ -63,14 +183,27 @@ class NeuralNetwork:
         """
         if dir_load == None:
             for index in range(0, self.nb_layer-1):
-                self.weights[index] = 0.01*((-1)**index)*np.random.rand(
-                        self.len_layers[index+1], self.len_layers[index])
-                self.biases[index] = 0.01*((-1)**index)*np.random.rand(
-                        self.len_layers[index+1])
+                spec = self.layer_specs[index]
+                if spec == None:
+                    self.weights[index] = 0.01*((-1)**index)*np.random.rand(
+                            self.len_layers[index+1], self.len_layers[index])
+                    self.biases[index] = 0.01*((-1)**index)*np.random.rand(
+                            self.len_layers[index+1])
+                elif spec[0] == "conv":
+                    # centered filters scaled by the size of a patch so
+                    # that the filters do not all start alike
+                    size_patch = self.shapes[index][0]*spec[2]*spec[2]
+                    self.weights[index] = np.random.randn(spec[1],
+                            size_patch)/np.sqrt(size_patch)
+                    self.biases[index] = np.zeros(spec[1])
+                else:
+                    self.weights[index] = np.zeros((0, 0))
+                    self.biases[index] = np.zeros(0)
         else:
             for index in range(0, self.nb_layer-1):
                 data = np.load(dir_load+"/"+str(index)+".npz")
-                self.weights[index] = data["w"]
+                # compressed matrices are saved with their own arrays
+                self.weights[index] = loadWeights(data)
                 self.biases[index] = data["b"]
 
 
@@ -83,8 +216,10 @@ class NeuralNetwork:
         dweights = [None]*(self.nb_layer-1)
         dbiases = [None]*(self.nb_layer-1)
         for index in range(0, self.nb_layer-1):
+            # same order as the weights (see the sparse mode in __init__)
             dweights[index] = np.zeros(shape=(
-                    self.len_layers[index+1], self.len_layers[index]))
+                    self.len_layers[index+1], self.len_layers[index]),
+                    order="F" if index == 0 and self.sparse_input else "C")
             dbiases[index] = np.zeros(
                     self.len_layers[index+1])
         return (dweights, dbiases)
@@ -97,7 +232,8 @@ class NeuralNetwork:
 
 
 
-    def trainNEO(self, training_data, batch_size, gradientDescentFactor, repeat):
+    def trainNEO(self, training_data, batch_size, gradientDescentFactor, repeat,
+                 sampler=None):
         """
             Method used to train the neural network.
 
@@ -105,15 +241,36 @@ class NeuralNetwork:
             Else               => mini_batching training
 
             Repeat is the number of repetition of learning for each batch.
+
+            If sampler is given (see src/importanceSampling.py) the images are
+            drawn by it (sampler.nb_draws images) instead of being taken in
+            order, and their gradient is weighted by it.
         """
+        if self.compressed:
+            print("ERROR : A compressed network cannot be trained, fine-tune"
+                " it with compress.py.")
+            sys.exit(1)
+        # the convolution layers are computed a whole batch at a time
+        if self.convolutional:
+            return self.trainBatches(training_data, batch_size,
+                                     gradientDescentFactor, repeat, sampler)
         size_training_data = len(training_data)
+        if sampler != None:
+            size_training_data = sampler.nb_draws
         gdf_func = gradientDescentFactor[0]
         gdf_param = gradientDescentFactor[1]
+        # forward + backward propagation (about twice the forward one)
+        flops_sample = 3*self.flops_forward
+        if self.metrics == None:
+            from src.metricsRecorder import MetricsRecorder
+            self.metrics = MetricsRecorder()
 
         # quicker training => descent one by one digit
         if batch_size == 1:
-            for i in progressbar(range(0, size_training_data),
-                                "Computing train process : ",40):
+            bar = progressbar(range(0, size_training_data),
+                                "Computing train process : ",40)
+            for i in bar:
+                (index, weight) = (i, 1) if sampler == None else sampler.next()
                 # we can choose how many time we want to repeat the operation
                 # in order to get a deeper and a more efficent learning
                 for nb_repetition in range(0, repeat+1):
@@ -121,28 +278,89 @@ class NeuralNetwork:
                     gdfactor = 0.1*gdf_func(nb_repetition, gdf_param)
                     # extract the image to use for the training and its
                     # expected output
-                    in_out_layers = training_data[i]
-                    self.calculateNegGradientNEO(in_out_layers, gdfactor)
+                    in_out_layers = training_data[index]
+                    start = time.perf_counter()
+                    with INSTRUMENT.phase("calculateNegGradientNEO", False):
+                        (cost, grad_norm) = self.calculateNegGradientNEO(
+                                in_out_layers, gdfactor*weight)
+                    self.metrics.record(cost, grad_norm, gdfactor,
+                                        time.perf_counter() - start)
+                    if sampler != None and nb_repetition == 0:
+                        sampler.update(index, cost)
+                    self.applyMasks()
+                bar.addLoss(cost)
+                INSTRUMENT.count("train samples", repeat+1)
+                INSTRUMENT.count("train flops", (repeat+1)*flops_sample)
         # longer training => descent to the average
         else:
-            for i in progressbar(range(0, round(size_training_data/batch_size)),
-                                "Computing train process : ",40):
+            bar = progressbar(range(0, round(size_training_data/batch_size)),
+                                "Computing train process : ",40, batch_size)
+            for i in bar:
+                # (index, weight of the gradient) of the images of the batch
+                if sampler == None:
+                    batch = [(index_batch, 1) for index_batch in
+                             range(i*batch_size, (i+1)*batch_size)]
+                else:
+                    batch = [sampler.next() for _ in range(0, batch_size)]
                 for nb_repetition in range(0, repeat+1):
+                    start = time.perf_counter()
                     gdfactor = 0.1*gdf_func(nb_repetition, gdf_param)/batch_size
                     (dw,db) = self.initializeEmptyDParamArrays()
+                    batch_cost = 0
                     # iteration on the size of a batch
-                    for index_batch in range(i*batch_size, (i+1)*batch_size):
+                    for index_batch, weight in batch:
                         in_out_layers = training_data[index_batch]
-                        (dw2, db2) = self.calculateNegGradient(in_out_layers)
+                        with INSTRUMENT.phase("calculateNegGradient", False):
+                            (dw2, db2, cost) = self.calculateNegGradient(
+                                    in_out_layers, self.sparse_input)
+                        batch_cost += cost
+                        if sampler != None and nb_repetition == 0:
+                            sampler.update(index_batch, cost)
                         # add the gradient due to dweights and dbiases
                         for index2 in range(0, self.nb_layer-1):
-                            dw[index2] += dw2[index2]
-                            db[index2] += db2[index2]
+                            if isinstance(dw2[index2], tuple):
+                                # sparse : (nonzero inputs, their columns)
+                                active, columns = dw2[index2]
+                                dw[index2].T[active] += columns*weight
+                            elif weight != 1:
+                                dw[index2] += dw2[index2]*weight
+                            else:
+                                dw[index2] += dw2[index2]
+                            db[index2] += db2[index2]*weight
 
                     for index in range(0, self.nb_layer-1):
                         # finally update the weights and the biases
                         self.weights[index] += dw[index]*gdfactor
                         self.biases[index] += db[index]*gdfactor
+                    self.applyMasks()
+
+                    # norm of the average negative gradient of the batch
+                    # (a whole pass on the parameters => not at every step)
+                    grad_norm = None
+                    if self.metrics.needNorm():
+                        grad_norm = np.sqrt(sum(np.vdot(dw[index], dw[index])
+                                + np.vdot(db[index], db[index])
+                                for index in range(0, self.nb_layer-1))) \
+                                / batch_size
+                    self.metrics.record(batch_cost/batch_size, grad_norm,
+                                        gdfactor*batch_size,
+                                        time.perf_counter() - start)
+                bar.addLoss(batch_cost/batch_size)
+                INSTRUMENT.count("train samples", (repeat+1)*batch_size)
+                INSTRUMENT.count("train flops",
+                                 (repeat+1)*batch_size*flops_sample)
+
+
+
+    def applyMasks(self):
+        """
+            Set the pruned weights back to zero after an update.
+        """
+        if self.masks == None:
+            return
+        for index, mask in enumerate(self.masks):
+            if mask is not None:
+                self.weights[index] *= mask
 
 
 
@@ -159,6 +377,11 @@ class NeuralNetwork:
                           the second numpy array has length of 10.
                           This is the best output that could be obtain when
                           we test the neural network with the according image
+
+            Output :
+
+            <- (cost, grad_norm) : TUPLE of FLOAT, cost of the image before
+                          the update and norm of the negative gradient.
         """
         training_input = in_out_layers[0]
         values_layers, z_values = self.generateAllLayers(training_input)
@@ -167,6 +390,10 @@ class NeuralNetwork:
 
         # initialization of der_cost_to_a needed for the loop
         der_cost_to_a = DerCostFunction(training_output, perfect_output)
+        cost = np.sum(CostFunction(training_output, perfect_output))
+        # squared norm of the gradient, as dweights = dbiases x a its norm is
+        # |dbiases|*|a| which is much cheaper than going through dweights
+        grad_norm2 = 0
 
         for index in range(self.nb_layer-2, -1, -1):
             # extract the good squishing function for this layer
@@ -176,15 +403,195 @@ class NeuralNetwork:
             a = values_layers[index]
 
             # derivative cost to param weights, biases and a
+            # (the derivative to the input layer is never used)
             dbiases = np.multiply(der_func_z, der_cost_to_a)
-            dweights = -np.outer(dbiases, a) # * -1 to get NEG grad
-            der_cost_to_a = np.dot(dbiases, self.weights[index])
-            dbiases *= -1 # * -1 after to get NEG grad
-
-            # update weights and biases
-            self.weights[index] += dweights*gdfactor
+            if index > 0:
+                der_cost_to_a = np.dot(dbiases, self.weights[index])
+            dbiases *= -1 # * -1 to get NEG grad
+            grad_norm2 += np.dot(dbiases, dbiases)*(np.dot(a, a) + 1)
+
+            # update weights and biases (in sparse mode only the columns of
+            # the nonzero inputs of the first layer change)
+            if index == 0 and self.sparse_input:
+                active = np.flatnonzero(a)
+                self.weights[0].T[active] += np.outer(a[active],
+                                                      dbiases*gdfactor)
+            else:
+                self.weights[index] += np.outer(dbiases*gdfactor, a)
             self.biases[index] += dbiases*gdfactor
 
+        return (cost, np.sqrt(grad_norm2))
+
+
+
+# --------------------------- CONVOLUTION TRAIN METHOD -------------------------
+
+
+
+
+    def trainBatches(self, training_data, batch_size, gradientDescentFactor,
+                     repeat, sampler=None):
+        """
+            Method used to train a neural network with convolution layers.
+            Same as trainNEO but every layer of a batch is a matrix (one column
+            per image) so that each layer costs one matrix product for the
+            whole batch (an individual training is a batch of one image).
+        """
+        size_training_data = len(training_data)
+        if sampler != None:
+            size_training_data = sampler.nb_draws
+        gdf_func = gradientDescentFactor[0]
+        gdf_param = gradientDescentFactor[1]
+        flops_sample = 3*self.flops_forward
+        if self.metrics == None:
+            from src.metricsRecorder import MetricsRecorder
+            self.metrics = MetricsRecorder()
+
+        bar = progressbar(range(0, round(size_training_data/batch_size)),
+                            "Computing train process : ",40, batch_size)
+        for i in bar:
+            # (index, weight of the gradient) of the images of the batch
+            if sampler == None:
+                batch = [(index_batch, 1) for index_batch in
+                         range(i*batch_size, (i+1)*batch_size)]
+            else:
+                batch = [sampler.next() for _ in range(0, batch_size)]
+            samples = [training_data[index_batch] for index_batch, _ in batch]
+            input_layers = np.stack([sample[0] for sample in samples], axis=1)
+            perfect_outputs = np.stack([sample[1] for sample in samples],
+                                       axis=1)
+            weights = np.array([weight for _, weight in batch])
+            for nb_repetition in range(0, repeat+1):
+                start = time.perf_counter()
+                gdfactor = 0.1*gdf_func(nb_repetition, gdf_param)/batch_size
+                with INSTRUMENT.phase("calculateNegGradientBatch", False):
+                    (dw, db, costs) = self.calculateNegGradientBatch(
+                            input_layers, perfect_outputs, weights)
+                if sampler != None and nb_repetition == 0:
+                    for (index_batch, _), cost in zip(batch, costs):
+                        sampler.update(index_batch, cost)
+                for index in range(0, self.nb_layer-1):
+                    self.weights[index] += dw[index]*gdfactor
+                    self.biases[index] += db[index]*gdfactor
+                self.applyMasks()
+
+                grad_norm = None
+                if self.metrics.needNorm():
+                    grad_norm = np.sqrt(sum(np.vdot(dw[index], dw[index])
+                            + np.vdot(db[index], db[index])
+                            for index in range(0, self.nb_layer-1))) \
+                            / batch_size
+                self.metrics.record(np.mean(costs), grad_norm,
+                                    gdfactor*batch_size,
+                                    time.perf_counter() - start)
+            bar.addLoss(np.mean(costs))
+            INSTRUMENT.count("train samples", (repeat+1)*batch_size)
+            INSTRUMENT.count("train flops", (repeat+1)*batch_size*flops_sample)
+
+
+
+    def forwardBatch(self, input_layers):
+        """
+            Method used to compute all the layers of a batch.
+
+            Input :
+
+            -> input_layers : NUMPY MATRIX (784, batch size), one image per
+                             column.
+
+            Output :
+
+            <- (values_layers, z_values, caches) : LISTS of the NUMPY MATRIX
+                             of each layer, of the values before the squishing
+                             function (None for a pooling layer) and of what
+                             the backward propagation needs for a convolution
+                             (the unfolded patches) or a pooling layer (the
+                             position of the maximums).
+        """
+        if self.input_stage != None:
+            input_layers = self.input_stage.apply(input_layers)
+        values_layers = [input_layers]
+        z_values = []
+        caches = []
+        for index in range(0, self.nb_layer-1):
+            spec = self.layer_specs[index]
+            cache = None
+            if spec == None:
+                z = self.weights[index].dot(values_layers[-1]) + \
+                    self.biases[index][:, None]
+            elif spec[0] == "conv":
+                (z, cache) = convForward(values_layers[-1], self.shapes[index],
+                        self.weights[index], self.biases[index], spec[2])
+            else:
+                # a pooling layer has no parameter nor squishing function
+                (new_layers, cache) = poolForward(values_layers[-1],
+                        self.shapes[index], spec[1])
+                values_layers.append(new_layers)
+                z_values.append(None)
+                caches.append(cache)
+                continue
+            Function = self.squishing_funcs[index][0]
+            values_layers.append(Function(z))
+            z_values.append(z)
+            caches.append(cache)
+        return (values_layers, z_values, caches)
+
+
+
+    def calculateNegGradientBatch(self, input_layers, perfect_outputs,
+                                  weights):
+        """
+            Method used to compute the negative gradient of a batch.
+
+            Inputs :
+
+            -> input_layers    : NUMPY MATRIX (784, batch size).
+
+            -> perfect_outputs : NUMPY MATRIX (10, batch size).
+
+            -> weights         : NUMPY ARRAY weight of the gradient of each
+                                 image (see src/importanceSampling.py).
+
+            Output :
+
+            <- (dweights, dbiases, costs) : TUPLE, the sum on the batch of the
+                                 weighted negative gradients of each weight
+                                 matrix and biases array, and the NUMPY ARRAY
+                                 of the cost of each image.
+        """
+        values_layers, z_values, caches = self.forwardBatch(input_layers)
+        training_outputs = values_layers[self.nb_layer-1]
+        costs = np.sum(CostFunction(training_outputs, perfect_outputs), axis=0)
+        der_cost_to_a = DerCostFunction(training_outputs, perfect_outputs)*\
+            weights
+        dweights = [None]*(self.nb_layer-1)
+        dbiases = [None]*(self.nb_layer-1)
+
+        for index in range(self.nb_layer-2, -1, -1):
+            spec = self.layer_specs[index]
+            if spec != None and spec[0] == "pool":
+                dweights[index] = np.zeros((0, 0))
+                dbiases[index] = np.zeros(0)
+                der_cost_to_a = poolBackward(der_cost_to_a, caches[index],
+                        self.shapes[index], spec[1])
+                continue
+            DerFunction = self.squishing_funcs[index][2]
+            dz = np.multiply(DerFunction(z_values[index]), der_cost_to_a)
+            # (the derivative to the input layer is never used)
+            if spec == None:
+                dweights[index] = -dz.dot(values_layers[index].T)
+                dbiases[index] = -dz.sum(axis=1)
+                if index > 0:
+                    der_cost_to_a = self.weights[index].T.dot(dz)
+            else:
+                (dw, db, der_cost_to_a) = convBackward(dz, caches[index],
+                        self.shapes[index], self.weights[index], spec[2],
+                        index > 0)
+                dweights[index] = -dw
+                dbiases[index] = -db
+
+        return (dweights, dbiases, costs)
+
 
 
 # ------------------------------- OLD TRAIN METHOD -----------------------------
@@ -225,7 +632,7 @@ class NeuralNetwork:
                     # extract the image to use for the training and its
                     # expected output
                     in_out_layers = training_data[index]
-                    (dw2, db2) = self.calculateNegGradient(in_out_layers)
+                    (dw2, db2, _) = self.calculateNegGradient(in_out_layers)
 
                     if batch_size == 1:
                         dw, db = dw2, db2
@@ -295,7 +702,7 @@ class NeuralNetwork:
 
 
 
-    def calculateNegGradient(self, in_out_layers):
+    def calculateNegGradient(self, in_out_layers, sparse=False):
         """
             Method used to train the neural network.
 
@@ -309,13 +716,19 @@ class NeuralNetwork:
                           This is the best output that could be obtain when
                           we test the neural network with the according image
 
+            -> sparse    : BOOL True to only compute the columns of the first
+                          weight matrix of the nonzero inputs.
+
             Output :
 
-            <- (dweights, dbiases) : TUPLE of LISTS.
+            <- (dweights, dbiases, cost) : TUPLE.
                           The first one contains NUMPY MATRIX for all the
-                          weight matrix in the neural network.
+                          weight matrix in the neural network (if sparse, the
+                          first one is a TUPLE (indices of the nonzero inputs,
+                          transposed columns of the gradient)).
                           The second one contains NUMPY ARRAY for all the
                           biases array in the neural network.
+                          The third one is the FLOAT cost of the image.
         """
         training_input = in_out_layers[0]
         values_layers, z_values = self.generateAllLayers(training_input)
@@ -327,6 +740,7 @@ class NeuralNetwork:
         dbiases = [None]*(self.nb_layer+1)
 
         der_cost_to_a = DerCostFunction(training_output, perfect_output)
+        cost = np.sum(CostFunction(training_output, perfect_output))
         # from (nb_layer - 2) to 0
         for index in range(self.nb_layer-2, -1, -1):
             # extract the good squishing function for this layer
@@ -336,11 +750,16 @@ class NeuralNetwork:
             a = values_layers[index]
             # derivative cost to param weights, biases and a
             dbiases[index] = np.multiply(der_func_z, der_cost_to_a)
-            dweights[index] = -np.outer(dbiases[index], a) # *-1 NEG grad
-            der_cost_to_a = np.dot(dbiases[index], self.weights[index])
+            if index > 0:
+                der_cost_to_a = np.dot(dbiases[index], self.weights[index])
             dbiases[index] *= -1 # don't forget to multiply by minus -1 NEG grad
+            if index == 0 and sparse:
+                active = np.flatnonzero(a)
+                dweights[index] = (active, np.outer(a[active], dbiases[index]))
+            else:
+                dweights[index] = np.outer(dbiases[index], a)
 
-        return (dweights, dbiases)
+        return (dweights, dbiases, cost)
 
 
 
@@ -367,9 +786,16 @@ class NeuralNetwork:
                              ex : [0, 0, 0, 0, 1, 0, 0, 0, 0, 0] in the best
                              case scenario if the input is a handwriting five.
         """
+        if self.convolutional:
+            return self.forwardBatch(input_layer[:, None])[0][-1][:, 0]
+        if self.input_stage != None:
+            input_layer = self.input_stage.apply(input_layer)
         new_array = input_layer
         for index in range(0, self.nb_layer-1):
-            z = self.weights[index].dot(new_array) + self.biases[index]
+            if index == 0:
+                z = self.firstLayerProduct(new_array) + self.biases[0]
+            else:
+                z = self.weights[index].dot(new_array) + self.biases[index]
             # extract the good squishing function for this layer
             # [0] means the function not inverse or derivative one
             Function = self.squishing_funcs[index][0]
@@ -377,6 +803,30 @@ class NeuralNetwork:
         return new_array
 
 
+
+    def generateOuputLayers(self, input_layers):
+        """
+            Same as generateOuputLayer for a batch of images : input_layers
+            is a NUMPY MATRIX (784, batch size) and each layer is computed
+            with one matrix product for the whole batch.
+            Return the NUMPY MATRIX (10, batch size) of the output layers.
+        """
+        return self.forwardBatch(input_layers)[0][-1]
+
+
+
+    def firstLayerProduct(self, input_layer):
+        """
+            Return the product of the first weight matrix and the input layer.
+            In sparse mode only the columns of the nonzero inputs are used
+            (they are contiguous rows of the transpose, see __init__).
+        """
+        if not self.sparse_input:
+            return self.weights[0].dot(input_layer)
+        active = np.flatnonzero(input_layer)
+        return input_layer[active].dot(self.weights[0].T[active])
+
+
     def generateAllLayers(self, input_layer):
         """
             Method used when training the neural network model by giving it a
@@ -408,12 +858,16 @@ class NeuralNetwork:
                              network minus one (except the first one).
                              Thus its size is nb_layer+1.
         """
-
+        if self.input_stage != None:
+            input_layer = self.input_stage.apply(input_layer)
         new_array = input_layer
         values_layers = [new_array]
         z_values = []
         for index in range(0, self.nb_layer-1):
-            z = self.weights[index].dot(new_array) + self.biases[index]
+            if index == 0:
+                z = self.firstLayerProduct(new_array) + self.biases[0]
+            else:
+                z = self.weights[index].dot(new_array) + self.biases[index]
             # extract the good squishing function for this layer
             # [0] means the function not inverse or derivative one
             Function = self.squishing_funcs[index][0]
@@ -445,6 +899,10 @@ class NeuralNetwork:
                              it contains the color of pixel (white / black) with
                              number notation from 0 to 1
         """
+        if self.convolutional:
+            print("ERROR : An input cannot be generated by a network with"
+                " convolution layers.")
+            sys.exit(1)
         new_array = output_layer
         # iteration from nb_layer-2 => 0
         for index in range(self.nb_layer-2, -1, -1):
@@ -453,6 +911,9 @@ class NeuralNetwork:
             # [1] means the inverse function not inormal or derivative one
             InvFunction = self.squishing_funcs[index][1]
             new_array = invA.dot(InvFunction(new_array)-self.biases[index])
+        # back to the 784 pixels of an image
+        if self.input_stage != None:
+            new_array = self.input_stage.expand(new_array)
         return new_array
 
 
@@ -469,8 +930,10 @@ class NeuralNetwork:
         """
         # save the weights and biases
         for index in range(0, self.nb_layer-1):
-            np.savez(dir_save+"/"+str(index), w=self.weights[index],
-                    b=self.biases[index])
+            saveWeights(dir_save+"/"+str(index), self.weights[index],
+                        self.biases[index])
+        if self.input_stage != None:
+            self.input_stage.save(dir_save)
 
 
 
@@ -482,15 +945,17 @@ class NeuralNetwork:
         total_cost = 0
         nb_test = len(testing_data)
 
-        for element in progressbar(testing_data,
-                        "Computing test process  : ",40):
+        bar = progressbar(testing_data, "Computing test process  : ",40)
+        for element in bar:
             input_layer = element[0]
             perfect_output = element[1]
-            generated_output = self.generateOuputLayer(input_layer)
+            with INSTRUMENT.phase("generateOuputLayer", False):
+                generated_output = self.generateOuputLayer(input_layer)
             # for information in the csv file
             cost_array = CostFunction(generated_output, perfect_output)
             cost = sum(cost_array)
             total_cost += cost
+            bar.addLoss(cost)
 
             index_max_value = np.argmax(generated_output)
             expected_answer = np.argmax(perfect_output)
@@ -510,48 +975,21 @@ class NeuralNetwork:
 
         error_rate = (nb_test-nb_correct)/nb_test
         average_cost = total_cost/nb_test
+        INSTRUMENT.count("test samples", nb_test)
+        INSTRUMENT.count("test flops", nb_test*self.flops_forward)
 
         return (error_rate, average_cost)
 
 
-    def inform(self, args, error_rate, average_cost):
-        """
-            Method to load information in the CSV file in the correspondant
-            directory.
-        """
-        # get the csv file
-        dir_save = args.dir_save
-        csvfile = dir_save + "/info.csv"
-
-        # read and save all the rows in the memory list
-        document = open(csvfile, "r")
-        reader = csv.reader(document, delimiter='|', lineterminator='\n')
-        memory = []
-        for row in reader:
-            memory.append(row)
-        document.close()
-
-        # Initialize the list to add in the csv file
-        now = datetime.datetime.now()
-        date = now.strftime("%Y-%m-%d %H:%M")
-        to_add = [str(args.learning_size), str(error_rate), str(average_cost),
-            str(args.testing_size), str(args.grad_desc_factor_str),
-            str(args.batches_size), str(args.repeat),
-            str(args.squishing_funcs_str)]
-        title = memory[0]
-        length_title = len(title)
-        new_row = []
-        for index, element in enumerate(to_add):
-            info = element[:len(title[index])] + \
-                " " * (len(title[index]) - len(element))
-            new_row.append(info)
-        new_row.append(str(date))
-
-        # add the new row at the second from the top
-        document = open(csvfile, "w")
-        writer = csv.writer(document, delimiter='|', lineterminator='\n')
-        writer.writerow(memory[0])
-        writer.writerow(new_row)
-        for index, element in enumerate(memory[1:]):
-            writer.writerow(element)
-        document.close()
+    def inform(self, args, error_rate, average_cost, timings=None,
+               metrics_file=None):
+        """
+            Method to log the information about the run in the run log of
+            the correspondant directory. The record is appended so that it
+            costs the same whatever the number of runs already logged.
+            Use runReport.py to get the view sorted from the newest run.
+        """
+        from src.runLog import createRecord, appendRun
+        record = createRecord(args, error_rate, average_cost, timings,
+                              metrics=metrics_file)
+        appendRun(args.dir_save, record)
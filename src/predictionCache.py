@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""
+    File predictionCache.py used to answer again the images that were
+    already predicted by a saved network without computing them again (see
+    the -predict requests of daemon.py).
+
+    An image (its 784 uint8 pixels) is identified by a blake2b hash of its
+    bytes keyed with the version of the network (a hash of its saved
+    weights, see networkFingerprint). The output layers are kept in an LRU
+    order and the least recently used ones are evicted when there are more
+    than max_entries of them or when they take more than max_bytes. The
+    saved files of the network are checked (size and modification time) at
+    most every CHECK_INTERVAL seconds : when the network is saved again it
+    is reloaded and every cached output is dropped.
+"""
+
+import os
+import time
+import hashlib
+import collections
+import numpy as np
+from src.neuralNetwork import loadNetwork, savedFiles, networkFingerprint
+
+SIZE_INPUT = 784
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_MAX_BYTES = 64*2**20
+# memory of an entry without its output layer (key, python objects), about
+ENTRY_OVERHEAD = 200
+# minimum time between two checks of the saved files (in seconds)
+CHECK_INTERVAL = 1.0
+
+
+
+class PredictionCache:
+    """
+        Class used to cache the output layers of a saved network.
+    """
+
+    def __init__(self, dir_load, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        """
+            Initialize a PredictionCache object (and load the network).
+
+            Inputs :
+
+            -> dir_load    : STRING directory of the saved network.
+
+            -> max_entries : INT maximum number of cached output layers.
+
+            -> max_bytes   : INT maximum memory of the cached output layers.
+        """
+        self.dir_load = dir_load
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # {key : output layer} from the least to the most recently used
+        self.entries = collections.OrderedDict()
+        self.nb_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.network = None
+        self.version = None
+        self.signature = None
+        self.last_check = None
+        self.checkNetwork()
+
+    def checkNetwork(self):
+        """
+            Reload the network and drop the cache if its saved files changed.
+        """
+        now = time.monotonic()
+        if self.last_check != None and now - self.last_check < CHECK_INTERVAL:
+            return
+        self.last_check = now
+        signature = [(path, os.stat(path).st_size, os.stat(path).st_mtime_ns)
+                     for path in savedFiles(self.dir_load)]
+        if signature == self.signature:
+            return
+        self.signature = signature
+        version = networkFingerprint(self.dir_load)
+        if version == self.version:
+            return
+        if self.version != None:
+            self.invalidations += 1
+        self.network = loadNetwork(self.dir_load)
+        self.version = version
+        self.entries.clear()
+        self.nb_bytes = 0
+
+    def key(self, image):
+        """
+            Return the key of an image (NUMPY ARRAY of 784 uint8).
+        """
+        return hashlib.blake2b(image.tobytes(), digest_size=16,
+                               key=self.version.encode()).digest()
+
+    def predict(self, images):
+        """
+            Return the output layers (NUMPY MATRIX (number of images, 10)) of
+            images (NUMPY MATRIX of uint8 (number of images, 784)). Only the
+            images that are not cached are given to the network, at once.
+        """
+        self.checkNetwork()
+        images = np.ascontiguousarray(images, dtype=np.uint8).reshape(
+                -1, SIZE_INPUT)
+        keys = [self.key(image) for image in images]
+        outputs = np.zeros((len(images), 10))
+        missing = []
+        for index, key in enumerate(keys):
+            output = self.entries.get(key)
+            if output is None:
+                missing.append(index)
+            else:
+                self.entries.move_to_end(key)
+                outputs[index] = output
+        self.hits += len(images) - len(missing)
+        self.misses += len(missing)
+        if len(missing) > 0:
+            computed = self.network.generateOuputLayers(
+                    images[missing].T/255.0).T
+            outputs[missing] = computed
+            for index, output in zip(missing, computed):
+                self.add(keys[index], output.copy())
+        return outputs
+
+    def add(self, key, output):
+        """
+            Cache an output layer and evict the least recently used ones
+            beyond the limits.
+        """
+        if key in self.entries:
+            return
+        self.entries[key] = output
+        self.nb_bytes += output.nbytes + ENTRY_OVERHEAD
+        while len(self.entries) > self.max_entries or \
+                self.nb_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.nb_bytes -= evicted.nbytes + ENTRY_OVERHEAD
+            self.evictions += 1
+
+    def stats(self):
+        """
+            Return a DICT of the counters of the cache.
+        """
+        nb_requests = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits/nb_requests if nb_requests else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries), "bytes": self.nb_bytes,
+                "version": self.version}
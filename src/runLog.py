@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+"""
+    File runLog.py used to keep track of every run made with a saved
+    neural network. Each run is appended as one JSON line in the file
+    runs.jsonl of the saved directory, so that logging a run never needs
+    to read or rewrite the runs already logged.
+"""
+
+import os, csv, json, datetime
+
+RUN_LOG = "runs.jsonl"
+LEGACY_LOG = "info.csv"
+# columns of the pipe-separated view (same as the legacy info.csv file)
+# and the key of the corresponding value in a run record
+COLUMNS = [("Learning Size", "learning_size"),
+           ("Error Rate %", "error_rate"),
+           ("Average Cost", "average_cost"),
+           ("Testing Size", "testing_size"),
+           ("Gradient Descent", "grad_desc_factor"),
+           ("Batches Size", "batches_size"),
+           ("Repeat", "repeat"),
+           ("Squishing Func", "squishing_funcs"),
+           ("Date", "date")]
+
+
+
+def createRecord(args, error_rate, average_cost, timings=None, **extra):
+    """
+        Create the record of a run.
+
+        Inputs :
+
+        -> args         : ArgsManager object used for the run.
+
+        -> error_rate, average_cost : FLOAT results of the test.
+
+        -> timings      : DICT {phase name : duration in seconds}.
+
+        -> extra        : any other information to keep (JSON serializable).
+
+        Output :
+
+        <- record       : DICT
+    """
+    record = {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+              "learning_size": args.learning_size,
+              "error_rate": float(error_rate),
+              "average_cost": float(average_cost),
+              "testing_size": args.testing_size,
+              "grad_desc_factor": args.grad_desc_factor_str,
+              "batches_size": args.batches_size,
+              "repeat": args.repeat,
+              "squishing_funcs": args.squishing_funcs_str,
+              "layers": args.neural_network,
+              "input_stage": args.input_stage_str,
+              "augment": args.augment,
+              "augment_seed": args.augment_seed,
+              "sampling": args.sampling_str,
+              "teacher": args.teacher,
+              "temperature": args.temperature,
+              "timings": timings or {}}
+    record.update(extra)
+    return record
+
+
+
+def appendRun(dir_save, record):
+    """
+        Append a record at the end of the run log of dir_save.
+        Only one line is written whatever the number of runs already logged.
+    """
+    line = json.dumps(record, sort_keys=True) + "\n"
+    # a single write in append mode so that concurrent runs do not mix lines
+    with open(os.path.join(dir_save, RUN_LOG), "a") as document:
+        document.write(line)
+
+
+
+def readRuns(dir_load):
+    """
+        Read all the records of the run log of dir_load, oldest first.
+        Return an empty list if nothing was logged yet.
+    """
+    runs = []
+    path = os.path.join(dir_load, RUN_LOG)
+    if not os.path.isfile(path):
+        return runs
+    with open(path, "r") as document:
+        for line in document:
+            if line.strip() != "":
+                runs.append(json.loads(line))
+    return runs
+
+
+
+def readLegacyRows(dir_load):
+    """
+        Read the rows (without the title) of the legacy info.csv file.
+        They are all older than the runs of the run log.
+    """
+    path = os.path.join(dir_load, LEGACY_LOG)
+    if not os.path.isfile(path):
+        return []
+    with open(path, "r") as document:
+        reader = csv.reader(document, delimiter='|', lineterminator='\n')
+        rows = [row for row in reader]
+    return rows[1:]
+
+
+
+def recordToRow(record):
+    """
+        Convert a record into a row of the pipe-separated view.
+    """
+    row = []
+    for _, key in COLUMNS:
+        value = record.get(key, "")
+        if key == "date":
+            value = value.replace("T", " ")[:16]
+        row.append(str(value))
+    return row
+
+
+
+def formatRuns(dir_load, limit=None, legacy=True):
+    """
+        Generate the pipe-separated view of all the runs of dir_load sorted
+        from the newest to the oldest.
+
+        Inputs :
+
+        -> dir_load : STRING directory of a saved neural network.
+
+        -> limit    : INT maximum number of rows (None means every row).
+
+        -> legacy   : BOOL add the rows of the legacy info.csv file.
+
+        Output :
+
+        <- lines    : LIST of STRING, the first one is the title.
+    """
+    runs = sorted(readRuns(dir_load), key=lambda run: run.get("date", ""),
+                  reverse=True)
+    rows = [recordToRow(run) for run in runs]
+    if legacy:
+        rows += [[element.strip() for element in row]
+                 for row in readLegacyRows(dir_load)]
+    if limit is not None:
+        rows = rows[:limit]
+
+    title = [name for name, _ in COLUMNS]
+    widths = [len(name) for name in title]
+    for row in rows:
+        for index, element in enumerate(row[:len(widths)]):
+            widths[index] = max(widths[index], len(element))
+
+    lines = []
+    for row in [title] + rows:
+        lines.append("|".join(element.ljust(width)
+                              for element, width in zip(row, widths)).rstrip())
+    return lines
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""
+    File sharedDataset.py used to publish the decoded MNIST data sets in
+    named shared memory segments. Every process that loads a data set (see
+    loadMNIST in mnistHandwriting.py) attaches to the segment read-only when
+    it exists, so that many concurrent runs use one copy of the data.
+
+    A segment starts with a manifest (JSON padded to MANIFEST_SIZE bytes)
+    that gives the version of the format and the shape, dtype and offset of
+    each array.
+"""
+
+import json
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+SEGMENT_NAMES = {True: "digitLearning-train", False: "digitLearning-test"}
+MANIFEST_SIZE = 4096
+FORMAT_VERSION = 1
+
+
+
+def untrack(segment):
+    """
+        By default python unlinks at exit the segments a process created or
+        attached to. A published segment has to outlive the processes, it is
+        only unlinked by unpublishDataset.
+    """
+    try:
+        resource_tracker.unregister(segment._name, "shared_memory")
+    except Exception:
+        pass
+
+
+
+def publishDataset(bTrain=True):
+    """
+        Read a data set and copy it in a new shared memory segment.
+        Return the manifest of the segment.
+    """
+    from src.mnistHandwriting import readMNIST
+    images, labels = readMNIST(bTrain)
+    manifest = {"version": FORMAT_VERSION, "arrays": {}}
+    offset = MANIFEST_SIZE
+    for name, array in (("images", images), ("labels", labels)):
+        manifest["arrays"][name] = {"shape": list(array.shape),
+                                    "dtype": str(array.dtype),
+                                    "offset": offset}
+        offset += array.nbytes
+    segment = shared_memory.SharedMemory(SEGMENT_NAMES[bTrain], create=True,
+                                         size=offset)
+    untrack(segment)
+    header = json.dumps(manifest).encode()
+    segment.buf[:len(header)] = header
+    for name, array in (("images", images), ("labels", labels)):
+        description = manifest["arrays"][name]
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf,
+                          offset=description["offset"])
+        view[:] = array
+        del view
+    segment.close()
+    return manifest
+
+
+
+def attachDataset(bTrain=True):
+    """
+        Attach to the published segment of a data set.
+
+        Output :
+
+        <- (images, labels, segment) : read-only NUMPY ARRAYS using the
+                  memory of the segment (the segment has to be kept alive as
+                  long as the arrays are used), None if the data set was not
+                  published (or with another version of the format).
+    """
+    try:
+        segment = shared_memory.SharedMemory(SEGMENT_NAMES[bTrain])
+    except (FileNotFoundError, OSError):
+        return None
+    untrack(segment)
+    header = bytes(segment.buf[:MANIFEST_SIZE]).rstrip(b"\0")
+    try:
+        manifest = json.loads(header.decode())
+    except ValueError:
+        manifest = {}
+    if manifest.get("version") != FORMAT_VERSION:
+        segment.close()
+        return None
+    arrays = []
+    for name in ("images", "labels"):
+        description = manifest["arrays"][name]
+        array = np.ndarray(description["shape"], dtype=description["dtype"],
+                           buffer=segment.buf, offset=description["offset"])
+        array.flags.writeable = False
+        arrays.append(array)
+    return (arrays[0], arrays[1], segment)
+
+
+
+def unpublishDataset(bTrain=True):
+    """
+        Remove the published segment of a data set.
+        Return False if it was not published.
+    """
+    try:
+        segment = shared_memory.SharedMemory(SEGMENT_NAMES[bTrain])
+    except (FileNotFoundError, OSError):
+        return False
+    segment.close()
+    segment.unlink()
+    return True
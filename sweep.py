@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+"""
+    Hyperparameter sweep of the options of main.py.
+
+    Every configuration of the search space (or a random sample of them) is
+    a trial. The trials run in a pool of processes that all share the data
+    sets loaded once by the main process. Poor trials are stopped early with
+    successive halving : all the trials are trained on a small part of the
+    learning size and evaluated on a validation set (the images of the
+    training file that follow the learning size), only the best 1/eta go on
+    training on the next part, and so on until the whole learning size.
+
+    Every trial is written in the run log of the saved directory and the
+    best configuration is displayed at the end.
+
+    Practical use :
+        - ./sweep.py networks/saved/testnw3 -ls 6000 -space "-gdf=Constant0.05,Constant0.1,Constant0.5;-bs=1,10"
+        - ./sweep.py networks/saved/testnw3 -ls 6000 -space "-gdf=Constant0.05,Constant0.1;-sf=Sigmoid,ReEU" -random 3 -workers 2
+"""
+
+import sys
+import os
+import io
+import math
+import time
+import random
+import itertools
+import contextlib
+import multiprocessing
+from src.argumentsManager import ArgsManager, SIZE_TRAINING
+from src.mnistHandwriting import loadMNIST
+from src.externalFunc import setProgress
+from src.jobRunner import runJob, checkJobArgs
+from src.distillation import teacherLogits
+from src.runLog import createRecord, appendRun
+
+# options of the sweep (the others are given to main.py) and their default
+SWEEP_ARGS = {"-space": None,
+              "-random": None,
+              "-workers": str(os.cpu_count() or 1),
+              "-eta": "3",
+              "-rungs": "3",
+              "-val": "1000",
+              "-seed": "0"}
+# data sets shared by all the processes of the pool (inherited when the
+# processes are forked, so that they are never copied)
+DATA = {}
+
+
+
+def parseArgs(list_args):
+    """
+        Separate the options of the sweep from the ones of main.py.
+
+        Output :
+
+        <- (options, base_args) : DICT of the sweep options and LIST of the
+                                  arguments for main.py.
+    """
+    options = dict(SWEEP_ARGS)
+    base_args = ["main.py"]
+    i = 1
+    while i < len(list_args):
+        if list_args[i] in options:
+            if i+1 >= len(list_args):
+                print("ERROR : There is no argument after", list_args[i], ".")
+                sys.exit(1)
+            options[list_args[i]] = list_args[i+1]
+            i += 2
+        else:
+            base_args.append(list_args[i])
+            i += 1
+    if options["-space"] == None:
+        print("ERROR : The search space is required : -space"
+            " \"-opt1=v1,v2;-opt2=v3,v4\".")
+        sys.exit(1)
+    return (options, base_args)
+
+
+
+def parseSpace(space):
+    """
+        Parse the search space "-opt1=v1,v2;-opt2=v3,v4".
+
+        Output :
+
+        <- space : LIST of (option, LIST of values).
+    """
+    parsed = []
+    for dimension in space.split(";"):
+        if dimension.strip() == "":
+            continue
+        option, _, values = dimension.strip().partition("=")
+        if values == "":
+            print("ERROR : The dimension", dimension, "of the search space"
+                " has no value.")
+            sys.exit(1)
+        parsed.append((option, values.split(",")))
+    return parsed
+
+
+
+def withOption(list_args, option, value):
+    """
+        Return a copy of list_args where option is set to value.
+    """
+    list_args = list(list_args)
+    if option in list_args:
+        list_args[list_args.index(option)+1] = value
+    else:
+        list_args += [option, value]
+    return list_args
+
+
+
+def runTrial(trial_args, start, stop, state):
+    """
+        Train a trial on the training images [start, stop[ (after its state)
+        and evaluate it on the validation set. Run in a process of the pool.
+    """
+    trial_args = withOption(trial_args, "-ls", str(stop - start))
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, network, results = runJob(trial_args,
+                                     DATA["training"][start:stop],
+                                     DATA["validation"], state)
+    return (results, (network.weights, network.biases, network.input_stage))
+
+
+
+def main():
+    """
+        Main function.
+    """
+    options, base_args = parseArgs(sys.argv)
+    space = parseSpace(options["-space"])
+    eta = int(options["-eta"])
+    nb_rungs = int(options["-rungs"])
+    validation_size = int(options["-val"])
+    random.seed(int(options["-seed"]))
+
+    # check the base arguments and every trial before starting anything
+    if "-S" in base_args or "-init=S" in base_args:
+        print("ERROR : A sweep does not save any network, -S and -init=S are"
+            " not allowed.")
+        sys.exit(1)
+    base = ArgsManager(base_args + ["-NO-INFO"])
+    learning_size = base.learning_size
+    if learning_size + validation_size > SIZE_TRAINING:
+        print("ERROR : The learning size + the validation size (-val) has to"
+            " be smaller than", SIZE_TRAINING, ".")
+        sys.exit(1)
+    configurations = list(itertools.product(*[values for _, values in space]))
+    if options["-random"] != None:
+        configurations = random.sample(configurations,
+            min(int(options["-random"]), len(configurations)))
+    trials = []
+    for configuration in configurations:
+        trial_args = list(base_args)
+        for (option, _), value in zip(space, configuration):
+            trial_args = withOption(trial_args, option, value)
+        trial = ArgsManager(trial_args + ["-NO-INFO"])
+        checkJobArgs(trial)
+        trials.append({"args": trial_args, "manager": trial,
+                       "batch_size": trial.batches_size,
+                       "config": " ".join("%s %s" % (option, value) for
+                       (option, _), value in zip(space, configuration)),
+                       "state": None, "trained": 0, "results": None})
+    if base.dir_load == None:
+        print("WARNING : The network is not a saved directory, the trials"
+            " will not be written in any run log.")
+
+    # the data sets are loaded once, before the processes are created
+    DATA["training"] = loadMNIST(0, learning_size, bTrain=True)
+    DATA["validation"] = loadMNIST(learning_size, validation_size,
+                                   bTrain=True)
+    setProgress("silent")
+    # the outputs of the teachers are cached before the processes are created
+    # so that they are computed once and not written by several processes
+    for teacher in set(trial["manager"].teacher for trial in trials):
+        if teacher != None:
+            teacherLogits(teacher, DATA["training"])
+
+    sweep_id = time.strftime("%Y%m%d-%H%M%S")
+    context = multiprocessing.get_context("fork")
+    alive = trials
+    with context.Pool(int(options["-workers"])) as pool:
+        for rung in range(0, nb_rungs):
+            # part of the learning size reached at the end of this rung
+            budget = learning_size/eta**(nb_rungs-1-rung)
+            jobs = []
+            for trial in alive:
+                stop = int(budget) - int(budget) % trial["batch_size"]
+                stop = max(stop, trial["trained"] + trial["batch_size"])
+                stop = min(stop, learning_size)
+                if stop == trial["trained"]:
+                    # already trained on the whole learning size
+                    jobs.append(None)
+                    continue
+                jobs.append(pool.apply_async(runTrial, (trial["args"],
+                            trial["trained"], stop, trial["state"])))
+                trial["trained"] = stop
+            for trial, job in zip(alive, jobs):
+                if job == None:
+                    print("Rung %i : %-40s already trained on the %i images"
+                          % (rung, trial["config"], trial["trained"]))
+                    continue
+                trial["results"], trial["state"] = job.get()
+                record = createRecord(trial["manager"],
+                    trial["results"]["error_rate"],
+                    trial["results"]["average_cost"],
+                    trial["results"]["timings"], sweep=sweep_id, rung=rung,
+                    trial=trial["config"], learning_size=trial["trained"],
+                    testing_size=validation_size)
+                if base.dir_load != None:
+                    appendRun(base.dir_load, record)
+                print("Rung %i : %-40s trained on %6i images : validation"
+                      " error %.4f" % (rung, trial["config"], trial["trained"],
+                      trial["results"]["error_rate"]))
+            # successive halving => keep the best 1/eta trials
+            alive.sort(key=lambda trial: trial["results"]["error_rate"])
+            if rung < nb_rungs-1:
+                alive = alive[:max(1, math.ceil(len(alive)/eta))]
+            print("")
+
+    best = alive[0]
+    print("The best configuration is :", best["config"])
+    print("Validation error rate :", best["results"]["error_rate"]*100, "%.")
+    print("Command : ./" + " ".join(best["args"]))
+
+
+if __name__ == '__main__':
+    main()
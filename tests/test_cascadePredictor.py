@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+"""
+    Tests of the calibration of the threshold of a cascade
+    (src/cascadePredictor.py) : the returned threshold escalates the part of
+    the images it reports and reaches the target accuracy.
+"""
+
+import numpy as np
+from src.cascadePredictor import calibrateThreshold, outputMargins
+
+
+def outputsWithMargins(margins, digits):
+    """
+        Return output layers (10, number of images) whose highest output is
+        the digit of each image with the given margin.
+    """
+    outputs = np.full((10, len(margins)), 0.1)
+    outputs[digits, np.arange(len(margins))] += margins
+    return outputs
+
+
+def cascadeAccuracy(small, large, labels, threshold):
+    escalated = outputMargins(small) < threshold
+    digits = np.where(escalated, np.argmax(large, axis=0),
+                      np.argmax(small, axis=0))
+    return (np.mean(digits == labels), np.mean(escalated))
+
+
+def testTiedMargins():
+    labels = np.array([5, 5, 0, 3])
+    # the two images of margin 0 are wrong for the small network
+    small = outputsWithMargins(np.array([0.0, 0.0, 0.5, 0.9]),
+                               np.array([1, 1, 0, 3]))
+    large = outputsWithMargins(np.full(4, 0.5), labels)
+    threshold, escalated = calibrateThreshold(small, large, labels, 0.75)
+    accuracy, measured = cascadeAccuracy(small, large, labels, threshold)
+    assert escalated == measured == 0.5
+    assert accuracy >= 0.75
+
+
+def testNothingEscalated():
+    labels = np.array([1, 2, 3])
+    small = outputsWithMargins(np.array([0.2, 0.4, 0.6]), labels)
+    threshold, escalated = calibrateThreshold(small, small, labels, 1.0)
+    assert escalated == 0
+    assert cascadeAccuracy(small, small, labels, threshold) == (1.0, 0.0)
+
+
+def testUnreachable():
+    labels = np.array([1, 2])
+    wrong = outputsWithMargins(np.array([0.2, 0.4]), np.array([0, 0]))
+    assert calibrateThreshold(wrong, wrong, labels, 0.5) == (float("inf"),
+                                                             1.0)
+
+
+def testRandomTies():
+    random = np.random.default_rng(0)
+    for _ in range(50):
+        labels = random.integers(0, 10, 40)
+        # few distinct margins so that many are tied
+        small = outputsWithMargins(random.integers(0, 4, 40)/4,
+            np.where(random.random(40) < 0.6, labels, (labels+1) % 10))
+        large = outputsWithMargins(np.full(40, 0.5),
+            np.where(random.random(40) < 0.9, labels, (labels+2) % 10))
+        target = random.uniform(0.5, 0.9)
+        threshold, escalated = calibrateThreshold(small, large, labels,
+                                                  target)
+        accuracy, measured = cascadeAccuracy(small, large, labels, threshold)
+        assert escalated == measured
+        if threshold != float("inf"):
+            assert accuracy >= target
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+    Tests of the compressed weight matrices (src/compressedLayers.py) :
+    the products of a SparseMatrix are the ones of the dense matrix and the
+    update of a LowRankMatrix is the gradient through its factors.
+"""
+
+import numpy as np
+from src.squishingFunc import Sigmoid, InvSigmoid, DerSigmoid
+from src.neuralNetwork import NeuralNetwork
+from src.compressedLayers import LowRankMatrix, SparseMatrix, toSparse, \
+    magnitudeMasks, SPARSE_CHUNK
+
+
+def prunedMatrix(random, rows=30, columns=40, sparsity=0.9):
+    """
+        Return a random matrix with about sparsity zeros and some empty rows
+        (the first and the last ones among them).
+    """
+    matrix = random.standard_normal((rows, columns))
+    matrix[random.random((rows, columns)) < sparsity] = 0
+    matrix[[0, 7, 8, rows-1]] = 0
+    return matrix
+
+
+def testSparseVector():
+    random = np.random.default_rng(0)
+    matrix = prunedMatrix(random)
+    layer = random.standard_normal(matrix.shape[1])
+    assert np.allclose(toSparse(matrix).dot(layer), matrix.dot(layer))
+
+
+def testSparseBatch():
+    random = np.random.default_rng(1)
+    matrix = prunedMatrix(random)
+    # a batch that is not a multiple of the chunk size
+    batch = random.standard_normal((matrix.shape[1], 3*SPARSE_CHUNK + 5))
+    assert np.allclose(toSparse(matrix).dot(batch), matrix.dot(batch))
+
+
+def testSparseEmpty():
+    matrix = np.zeros((5, 6))
+    sparse = toSparse(matrix)
+    assert sparse.size == 0
+    assert np.array_equal(sparse.dot(np.ones(6)), np.zeros(5))
+    assert np.array_equal(sparse.dot(np.ones((6, 3))), np.zeros((5, 3)))
+
+
+def testSparseDense():
+    random = np.random.default_rng(2)
+    matrix = prunedMatrix(random)
+    sparse = toSparse(matrix)
+    assert np.array_equal(np.asarray(sparse), matrix)
+    loaded = SparseMatrix(**{name: array for name, array in
+                             sparse.arrays().items()})
+    assert np.array_equal(np.asarray(loaded), matrix)
+
+
+def testMagnitudeMasks():
+    network = NeuralNetwork([784, 20, 10],
+                            [(Sigmoid, InvSigmoid, DerSigmoid)]*2, None)
+    masks = magnitudeMasks(network, 0.75)
+    # the output matrix is never pruned
+    assert masks[1] is None
+    assert np.sum(~masks[0]) == int(0.75*masks[0].size)
+    kept = np.abs(network.weights[0][masks[0]])
+    pruned = np.abs(network.weights[0][~masks[0]])
+    assert pruned.max() <= kept.min()
+
+
+def testLowRankUpdate():
+    random = np.random.default_rng(3)
+    left = random.standard_normal((6, 2))
+    right = random.standard_normal((2, 5))
+    dbiases = random.standard_normal(6)
+    layer = random.standard_normal(5)
+    matrix = LowRankMatrix(left.copy(), right.copy())
+    matrix.update(dbiases, layer)
+    # f(U, V) = dbiases . (U V layer) : the update is its gradient
+    epsilon = 1e-6
+    for factor, updated in ((left, matrix.left), (right, matrix.right)):
+        gradient = np.zeros_like(factor)
+        for index in np.ndindex(factor.shape):
+            factor[index] += epsilon
+            plus = dbiases.dot(left.dot(right.dot(layer)))
+            factor[index] -= 2*epsilon
+            minus = dbiases.dot(left.dot(right.dot(layer)))
+            factor[index] += epsilon
+            gradient[index] = (plus - minus)/(2*epsilon)
+        assert np.allclose(updated - factor, gradient, atol=1e-6)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""
+    Tests of the prediction cache (src/predictionCache.py) : hits, LRU
+    eviction and invalidation when the network is saved again.
+"""
+
+import os
+import shutil
+import numpy as np
+import src.predictionCache as predictionCache
+from src.predictionCache import PredictionCache
+
+SAVED_NETWORK = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "networks", "saved", "testnw1")
+
+
+def savedCopy(tmp_path):
+    dir_load = str(tmp_path / "network")
+    shutil.copytree(SAVED_NETWORK, dir_load)
+    return dir_load
+
+
+def randomImages(seed, number):
+    return np.random.default_rng(seed).integers(0, 256, (number, 784),
+                                                dtype=np.uint8)
+
+
+def testHits(tmp_path):
+    cache = PredictionCache(savedCopy(tmp_path))
+    images = randomImages(0, 20)
+    outputs = cache.predict(images)
+    assert np.allclose(outputs,
+                       cache.network.generateOuputLayers(images.T/255.0).T)
+    # a hit does not touch the network
+    network, cache.network = cache.network, None
+    assert np.array_equal(cache.predict(images[5:15]), outputs[5:15])
+    cache.network = network
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (10, 20)
+
+
+def testEviction(tmp_path):
+    cache = PredictionCache(savedCopy(tmp_path), max_entries=10)
+    images = randomImages(1, 15)
+    cache.predict(images[:10])
+    # image 0 becomes the most recently used, 1 to 5 are evicted
+    cache.predict(images[:1])
+    cache.predict(images[10:15])
+    assert cache.stats()["evictions"] == 5
+    cache.predict(images[[0] + list(range(6, 15))])
+    assert cache.stats()["hits"] == 11
+    cache.predict(images[1:2])
+    assert cache.stats()["misses"] == 16
+
+
+def testBytesLimit(tmp_path):
+    entry = 10*8 + predictionCache.ENTRY_OVERHEAD
+    cache = PredictionCache(savedCopy(tmp_path), max_bytes=4*entry)
+    cache.predict(randomImages(2, 6))
+    assert len(cache.entries) == 4
+    assert cache.nb_bytes == 4*entry
+
+
+def testInvalidation(tmp_path, monkeypatch):
+    monkeypatch.setattr(predictionCache, "CHECK_INTERVAL", 0)
+    dir_load = savedCopy(tmp_path)
+    cache = PredictionCache(dir_load)
+    images = randomImages(3, 5)
+    before = cache.predict(images)
+    # the network is saved again with other weights
+    path = os.path.join(dir_load, "0.npz")
+    saved = dict(np.load(path))
+    np.savez(path, w=saved["w"]*2, b=saved["b"])
+    after = cache.predict(images)
+    stats = cache.stats()
+    assert stats["invalidations"] == 1
+    assert stats["hits"] == 0
+    assert not np.allclose(before, after)